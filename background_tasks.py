@@ -0,0 +1,166 @@
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+# 끝난 작업을 레지스트리에 보관하는 시간 (이 시간 안에 새로고침하면 결과를 다시 연결할 수 있음)
+JOB_RETENTION_SECONDS = 60 * 60
+
+class BackgroundTask:
+    """백그라운드 스레드에서 실행되는 작업
+
+    작업 함수는 첫 번째 인자로 BackgroundTask를 받아 report()로 진행률을 알리고
+    is_cancelled()로 취소 여부를 확인합니다. 작업 스레드에서는 st.* 함수나
+    st.session_state에 접근하지 않아야 하므로 필요한 데이터는 미리 전달합니다.
+    """
+
+    def __init__(self, func: Callable, *args, name: str = "", **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name or getattr(func, '__name__', 'task')
+
+        self.status = 'pending'  # pending, running, done, error, cancelled
+        self.completed = 0
+        self.total = 0
+        self.message = ""
+        self.details = {}  # 세부 항목별 (처리 수, 전체 수)
+        self.result = None
+        self.error = None
+        self.error_traceback = ""
+        self.started_at = None
+        self.finished_at = None
+
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> 'BackgroundTask':
+        """작업 시작"""
+        self.status = 'running'
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"bg-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.func(self, *self.args, **self.kwargs)
+            self.status = 'cancelled' if self.is_cancelled() else 'done'
+        except Exception as e:
+            self.error = e
+            self.error_traceback = traceback.format_exc()
+            self.status = 'error'
+        finally:
+            self.finished_at = time.time()
+
+    def report(self, completed: int, total: int = None, message: str = None):
+        """진행 상황 보고 (작업 스레드에서 호출)"""
+        self.completed = completed
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    def report_detail(self, key: str, completed: int, total: int):
+        """세부 항목별 진행 상황 보고 (작업 스레드에서 호출)"""
+        with self._lock:
+            self.details[key] = (completed, total)
+            self.completed = sum(done for done, _ in self.details.values())
+            self.total = sum(count for _, count in self.details.values())
+
+    def detail_progress(self, key: str) -> float:
+        """세부 항목의 0.0 ~ 1.0 사이 진행률"""
+        completed, total = self.details.get(key, (0, 0))
+        return min(completed / total, 1.0) if total else 0.0
+
+    def cancel(self):
+        """작업 취소 요청"""
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        """취소 요청 여부"""
+        return self._cancel_event.is_set()
+
+    def is_running(self) -> bool:
+        return self.status in ('pending', 'running')
+
+    def is_done(self) -> bool:
+        return self.status == 'done'
+
+    @property
+    def progress(self) -> float:
+        """0.0 ~ 1.0 사이의 진행률"""
+        if self.status == 'done':
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(self.completed / self.total, 1.0)
+
+    @property
+    def elapsed(self) -> float:
+        """시작 후 경과 시간 (초, 끝났으면 걸린 시간)"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def eta(self) -> Optional[float]:
+        """지금까지의 처리 속도로 추정한 남은 시간 (초, 추정할 수 없으면 None)"""
+        if not self.is_running() or not self.completed or not self.total:
+            return None
+        return self.elapsed * (self.total - self.completed) / self.completed
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """작업 완료까지 대기 후 결과 반환 (오류는 다시 발생)"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class TaskRegistry:
+    """프로세스 전체에서 공유하는 작업 목록
+
+    세션과 관계없이 작업 ID로 작업을 찾을 수 있어, 브라우저가 다시 연결되어 새 세션이
+    만들어져도 작업 ID만 알면 진행 상황과 결과를 이어 받을 수 있습니다.
+    끝난 지 retention_seconds가 지난 작업은 다음 등록/조회 때 정리됩니다.
+    """
+
+    def __init__(self, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._tasks: Dict[str, BackgroundTask] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, task: BackgroundTask, job_id: Optional[str] = None) -> str:
+        """작업을 시작하고 등록, 작업 ID 반환 (job_id를 주면 그 ID로 등록)"""
+        job_id = job_id or uuid.uuid4().hex[:12]
+        with self._lock:
+            self._cleanup()
+            self._tasks[job_id] = task
+        task.start()
+        return job_id
+
+    def get(self, job_id: Optional[str]) -> Optional[BackgroundTask]:
+        with self._lock:
+            self._cleanup()
+            return self._tasks.get(job_id) if job_id else None
+
+    def discard(self, job_id: str) -> Optional[BackgroundTask]:
+        """등록 해제 (실행 중이면 취소 요청)"""
+        with self._lock:
+            task = self._tasks.pop(job_id, None)
+        if task is not None and task.is_running():
+            task.cancel()
+        return task
+
+    def _cleanup(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, task in self._tasks.items()
+                   if task.finished_at is not None and task.finished_at < cutoff]
+        for job_id in expired:
+            del self._tasks[job_id]
+
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from session_memory import write_spill, read_spill
+
+CHECKPOINT_DIR = os.path.join("cache", "checkpoints")
+# 이 시간보다 오래된 체크포인트는 삭제
+STALE_CHECKPOINT_HOURS = 24
+# 작업 ID(TaskRegistry가 만드는 12자리 16진수)와 단계 키(내용 해시) 형식
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{12}')
+STAGE_KEY_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+logger = logging.getLogger('performance')
+
+class CheckpointStore:
+    """파이프라인 단계 결과의 디스크 체크포인트
+
+    단계 결과를 DataFrame으로 바꿔 단계 키(내용 해시)별 파일에 저장합니다. pyarrow가 있으면 parquet,
+    없으면 압축 pickle을 사용하며, 임시 파일에 쓴 뒤 교체하므로 저장 중 서버가 꺼져도 이전 체크포인트가
+    깨지지 않습니다. 읽을 수 없는 파일은 유효하지 않은 체크포인트로 보고 삭제합니다.
+    작업 매니페스트에는 작업 ID별 단계 키와 템플릿을 저장해, 서버가 다시 시작된 뒤에도 작업을 이어 갑니다.
+    """
+
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        self.directory = directory
+
+    def path(self, stage: str, key: str, partial: bool = False) -> str:
+        return os.path.join(self.directory, f"{stage}-{key}{'.partial' if partial else ''}.ckpt")
+
+    @staticmethod
+    def is_valid_job_id(job_id) -> bool:
+        """주소창에서 받은 작업 ID가 작업 목록이 만든 형식인지 (경로로 쓰기 전에 확인)"""
+        return isinstance(job_id, str) and JOB_ID_PATTERN.fullmatch(job_id) is not None
+
+    @staticmethod
+    def is_valid_key(key) -> bool:
+        return isinstance(key, str) and STAGE_KEY_PATTERN.fullmatch(key) is not None
+
+    def _manifest_path(self, job_id: str) -> str:
+        if not self.is_valid_job_id(job_id):
+            raise ValueError(f"잘못된 작업 ID입니다: {job_id!r}")
+        return os.path.join(self.directory, "jobs", f"{job_id}.json")
+
+    @staticmethod
+    def _atomic_write(path: str, write):
+        """임시 파일에 쓴 뒤 교체 (모든 세션과 작업 스레드가 한 프로세스이므로 임시 파일은 쓰기마다 따로 만듦)"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def save(self, stage: str, key: str, frame: pd.DataFrame, partial: bool = False) -> bool:
+        """단계 결과 저장 (partial이면 진행 중인 결과), 저장했으면 True
+
+        체크포인트는 재시작 대비용이므로 저장에 실패해도 단계를 실패시키지 않고 경고만 남깁니다.
+        """
+        path = self.path(stage, key, partial)
+        try:
+            self._atomic_write(path, lambda temp_path: write_spill(temp_path, {stage: frame}))
+        except Exception as e:
+            logger.warning(f"Checkpoint save failed: {os.path.basename(path)} ({e})")
+            return False
+        if not partial:
+            self.discard(stage, key, partial=True)
+        logger.info(f"Checkpoint saved: {os.path.basename(path)} ({len(frame)} rows)")
+        return True
+
+    def has(self, stage: str, key: str, partial: bool = False) -> bool:
+        return os.path.exists(self.path(stage, key, partial))
+
+    def load(self, stage: str, key: str, partial: bool = False) -> Optional[pd.DataFrame]:
+        """저장된 단계 결과 (없거나 읽을 수 없으면 None)"""
+        path = self.path(stage, key, partial)
+        if not os.path.exists(path):
+            return None
+        try:
+            return read_spill(path)[stage]
+        except Exception as e:
+            logger.warning(f"Invalid checkpoint removed: {path} ({e})")
+            self.discard(stage, key, partial)
+            return None
+
+    def discard(self, stage: str, key: str, partial: bool = False):
+        try:
+            os.remove(self.path(stage, key, partial))
+        except OSError:
+            pass
+
+    # --- 작업 매니페스트 ---
+
+    def save_manifest(self, job_id: str, manifest: Dict[str, Any]):
+        """작업을 이어 가는 데 필요한 정보 저장 (단계 키, 템플릿 등 JSON 값)"""
+        data = json.dumps(dict(manifest, saved_at=time.time()), ensure_ascii=False)
+
+        def write(temp_path):
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+
+        self._atomic_write(self._manifest_path(job_id), write)
+
+    def load_manifest(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """저장된 작업 정보 (없거나, 읽을 수 없거나, 작업 ID 형식이 잘못되었으면 None)"""
+        try:
+            with open(self._manifest_path(job_id), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest, dict) else None
+
+    def discard_manifest(self, job_id: str):
+        try:
+            os.remove(self._manifest_path(job_id))
+        except (OSError, ValueError):
+            pass
+
+    def cleanup_stale(self, max_age_hours: float = STALE_CHECKPOINT_HOURS) -> int:
+        """오래된 체크포인트와 매니페스트 삭제"""
+        removed = 0
+        cutoff = time.time() - max_age_hours * 3600
+        for directory in (self.directory, os.path.join(self.directory, "jobs")):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
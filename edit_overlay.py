@@ -0,0 +1,133 @@
+import re
+from collections.abc import Mapping
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+# 원본 대비 변경 구간: (시작, 끝, 바꿀 텍스트)
+DiffOps = Tuple[Tuple[int, int, str], ...]
+
+class EditOverlay(Mapping):
+    """생성된 메시지 위에 얹는 copy-on-write 수정 레이어
+
+    원본과 실제로 다른 메시지만 보관하며, 가능하면 원본 대비 변경 구간(diff)만 저장합니다.
+    dict처럼 읽을 수 있어 `overlay.get(group_id, 원본)` 형태로 내보내기 함수에 그대로 넘길 수 있고,
+    수정본은 읽을 때마다 원본에 변경 구간을 적용해 만듭니다 (병합된 사본을 따로 두지 않음).
+    """
+
+    def __init__(self, generated_messages: Dict, edits: Optional[Dict[str, str]] = None):
+        self.base = generated_messages
+        self._edits: Dict[str, Union[str, DiffOps]] = {}
+        for group_id, text in (edits or {}).items():
+            self.set(group_id, text)
+
+    def base_message(self, group_id: str) -> str:
+        return self.base[group_id]['message']
+
+    @staticmethod
+    def make_diff(base: str, text: str) -> Union[str, DiffOps]:
+        """원본 대비 변경 구간 생성 (diff가 더 크면 수정본 전체를 그대로 반환)"""
+        matcher = SequenceMatcher(None, base, text, autojunk=False)
+        ops = tuple((i1, i2, text[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+        if sum(len(replacement) for _, _, replacement in ops) + 8 * len(ops) >= len(text):
+            return text
+        return ops
+
+    @staticmethod
+    def apply_diff(base: str, diff: Union[str, DiffOps]) -> str:
+        """원본에 변경 구간 적용"""
+        if isinstance(diff, str):
+            return diff
+        parts: List[str] = []
+        position = 0
+        for start, end, replacement in diff:
+            parts.append(base[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(base[position:])
+        return ''.join(parts)
+
+    def set(self, group_id: str, text: str) -> bool:
+        """수정 내용 기록 (원본과 같으면 기록 삭제), 기록이 바뀌었으면 True"""
+        if group_id not in self.base:
+            return False
+        previous = self._edits.get(group_id)
+        base = self.base_message(group_id)
+        if text == base:
+            return self._edits.pop(group_id, None) is not None
+        if previous is not None and self.apply_diff(base, previous) == text:
+            return False
+        self._edits[group_id] = self.make_diff(base, text)
+        return True
+
+    def discard(self, group_id: str):
+        """수정 내용 삭제 (원본으로 되돌림)"""
+        self._edits.pop(group_id, None)
+
+    def rebase(self, generated_messages: Dict):
+        """새로 생성된 메시지 기준으로 수정 내용을 다시 기록 (없어진 그룹의 수정은 버림)"""
+        edits = {group_id: self[group_id] for group_id in self._edits}
+        self.base = generated_messages
+        self._edits = {}
+        for group_id, text in edits.items():
+            self.set(group_id, text)
+
+    def __getitem__(self, group_id: str) -> str:
+        diff = self._edits[group_id]
+        return self.apply_diff(self.base_message(group_id), diff)
+
+    def __contains__(self, group_id) -> bool:
+        return group_id in self._edits
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._edits)
+
+    def __len__(self) -> int:
+        return len(self._edits)
+
+    def current_messages(self, group_ids: Iterable[str]) -> pd.Series:
+        """수정본을 반영한 현재 메시지 컬럼 (그룹ID 인덱스)"""
+        group_ids = list(group_ids)
+        return pd.Series([self.get(group_id, self.base_message(group_id)) for group_id in group_ids],
+                         index=group_ids, dtype=object)
+
+# --- 전체 찾아 바꾸기 ---
+
+def select_group_ids(generated_messages: Dict, ordered_ids: Iterable[str], teams: Optional[Iterable[str]] = None) -> List[str]:
+    """팀 범위에 해당하는 그룹ID 목록 (팀을 지정하지 않으면 전체)"""
+    if not teams:
+        return list(ordered_ids)
+    teams = set(teams)
+    return [group_id for group_id in ordered_ids if generated_messages[group_id]['group_info'].get('team_name') in teams]
+
+# 빈 문자열 일치 여부를 확인할 때 넣어 보는 문자열 (^, a*, \b 처럼 폭이 0인 일치를 찾기 위함)
+_EMPTY_MATCH_PROBES = ('', 'a 1가\n')
+
+def _compile_find_pattern(find: str, regex: bool) -> re.Pattern:
+    """찾을 내용을 컴파일 (잘못된 정규식은 re.error, 빈 문자열에 일치하는 패턴은 ValueError 발생)"""
+    pattern = re.compile(find if regex else re.escape(find))
+    for probe in _EMPTY_MATCH_PROBES:
+        if any(match.start() == match.end() for match in pattern.finditer(probe)):
+            raise ValueError("빈 문자열에 일치하는 패턴은 사용할 수 없습니다 (예: ^, a*)")
+    return pattern
+
+def count_matches(overlay: EditOverlay, group_ids: Iterable[str], find: str, regex: bool = False) -> pd.Series:
+    """그룹별 일치 횟수 미리보기 (일치하는 그룹만 반환, 잘못된 정규식은 re.error, 빈 일치 패턴은 ValueError 발생)"""
+    pattern = _compile_find_pattern(find, regex)
+    messages = overlay.current_messages(group_ids)
+    counts = messages.str.count(pattern)
+    return counts[counts > 0]
+
+def apply_replace(overlay: EditOverlay, group_ids: Iterable[str], find: str, replace: str, regex: bool = False) -> Dict[str, str]:
+    """메시지 컬럼에 찾아 바꾸기를 한 번에 적용하고 수정 레이어에 기록, 바뀐 {그룹ID: 메시지} 반환"""
+    pattern = _compile_find_pattern(find, regex)
+    messages = overlay.current_messages(group_ids)
+    if regex:
+        replaced = messages.str.replace(pattern, replace, regex=True)
+    else:
+        replaced = messages.str.replace(find, replace, regex=False)
+    changed = replaced[replaced != messages]
+    for group_id, message in changed.items():
+        overlay.set(group_id, message)
+    return changed.to_dict()
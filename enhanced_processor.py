@@ -3,6 +3,132 @@ import re
 from datetime import datetime
 from collections import defaultdict
 
+# [컬럼:키] 또는 {키} 형태의 모든 태그를 찾는 정규식 (모듈 로드 시 한 번만 컴파일)
+TEMPLATE_TAG_PATTERN = re.compile(r'\[(컬럼):([^\]:]+)(:[^\]]*)?\]|(\{)([^}]+?)(:[^}]+)?\}')
+
+def build_message_order(generated_messages):
+    """excel_order 기준 정렬 인덱스 생성 (정렬된 그룹ID 배열과 그룹ID→위치 맵)"""
+    ordered_ids = sorted(generated_messages, key=lambda group_id: generated_messages[group_id]['group_info'].get('excel_order', 0))
+    return {
+        'ids': ordered_ids,
+        'positions': {group_id: position for position, group_id in enumerate(ordered_ids)}
+    }
+
+def compile_template(template):
+    """템플릿을 리터럴 문자열과 (키, 포맷) 태그 조각의 튜플로 한 번만 분석"""
+    parts = []
+    position = 0
+    for match in TEMPLATE_TAG_PATTERN.finditer(template):
+        if match.start() > position:
+            parts.append(template[position:match.start()])
+        # key는 그룹 2(컬럼) 또는 그룹 5(변수) 중 하나가 됨
+        parts.append((match.group(2) or match.group(5), match.group(3) or match.group(6)))
+        position = match.end()
+    if position < len(template):
+        parts.append(template[position:])
+    return tuple(parts)
+
+def format_tag_value(variables, key, formatting=None):
+    """태그 하나의 치환 값 (없는 키는 ❌[키]로 표시)"""
+    # 통합 딕셔너리에서 값 조회
+    value = variables.get(key, f"❌[{key}]")
+    
+    if isinstance(value, str) and value.startswith("❌"):
+        return value
+
+    # 숫자 포맷팅 적용 (요청 시)
+    if formatting and ':' in formatting:
+        try:
+            # 문자열 내 쉼표 등 비숫자 문자 제거 후 숫자 변환
+            num_value = float(re.sub(r'[^\d.-]', '', str(value)))
+            return f"{int(num_value):,}"
+        except (ValueError, TypeError):
+            return str(value) # 변환 실패 시 원본 값 반환
+    
+    return str(value)
+
+def render_compiled(template, variables):
+    """미리 분석한 템플릿 조각에 값 채우기 (문자열 템플릿이면 먼저 분석)"""
+    compiled = template if isinstance(template, tuple) else compile_template(template)
+    return ''.join(
+        part if isinstance(part, str) else format_tag_value(variables, *part)
+        for part in compiled
+    )
+
+def build_variables(group_info, fixed_data):
+    """메시지 생성에 쓰는 변수 딕셔너리 (고정 변수 + 그룹 변수 + 특별 계산 변수)"""
+    variables = {}
+    variables.update(fixed_data)  # 고정 변수
+    variables.update(group_info)  # 그룹 변수 (엑셀 컬럼명 키 포함)
+    variables['group_size'] = len(group_info.get('members', []))
+    variables['group_members_text'] = ', '.join([f"{name}님" for name in group_info.get('members', [])])
+    
+    # 'additional_fee_per_person'는 이제 사용되지 않는 것으로 보임 (템플릿에 따라 다름)
+    # 필요 시 아래 로직 활성화
+    # try:
+    #     exchange_fee = int(variables.get('exchange_fee', 0))
+    #     company_burden = int(variables.get('company_burden', 0))
+    #     variables['additional_fee_per_person'] = exchange_fee + company_burden
+    # except (ValueError, TypeError):
+    #     variables['additional_fee_per_person'] = 0
+    return variables
+
+def select_preview_group_ids(template, group_data, fixed_data, sample_count=5):
+    """미리보기용 샘플 그룹 선택, [(그룹ID, 설명)] 반환
+
+    앞쪽 그룹 sample_count개에 더해, 템플릿이 참조하는 값이 가장 긴 그룹(가장 긴 메시지)과
+    비어 있거나 없는 값이 가장 많은 그룹을 포함합니다. 메시지를 만들지 않고 값 길이로만 판단합니다.
+    """
+    compiled = template if isinstance(template, tuple) else compile_template(template)
+    keys = {part[0] for part in compiled if not isinstance(part, str)}
+    
+    longest_id, longest_length = None, -1
+    missing_id, most_missing = None, 0
+    for group_id, group_info in group_data.items():
+        variables = build_variables(group_info, fixed_data)
+        length = missing = 0
+        for key in keys:
+            value = variables.get(key)
+            text = '' if value is None else str(value)
+            if text.strip():
+                length += len(text)
+            else:
+                missing += 1
+        if length > longest_length:
+            longest_id, longest_length = group_id, length
+        if missing > most_missing:
+            missing_id, most_missing = group_id, missing
+    
+    samples = {group_id: [] for group_id in list(group_data)[:sample_count]}
+    if longest_id is not None:
+        samples.setdefault(longest_id, []).append("가장 긴 메시지")
+    if missing_id is not None:
+        samples.setdefault(missing_id, []).append(f"빈 값 {most_missing}개")
+    return [(group_id, ', '.join(notes)) for group_id, notes in samples.items()]
+
+def profile_columns(df, sample_count=3):
+    """컬럼별 프로필 (dtype, 숫자 비율, 샘플 값, 빈 값 비율), 컬럼명을 인덱스로 하는 DataFrame
+
+    시트 전체에 대해 컬럼 단위 벡터 연산으로 한 번에 계산합니다.
+    숫자 비율은 값이 있는 셀 중 쉼표/공백/'원'을 빼고 숫자로 읽히는 셀의 비율입니다.
+    """
+    text = df.astype(str).where(df.notna(), '').apply(lambda column: column.str.strip())
+    filled = text != ''
+    filled_count = filled.sum()
+    numeric = text.replace(r'[,\s원]', '', regex=True).apply(pd.to_numeric, errors='coerce')
+    numeric_ratio = (numeric.notna() & filled).sum() / filled_count.where(filled_count > 0)
+    
+    samples = [
+        text.iloc[:, position][filled.iloc[:, position]].drop_duplicates().head(sample_count).tolist()
+        for position in range(df.shape[1])
+    ]
+    return pd.DataFrame({
+        'dtype': df.dtypes.astype(str).values,
+        'numeric_ratio': numeric_ratio.fillna(0.0).values,
+        'null_rate': (1 - filled_count / len(df)).values if len(df) else [0.0] * df.shape[1],
+        'samples': samples
+    }, index=df.columns)
+
 class EnhancedDataProcessor:
     """향상된 데이터 처리 클래스"""
     
@@ -133,70 +259,75 @@ class EnhancedMessageGenerator:
     
     def __init__(self):
         self.generated_messages = {}
+        self.message_order = {'ids': [], 'positions': {}}
         self.column_mappings = {}
 
-    def generate_messages(self, template, group_data, fixed_data):
-        """단순화되고 안정적인 로직으로 메시지를 생성"""
+    def generate_messages(self, template, group_data, fixed_data, progress_callback=None, cancel_check=None):
+        """단순화되고 안정적인 로직으로 메시지를 생성
+
+        progress_callback(처리 수, 전체 수)로 진행 상황을 알리고, cancel_check()가 True를 반환하면
+        그때까지 만든 메시지만 남기고 중단합니다.
+        """
         if not group_data:
             raise ValueError("그룹 데이터가 없습니다.")
         
         self.generated_messages = {}
+        compiled = template if isinstance(template, tuple) else compile_template(template)
+        total = len(group_data)
 
-        for group_id, group_info in group_data.items():
-            # 1. 모든 변수를 하나의 딕셔너리로 통합
-            variables = {}
-            variables.update(fixed_data)  # 고정 변수
-            variables.update(group_info)  # 그룹 변수 (엑셀 컬럼명 키 포함)
+        for index, (group_id, group_info) in enumerate(group_data.items(), 1):
+            if cancel_check and cancel_check():
+                break
+            self.generated_messages[group_id] = {
+                'message': self.render_message(compiled, group_info, fixed_data),
+                'group_info': group_info
+            }
+            if progress_callback:
+                progress_callback(index, total)
 
-            # 2. 특별 계산 변수 추가
-            variables['group_size'] = len(group_info.get('members', []))
-            variables['group_members_text'] = ', '.join([f"{name}님" for name in group_info.get('members', [])])
-            
-            # 'additional_fee_per_person'는 이제 사용되지 않는 것으로 보임 (템플릿에 따라 다름)
-            # 필요 시 아래 로직 활성화
-            # try:
-            #     exchange_fee = int(variables.get('exchange_fee', 0))
-            #     company_burden = int(variables.get('company_burden', 0))
-            #     variables['additional_fee_per_person'] = exchange_fee + company_burden
-            # except (ValueError, TypeError):
-            #     variables['additional_fee_per_person'] = 0
-
-            # 3. 템플릿 태그를 치환하는 콜백 함수
-            def replacer(match):
-                # [컬럼:...] 태그 또는 {...} 태그에서 핵심 내용(키)과 포맷팅 정보 추출
-                # key는 그룹 2(컬럼) 또는 그룹 5(변수) 중 하나가 됨
-                key = match.group(2) or match.group(5)
-                formatting = match.group(3) or match.group(6)
-                
-                # 통합 딕셔너리에서 값 조회
-                value = variables.get(key, f"❌[{key}]")
-                
-                if isinstance(value, str) and value.startswith("❌"):
-                    return value
-
-                # 숫자 포맷팅 적용 (요청 시)
-                if formatting and ':' in formatting:
-                    try:
-                        # 문자열 내 쉼표 등 비숫자 문자 제거 후 숫자 변환
-                        num_value = float(re.sub(r'[^\d.-]', '', str(value)))
-                        return f"{int(num_value):,}"
-                    except (ValueError, TypeError):
-                        return str(value) # 변환 실패 시 원본 값 반환
-                
-                return str(value)
+        # 정렬은 생성 시 한 번만 하고 이후에는 인덱스를 재사용
+        self.message_order = build_message_order(self.generated_messages)
 
-            # [컬럼:키] 또는 {키} 형태의 모든 태그를 찾는 정규식
-            pattern = r'\[(컬럼):([^\]:]+)(:[^\]]*)?\]|(\{)([^}]+?)(:[^}]+)?\}'
-            final_message = re.sub(pattern, replacer, template)
-            
-            self.generated_messages[group_id] = {
-                'message': final_message,
+        return {
+            'messages': self.generated_messages,
+            'total_count': len(self.generated_messages),
+            'message_order': self.message_order
+        }
+
+    def render_message(self, template, group_info, fixed_data):
+        """그룹 하나의 메시지 생성"""
+        return render_compiled(template, build_variables(group_info, fixed_data))
+
+    def regenerate_messages(self, template, group_data, fixed_data, group_ids, existing_messages):
+        """선택한 그룹만 다시 생성하고 나머지 그룹의 결과는 그대로 유지
+
+        existing_messages는 변경하지 않고, 다시 생성한 그룹만 바뀐 새 딕셔너리를 반환합니다.
+        group_data에 없는 그룹ID는 건너뜁니다.
+        """
+        messages = dict(existing_messages)
+        regenerated = []
+        compiled = template if isinstance(template, tuple) else compile_template(template)
+        for group_id in group_ids:
+            group_info = group_data.get(group_id)
+            if group_info is None:
+                continue
+            messages[group_id] = {
+                'message': self.render_message(compiled, group_info, fixed_data),
                 'group_info': group_info
             }
+            regenerated.append(group_id)
+
+        self.generated_messages = messages
+        self.message_order = build_message_order(messages)
 
-        return {'messages': self.generated_messages, 'total_count': len(self.generated_messages)}
+        return {
+            'messages': messages,
+            'regenerated': regenerated,
+            'total_count': len(messages),
+            'message_order': self.message_order
+        }
 
     def get_sorted_messages(self):
         """정렬된 메시지 반환"""
         if not self.generated_messages: return []
-        return sorted(self.generated_messages.items(), key=lambda item: item[1]['group_info'].get('excel_order', 0))
\ No newline at end of file
+        return [(group_id, self.generated_messages[group_id]) for group_id in self.message_order['ids']]
\ No newline at end of file
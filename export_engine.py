@@ -0,0 +1,539 @@
+import csv
+import io
+import multiprocessing
+import os
+import re
+import zipfile
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+# 연락처 컬럼 자동 감지 키워드 (우선순위 순)
+PHONE_COLUMN_KEYWORDS = ['contact', '연락처', '휴대폰', '핸드폰', '전화']
+
+# 이 글자 수를 넘으면 LMS로 분류 (템플릿 편집기와 같은 기준)
+SMS_MAX_LENGTH = 90
+
+ExportRecord = namedtuple('ExportRecord', ['group_id', 'group_info', 'message'])
+
+
+# --- 공통 유틸리티 ---
+
+def compute_column_widths(df, max_width=50, padding=2, sample_size=None):
+    """DataFrame 기준으로 엑셀 열 너비 계산 (벡터화된 str.len 사용)
+
+    sample_size를 지정하면 행 수가 그보다 많을 때 일부 행만 표본으로 측정합니다.
+    """
+    if sample_size and len(df) > sample_size:
+        df = df.sample(n=sample_size, random_state=0)
+
+    widths = {}
+    for col in df.columns:
+        max_length = len(str(col))
+        if len(df):
+            lengths = df[col].fillna('').astype(str).str.len()
+            max_length = max(max_length, int(lengths.max()))
+        widths[col] = min(max_length + padding, max_width)
+    return widths
+
+def find_phone_column(columns):
+    """연락처로 사용할 컬럼명 찾기"""
+    for keyword in PHONE_COLUMN_KEYWORDS:
+        for col in columns:
+            if keyword in str(col).lower():
+                return col
+    return None
+
+def normalize_phone_numbers(phones):
+    """휴대폰 번호를 숫자만 남긴 국내 형식(01012345678)으로 일괄 정규화
+
+    유효하지 않은 번호는 빈 문자열로 반환합니다.
+    """
+    digits = phones.fillna('').astype(str).str.replace(r'\.0$', '', regex=True).str.replace(r'\D', '', regex=True)
+    digits = digits.str.replace(r'^82(?=1)', '0', regex=True)
+    # 엑셀에서 숫자로 읽혀 맨 앞 0이 빠진 경우 복원
+    digits = digits.str.replace(r'^(?=1[016789]\d{7,8}$)', '0', regex=True)
+    return digits.where(digits.str.match(r'^01[016789]\d{7,8}$'), '')
+
+def safe_file_name(name):
+    """파일명에 사용할 수 없는 문자를 '_'로 치환"""
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(name).strip()) or 'unnamed'
+
+def unique_file_name(file_name, used_names, suffix=2):
+    """이미 쓴 파일명이면 확장자 앞에 _번호를 붙여 겹치지 않는 이름을 만들고 used_names에 추가"""
+    stem, extension = os.path.splitext(file_name)
+    candidate = file_name
+    while candidate in used_names:
+        candidate = f"{stem}_{suffix}{extension}"
+        suffix += 1
+    used_names.add(candidate)
+    return candidate
+
+def build_group_file_name(group_id, group_info, extension="txt"):
+    """그룹별 파일명 생성 (그룹ID_팀명_발송인.txt)"""
+    parts = [group_id, group_info.get('team_name', ''), group_info.get('sender', '')]
+    name = '_'.join(str(part).strip() for part in parts if str(part).strip())
+    return f"{safe_file_name(name)}.{extension}"
+
+def sms_gateway_frame(group_ids, phones, messages, drop_invalid=False):
+    """그룹ID/연락처/메시지 컬럼으로 문자 발송용 DataFrame 생성 (번호 정규화와 SMS/LMS 분류는 컬럼 단위)
+
+    반환: (recipient, message, message_type, group_id 컬럼의 DataFrame, 번호가 없어 제외된 그룹 수)
+    """
+    messages = pd.Series(messages, dtype=object).reset_index(drop=True)
+    frame = pd.DataFrame({
+        'recipient': normalize_phone_numbers(pd.Series(phones, dtype=object)).values,
+        'message': messages.values,
+        'message_type': messages.str.len().gt(SMS_MAX_LENGTH).map({True: 'LMS', False: 'SMS'}).values,
+        'group_id': list(group_ids)
+    })
+    if not drop_invalid:
+        return frame, 0
+    valid_frame = frame[frame['recipient'] != '']
+    return valid_frame, len(frame) - len(valid_frame)
+
+def sms_gateway_frame_from_messages(generated_messages, edited_messages=None, ordered_ids=None,
+                                    phone_column=None, drop_invalid=False):
+    """생성 결과에서 연락처 컬럼과 (수정본을 반영한) 메시지 컬럼을 뽑아 문자 발송용 DataFrame 생성
+
+    그룹별 레코드를 만들지 않고 컬럼 단위로 모읍니다. 반환값은 sms_gateway_frame과 같습니다.
+    """
+    if ordered_ids is None:
+        ordered_ids = excel_order_ids(generated_messages)
+    group_infos = [generated_messages[group_id]['group_info'] for group_id in ordered_ids]
+    if phone_column is None:
+        phone_column = (find_phone_column(group_infos[0].keys()) if group_infos else None) or ''
+    
+    messages = pd.Series([generated_messages[group_id]['message'] for group_id in ordered_ids],
+                         index=ordered_ids, dtype=object)
+    if edited_messages:
+        # 수정된 그룹만 메시지 컬럼에 덮어씀
+        edited = {group_id: edited_messages[group_id] for group_id in edited_messages if group_id in messages.index}
+        if edited:
+            messages.update(pd.Series(edited, dtype=object))
+    phones = [group_info.get(phone_column, '') for group_info in group_infos]
+    return sms_gateway_frame(ordered_ids, phones, messages, drop_invalid)
+
+def write_sms_gateway_export(frame, output, fmt="csv", chunk_size=10000):
+    """문자 발송용 DataFrame을 CSV 또는 JSONL로 청크 단위 기록
+
+    output은 파일 경로 또는 텍스트 파일 객체입니다.
+    """
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"지원하지 않는 발송 파일 형식입니다: {fmt}")
+
+    if isinstance(output, str):
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            return write_sms_gateway_export(frame, f, fmt, chunk_size)
+
+    if fmt == 'csv':
+        frame.to_csv(output, index=False, chunksize=chunk_size)
+    else:
+        for start in range(0, len(frame), chunk_size):
+            chunk = frame.iloc[start:start + chunk_size]
+            text = chunk.to_json(orient='records', lines=True, force_ascii=False)
+            # pandas 버전에 따라 마지막 줄바꿈 유무가 다름
+            output.write(text if text.endswith('\n') else text + '\n')
+    return output
+
+
+# --- 컬럼 구성 ---
+
+def _members_text(record):
+    return ', '.join(record.group_info.get('members', []))
+
+# 결과 화면 다운로드용 컬럼
+RESULT_COLUMNS = [
+    ('그룹ID', lambda r: r.group_id),
+    ('팀명', lambda r: r.group_info['team_name']),
+    ('발송그룹', lambda r: r.group_info['sender_group']),
+    ('발송인', lambda r: r.group_info['sender']),
+    ('연락처', lambda r: r.group_info.get('contact', '')),
+    ('그룹멤버', _members_text),
+    ('인원수', lambda r: r.group_info['group_size']),
+    ('메시지', lambda r: r.message),
+]
+
+# 다운로드 섹션(요약)용 컬럼
+SUMMARY_COLUMNS = RESULT_COLUMNS[:7] + [
+    ('총잔금', lambda r: r.group_info.get('total_balance', '')),
+    ('메시지', lambda r: r.message),
+]
+
+# 메시지 본문을 제외한 그룹 목록 CSV용 컬럼
+GROUP_LIST_COLUMNS = SUMMARY_COLUMNS[:8]
+
+
+# --- Writer 플러그인 ---
+
+class ExportWriter:
+    """내보내기 writer 기본 클래스
+
+    run_export가 open(total) → write(record) × N → close() 순서로 호출하며,
+    close()는 내용을 기록한 output 객체를 반환합니다.
+    """
+    name = ''
+
+    def __init__(self, output):
+        self.output = output
+
+    def open(self, total: int):
+        pass
+
+    def write(self, record: ExportRecord):
+        raise NotImplementedError
+
+    def close(self):
+        return self.output
+
+
+class TextExportWriter(ExportWriter):
+    """텍스트(.txt) writer
+
+    layout='results'는 결과 화면 다운로드 형식, 'summary'는 머리말이 있는 요약 형식입니다.
+    """
+    name = 'txt'
+
+    def __init__(self, output, layout='results'):
+        super().__init__(output)
+        self.layout = layout
+        self._first = True
+
+    def _emit(self, lines):
+        if not self._first:
+            self.output.write("\n")
+        self.output.write("\n".join(lines))
+        self._first = False
+
+    def open(self, total):
+        if self.layout == 'summary':
+            self._emit([
+                "여행 잔금 문자 메시지",
+                f"생성일시: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                f"총 {total}개 그룹",
+                "=" * 60,
+                ""
+            ])
+
+    def write(self, record):
+        group_id, group_info, message = record
+        if self.layout == 'summary':
+            self._emit([
+                f"[{group_id}] {group_info['team_name']} - {group_info['sender_group']}",
+                f"발송인: {group_info['sender']}",
+                f"대상자: {', '.join(group_info['members'])} ({group_info['group_size']}명)",
+                f"연락처: {group_info.get('contact', '')}",
+                "-" * 40,
+                message,
+                "",
+                "=" * 60,
+                ""
+            ])
+        else:
+            self._emit([
+                f"=== {group_id} ({group_info['team_name']}-{group_info['sender_group']}) ===",
+                f"발송인: {group_info['sender']}",
+                f"대상자: {', '.join(group_info['members'])}",
+                f"연락처: {group_info.get('contact', '')}",
+                "-" * 60,
+                message,
+                "\n" + "=" * 60 + "\n"
+            ])
+
+
+class CsvExportWriter(ExportWriter):
+    """CSV writer (행 단위로 바로 기록)"""
+    name = 'csv'
+
+    def __init__(self, output, columns=None):
+        super().__init__(output)
+        self.columns = columns or GROUP_LIST_COLUMNS
+        self._writer = csv.writer(output, lineterminator='\n')
+
+    def open(self, total):
+        self._writer.writerow([header for header, _ in self.columns])
+
+    def write(self, record):
+        self._writer.writerow([getter(record) for _, getter in self.columns])
+
+
+class XlsxExportWriter(ExportWriter):
+    """엑셀(.xlsx) writer
+
+    열 너비를 미리 정해야 하므로 행을 모아 두었다가 close()에서
+    write-only 워크북으로 한 번에 기록합니다.
+    """
+    name = 'xlsx'
+
+    def __init__(self, output, columns=None, sheet_name='메시지', width_sample_size=None):
+        super().__init__(output)
+        self.columns = columns or RESULT_COLUMNS
+        self.sheet_name = sheet_name
+        self.width_sample_size = width_sample_size
+        self._rows = []
+
+    def write(self, record):
+        self._rows.append([getter(record) for _, getter in self.columns])
+
+    def close(self):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        headers = [header for header, _ in self.columns]
+        df = pd.DataFrame(self._rows, columns=headers)
+        column_widths = compute_column_widths(df, sample_size=self.width_sample_size)
+
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(self.sheet_name)
+        for col_num, header in enumerate(headers, 1):
+            worksheet.column_dimensions[get_column_letter(col_num)].width = column_widths[header]
+
+        # 헤더 스타일
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(worksheet, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            header_cells.append(cell)
+        worksheet.append(header_cells)
+
+        for row in self._rows:
+            worksheet.append(row)
+
+        workbook.save(self.output)
+        self._rows = []
+        return self.output
+
+
+class ZipExportWriter(ExportWriter):
+    """그룹별 텍스트 파일 + manifest.csv ZIP writer (그룹마다 바로 압축 기록)"""
+    name = 'zip'
+
+    def __init__(self, output):
+        super().__init__(output)
+        self._zip = None
+        self._manifest = io.StringIO()
+        self._manifest_writer = csv.writer(self._manifest)
+        self._used_names = set()
+        self._index = 0
+
+    def open(self, total):
+        self._zip = zipfile.ZipFile(self.output, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._manifest_writer.writerow(['파일명', '그룹ID', '팀명', '발송그룹', '발송인', '연락처', '인원수', '글자수'])
+
+    def write(self, record):
+        group_id, group_info, message = record
+        self._index += 1
+
+        file_name = unique_file_name(build_group_file_name(group_id, group_info), self._used_names, self._index)
+
+        self._zip.writestr(f"messages/{file_name}", message)
+        self._manifest_writer.writerow([
+            file_name,
+            group_id,
+            group_info.get('team_name', ''),
+            group_info.get('sender_group', ''),
+            group_info.get('sender', ''),
+            group_info.get('contact', ''),
+            group_info.get('group_size', len(group_info.get('members', []))),
+            len(message)
+        ])
+
+    def close(self):
+        self._zip.writestr('manifest.csv', '\ufeff' + self._manifest.getvalue())
+        self._zip.close()
+        return self.output
+
+
+class SmsGatewayExportWriter(ExportWriter):
+    """문자 발송 시스템용 writer (run_export로 다른 형식과 함께 만들 때 사용)
+
+    레코드에서 연락처와 메시지만 모았다가 close()에서 sms_gateway_frame으로 한 번에 만들어
+    청크 단위로 기록합니다. output이 None이면 DataFrame만 만들어 frame에 보관합니다.
+    발송 파일만 만들 때는 sms_gateway_frame_from_messages로 컬럼을 바로 모으는 편이 빠릅니다.
+    """
+    name = 'gateway'
+
+    def __init__(self, output=None, fmt='jsonl', phone_column=None, drop_invalid=False, name=None):
+        super().__init__(output)
+        self.fmt = fmt
+        self.name = name or self.name
+        self.phone_column = phone_column
+        self.drop_invalid = drop_invalid
+        self.frame = None
+        self.skipped = 0
+        self._group_ids = []
+        self._phones = []
+        self._messages = []
+
+    def write(self, record):
+        group_id, group_info, message = record
+        if self.phone_column is None:
+            self.phone_column = find_phone_column(group_info.keys()) or ''
+        self._group_ids.append(group_id)
+        self._phones.append(group_info.get(self.phone_column, ''))
+        self._messages.append(message)
+
+    def close(self):
+        frame, self.skipped = sms_gateway_frame(self._group_ids, self._phones, self._messages, self.drop_invalid)
+        self.frame = frame
+
+        if self.output is not None:
+            write_sms_gateway_export(frame, self.output, self.fmt)
+        return self.output if self.output is not None else frame
+
+
+# --- 내보내기 엔진 ---
+
+def excel_order_ids(generated_messages: Dict) -> List[str]:
+    """그룹ID를 엑셀 행 순서로 정렬"""
+    return sorted(generated_messages, key=lambda group_id: generated_messages[group_id]['group_info'].get('excel_order', 0))
+
+def iter_export_records(generated_messages: Dict, edited_messages: Optional[Dict] = None,
+                        ordered_ids: Optional[List[str]] = None) -> List[ExportRecord]:
+    """엑셀 순서로 정렬하고 수정본을 반영한 내보내기 레코드 목록 생성
+
+    ordered_ids(생성 시 만든 정렬 인덱스)를 넘기면 다시 정렬하지 않습니다.
+    """
+    edited_messages = edited_messages or {}
+    if ordered_ids is None:
+        ordered_ids = excel_order_ids(generated_messages)
+    return [
+        ExportRecord(group_id, generated_messages[group_id]['group_info'],
+                     edited_messages.get(group_id, generated_messages[group_id]['message']))
+        for group_id in ordered_ids
+    ]
+
+def run_export(records: Iterable, writers: List[ExportWriter],
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               cancel_check: Optional[Callable[[], bool]] = None) -> Dict[str, object]:
+    """레코드를 한 번만 순회하면서 모든 writer에 전달
+
+    records는 ExportRecord 또는 (group_id, group_info, message) 튜플의 시퀀스이며,
+    writer 이름별 close() 결과를 담은 딕셔너리를 반환합니다.
+    """
+    records = records if isinstance(records, (list, tuple)) else list(records)
+    total = len(records)
+
+    for writer in writers:
+        writer.open(total)
+
+    for index, record in enumerate(records, 1):
+        if cancel_check and cancel_check():
+            break
+        for writer in writers:
+            writer.write(record)
+        if progress_callback:
+            progress_callback(index, total)
+
+    return {writer.name: writer.close() for writer in writers}
+
+def export_to_bytes(records, fmt: str, progress_callback=None, cancel_check=None, **options) -> bytes:
+    """단일 형식 내보내기 결과를 bytes로 반환 (txt/csv/jsonl은 UTF-8)"""
+    writer = create_export_writer(fmt, **options)
+    output = run_export(records, [writer], progress_callback, cancel_check)[writer.name]
+    value = output.getvalue()
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+def export_formats_concurrently(records, formats: List[str], writer_options: Optional[Dict[str, Dict]] = None,
+                                max_workers: Optional[int] = None,
+                                progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                                cancel_check: Optional[Callable[[], bool]] = None) -> Dict[str, bytes]:
+    """여러 형식을 스레드 풀에서 동시에 만들어 형식별 bytes로 반환
+
+    xlsx 저장과 zip 압축은 대부분 GIL을 놓는 구간에서 실행되므로 순차 실행보다 빠릅니다.
+    progress_callback은 (형식, 처리 수, 전체 수)로 호출됩니다.
+    """
+    records = records if isinstance(records, (list, tuple)) else list(records)
+    writer_options = writer_options or {}
+
+    def build(fmt):
+        callback = (lambda done, total: progress_callback(fmt, done, total)) if progress_callback else None
+        return export_to_bytes(records, fmt, callback, cancel_check, **writer_options.get(fmt, {}))
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(formats), thread_name_prefix='export') as pool:
+        futures = {fmt: pool.submit(build, fmt) for fmt in formats}
+        return {fmt: future.result() for fmt, future in futures.items()}
+
+def partition_records_by_team(records) -> "OrderedDict[str, List[ExportRecord]]":
+    """레코드를 팀명별로 나눔 (팀 순서와 팀 내 순서는 그대로 유지)"""
+    partitions = OrderedDict()
+    for record in records:
+        record = ExportRecord(*record)
+        partitions.setdefault(str(record.group_info.get('team_name', '')), []).append(record)
+    return partitions
+
+def _build_team_workbook(records) -> bytes:
+    """팀 하나의 엑셀 파일 생성 (프로세스 풀 작업 함수)"""
+    return export_to_bytes(records, 'xlsx', columns=RESULT_COLUMNS, sheet_name='메시지')
+
+def export_team_workbooks(records, output, max_workers: Optional[int] = None,
+                          progress_callback: Optional[Callable[[int, int], None]] = None,
+                          cancel_check: Optional[Callable[[], bool]] = None):
+    """팀별 엑셀 파일을 프로세스 풀에서 만들어 하나의 ZIP으로 output에 기록
+
+    openpyxl은 스레드 안전하지 않으므로 팀마다 별도 프로세스에서 워크북을 만듭니다.
+    """
+    partitions = partition_records_by_team(records)
+    total = len(partitions)
+    workers = min(max_workers or os.cpu_count() or 1, total)
+    # 팀명이 같은 파일명으로 바뀌는 경우(예: "A/B"와 "A:B") ZIP 안에서 덮어쓰지 않도록 미리 이름을 정함
+    used_names = set()
+    file_names = {
+        team_name: unique_file_name(f"{safe_file_name(team_name)}.xlsx", used_names)
+        for team_name in partitions
+    }
+
+    # xlsx는 이미 압축된 형식이므로 ZIP에는 무압축으로 저장
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as zf:
+        if workers <= 1:
+            for done, (team_name, team_records) in enumerate(partitions.items(), 1):
+                if cancel_check and cancel_check():
+                    break
+                zf.writestr(file_names[team_name], _build_team_workbook(team_records))
+                if progress_callback:
+                    progress_callback(done, total)
+            return output
+
+        # 스레드가 있는 서버 프로세스를 fork하지 않도록 spawn 사용
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        cancelled = False
+        try:
+            futures = {
+                pool.submit(_build_team_workbook, team_records): team_name
+                for team_name, team_records in partitions.items()
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                if cancel_check and cancel_check():
+                    cancelled = True
+                    break
+                zf.writestr(file_names[futures[future]], future.result())
+                if progress_callback:
+                    progress_callback(done, total)
+        finally:
+            # 취소했으면 대기 중인 팀은 버리고, 실행 중인 워크북이 끝나기를 기다리지 않음
+            pool.shutdown(wait=not cancelled, cancel_futures=cancelled)
+
+    return output
+
+def create_export_writer(fmt: str, output=None, **options) -> ExportWriter:
+    """형식 이름으로 writer 생성 (output을 생략하면 메모리 버퍼 사용)"""
+    if fmt == 'txt':
+        return TextExportWriter(output if output is not None else io.StringIO(), **options)
+    if fmt == 'csv':
+        return CsvExportWriter(output if output is not None else io.StringIO(), **options)
+    if fmt == 'xlsx':
+        return XlsxExportWriter(output if output is not None else io.BytesIO(), **options)
+    if fmt == 'zip':
+        return ZipExportWriter(output if output is not None else io.BytesIO())
+    if fmt == 'jsonl':
+        return SmsGatewayExportWriter(output if output is not None else io.StringIO(), fmt='jsonl', name='jsonl', **options)
+    raise ValueError(f"지원하지 않는 내보내기 형식입니다: {fmt}")
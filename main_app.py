@@ -6,10 +6,59 @@ import re
 from datetime import datetime
 import zipfile
 import io
-from enhanced_processor import EnhancedDataProcessor, EnhancedMessageGenerator
+import inspect
+import tempfile
+from enhanced_processor import EnhancedDataProcessor, EnhancedMessageGenerator, build_message_order, select_preview_group_ids
 from ui_helpers import *
+from export_engine import (
+    TextExportWriter, XlsxExportWriter, RESULT_COLUMNS,
+    iter_export_records, run_export, export_to_bytes, export_formats_concurrently,
+    export_team_workbooks, sms_gateway_frame_from_messages, write_sms_gateway_export
+)
 from preset_manager import PresetManager
 from template_manager import TemplateManager
+from background_tasks import BackgroundTask, TaskRegistry
+from search_index import NgramSearchIndex
+from shared_cache import (
+    content_hash, file_content_hash, table_cache_key, cached_sheet_names, cached_read_sheet,
+    cached_column_profiles, cached_compiled_template, get_shared_cache, prefetch_sheets
+)
+from session_memory import SessionMemoryManager
+from edit_overlay import EditOverlay, select_group_ids, count_matches, apply_replace
+from pipeline import PipelineCancelled, SpeculativeStage, get_generation_pipeline, wait_for_build
+from checkpoints import CheckpointStore
+
+# ZIP 묶음 파일이 이 크기를 넘으면 메모리 대신 임시 파일에 기록
+ZIP_SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+# 업로드 단계에서 시트를 읽는 옵션 (미리 읽기도 같은 옵션으로 캐시에 넣어야 시트 전환 시 재사용됨)
+SHEET_PREVIEW_OPTIONS = {'header': None, 'dtype': str, 'fillna': ''}
+
+# 템플릿 미리보기에서 넘겨 볼 앞쪽 그룹 수 (가장 긴 메시지, 빈 값이 가장 많은 그룹은 별도로 추가)
+PREVIEW_SAMPLE_COUNT = 5
+
+# 빠른 삽입 패널의 페이지당 컬럼 수
+COLUMN_PAGE_SIZE = 12
+# 값이 있는 셀 중 이 비율 이상이 숫자면 숫자 삽입 버튼 표시
+NUMERIC_COLUMN_RATIO = 0.8
+
+# 메시지 생성 작업이 만드는 파이프라인 단계
+GENERATION_TARGETS = ('fixed_data', 'groups', 'render')
+
+# 결과 화면 그룹 목록의 페이지당 그룹 수 선택지
+GROUP_PAGE_SIZES = [20, 50, 100, 200]
+# 그룹 목록 이전/다음 페이지 키보드 단축키 (버튼 단축키를 지원하지 않는 Streamlit 버전에서는 버튼만 표시)
+GROUP_PAGE_SHORTCUTS = ('PageUp', 'PageDown')
+BUTTON_SHORTCUTS_SUPPORTED = 'shortcut' in inspect.signature(st.button).parameters
+
+# '모든 형식 한 번에 준비'에서 동시에 만드는 형식과 writer 옵션
+EXPORT_ALL_FORMATS = ['txt', 'xlsx', 'csv', 'zip']
+EXPORT_ALL_OPTIONS = {
+    'txt': {'layout': 'results'},
+    'xlsx': {'columns': RESULT_COLUMNS, 'sheet_name': '메시지'},
+    'csv': {'columns': RESULT_COLUMNS}
+}
+EXPORT_FORMAT_LABELS = {'txt': '📄 텍스트', 'xlsx': '📊 엑셀', 'csv': '📋 CSV', 'zip': '🗜️ ZIP'}
 
 # 페이지 설정
 st.set_page_config(
@@ -106,12 +155,20 @@ def main():
         
         # 리셋 버튼
         if st.button("🔄 처음부터 다시", type="secondary"):
+            get_session_memory_manager().clear()
+            cancel_generation_job(st.session_state.get('generation_job_id'))
             for key in list(st.session_state.keys()):
                 if key not in ['current_step']:
                     del st.session_state[key]
             st.session_state.current_step = 1
             st.rerun()
     
+    # 새로고침 전에 시작한 메시지 생성 작업이 있으면 이어 받음
+    resume_generation_job()
+    
+    # 현재 단계에 필요한 데이터는 불러오고, 메모리 예산을 넘으면 쓰지 않는 큰 데이터는 디스크로
+    get_session_memory_manager().run_step(st.session_state.current_step)
+    
     # 메인 컨텐츠
     if st.session_state.current_step == 1:
         show_file_upload_step()
@@ -124,6 +181,18 @@ def main():
     elif st.session_state.current_step == 5:
         show_results_step()
 
+@st.cache_resource
+def get_task_registry():
+    """모든 세션이 함께 쓰는 백그라운드 작업 목록 (서버 프로세스당 하나)"""
+    return TaskRegistry()
+
+def get_session_memory_manager():
+    """현재 세션의 메모리 관리자 (새 세션이면 끝난 세션이 남긴 파일부터 정리)"""
+    if '_memory_session_id' not in st.session_state:
+        SessionMemoryManager.cleanup_stale()
+        CheckpointStore().cleanup_stale()
+    return SessionMemoryManager(st.session_state)
+
 def show_file_upload_step():
     st.header("1️⃣ 엑셀 파일 업로드")
 
@@ -152,8 +221,8 @@ def show_file_upload_step():
             if uploaded_file is not None:
                 with st.spinner("📊 파일을 분석하고 있습니다..."):
                     try:
-                        excel_file = pd.ExcelFile(uploaded_file)
-                        sheet_names = excel_file.sheet_names
+                        file_hash = get_uploaded_file_hash(uploaded_file)
+                        sheet_names = cached_sheet_names(uploaded_file, file_hash)
 
                         st.success(f"✅ 파일 업로드 성공!")
                         
@@ -173,10 +242,15 @@ def show_file_upload_step():
                         )
 
                         if selected_sheet:
+                            # 나머지 시트는 백그라운드에서 미리 읽어 두어 시트를 바꿀 때 바로 표시
+                            prefetch_task = start_sheet_prefetch(uploaded_file, file_hash, sheet_names, selected_sheet)
+
                             # ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼ [핵심 수정 부분] ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
                             # dtype=str 옵션을 추가하여 모든 데이터를 문자로 읽어오도록 강제
-                            df_preview = pd.read_excel(uploaded_file, sheet_name=selected_sheet, header=None, dtype=str).fillna('')
+                            # (미리 읽기가 같은 시트를 읽는 중이면 중복으로 읽지 않고 기다림)
+                            df_preview = cached_read_sheet(uploaded_file, file_hash, selected_sheet, **SHEET_PREVIEW_OPTIONS)
                             # ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
+                            show_sheet_prefetch(prefetch_task)
 
                             st.markdown("**🔍 데이터 미리보기:**")
                             st.dataframe(
@@ -291,9 +365,11 @@ def show_mapping_step():
         try:
             header_row = st.session_state.header_row
             # 빈 열이 삭제되지 않도록 .dropna(how='all', axis=1) 제거
-            df_table = pd.read_excel(st.session_state.uploaded_file, sheet_name=st.session_state.selected_sheet, header=header_row - 1)
-            # 컬럼명의 앞뒤 공백 제거
-            df_table.columns = df_table.columns.str.strip()
+            # 컬럼명의 앞뒤 공백 제거 (세션 간 공유되는 캐시 사용)
+            df_table = cached_read_sheet(
+                st.session_state.uploaded_file, get_uploaded_file_hash(st.session_state.uploaded_file),
+                st.session_state.selected_sheet, header=header_row - 1, strip_columns=True
+            )
             
             available_columns = ["👆 선택하세요"] + df_table.columns.tolist()
 
@@ -397,8 +473,12 @@ def show_mapping_step():
             },
             "column_mappings": column_mappings
         }
+        
+        # 매핑이 완성되었으므로 생성 단계를 기다리지 않고 그룹 테이블을 미리 만들어 둠
+        show_speculative_group_build(start_speculative_group_build())
     else:
         mapping_ready = False
+        cancel_speculative_group_build()
 
     # 네비게이션
     st.markdown("---")
@@ -415,6 +495,41 @@ def show_mapping_step():
         st.success("✅ 간단 매핑이 완료되었습니다! 이제 스마트 템플릿을 설정해보세요.")
         st.rerun()
                   
+def get_speculative_group_build_state():
+    """세션의 그룹 테이블 미리 생성 상태 (생성 파이프라인의 그룹 단계)"""
+    if 'speculative_groups' not in st.session_state:
+        st.session_state.speculative_groups = SpeculativeStage(
+            get_generation_pipeline(), 'groups', get_shared_cache(), CheckpointStore()
+        )
+    return st.session_state.speculative_groups
+
+def start_speculative_group_build():
+    """현재 매핑으로 그룹 테이블을 백그라운드에서 미리 생성 (매핑이 바뀌면 이전 작업은 취소하고 새로 시작)
+
+    이미 만들어진 그룹 테이블이 있으면 시작하지 않고 None을 반환합니다.
+    """
+    return get_speculative_group_build_state().start(get_pipeline_context())
+
+def cancel_speculative_group_build():
+    """매핑이 더 이상 유효하지 않으면 미리 생성 작업을 무효화"""
+    if 'speculative_groups' in st.session_state:
+        st.session_state.speculative_groups.cancel()
+
+def get_speculative_group_build(context):
+    """생성할 매핑과 같은 매핑으로 시작된 미리 생성 작업 (없거나 매핑이 다르면 None)"""
+    if 'speculative_groups' not in st.session_state:
+        return None
+    return st.session_state.speculative_groups.task_for(context)
+
+def show_speculative_group_build(task):
+    """그룹 테이블 미리 생성 상태 표시"""
+    if task is None:
+        st.caption("⚡ 이 매핑의 그룹 테이블이 이미 준비되어 있습니다.")
+    elif task.is_running():
+        st.caption("⚡ 메시지 생성을 빠르게 하도록 그룹 테이블을 미리 만들고 있습니다...")
+    elif task.is_done():
+        st.caption(f"⚡ 그룹 {len(task.result)}개를 미리 만들어 두었습니다.")
+
 def preview_fixed_data(fixed_mapping):
     """고정 정보 미리보기"""
     try:
@@ -476,24 +591,9 @@ def show_template_step():
             st.rerun()
         return
 
-    # --- 1. 엑셀 데이터 및 컬럼 정보 준비 ---
+    # --- 1. 엑셀 데이터 및 컬럼 정보 준비 (파일/시트/매핑이 바뀔 때만 다시 생성) ---
     try:
-        header_row = st.session_state.mapping_data.get('table_settings', {}).get('header_row', 1)
-        df_table = pd.read_excel(st.session_state.uploaded_file, sheet_name=st.session_state.selected_sheet, header=header_row - 1, dtype=str).fillna('')
-        excel_columns = df_table.columns.tolist()
-        
-        # 미리보기용 첫 번째 행 데이터
-        preview_data = {}
-        if not df_table.empty:
-            first_row = df_table.iloc[0]
-            for col in excel_columns:
-                preview_data[col] = first_row[col] if pd.notna(first_row[col]) else ""
-        
-        # 고정 데이터 추가
-        fixed_data_mapping = st.session_state.mapping_data.get('fixed_data_mapping', {})
-        for var_name, cell in fixed_data_mapping.items():
-            preview_data[var_name] = get_cell_value(st.session_state.sheet_data, cell)
-            
+        excel_columns, preview_data = get_template_inputs()
     except Exception as e:
         st.error(f"엑셀 데이터 로드 실패: {e}")
         return
@@ -514,17 +614,229 @@ def show_template_step():
     # 편집 중인 템플릿을 위한 임시 변수 초기화
     if 'temp_template_editing' not in st.session_state:
         st.session_state.temp_template_editing = st.session_state.smart_template
+    # 라이브러리/파일에서 불러온 템플릿 반영
+    apply_pending_template_content()
+
+    # --- 3. 메인 편집기 및 미리보기 (입력 시 이 영역만 다시 실행) ---
+    show_template_editor(template_manager, file_template_key, preview_data, excel_columns)
+
+    # --- 4. 빠른 삽입 패널 (버튼/검색 시 이 영역만 다시 실행) ---
+    st.markdown("---")
+    st.markdown("### 🚀 빠른 삽입 패널")
+    show_quick_insert_panel(excel_columns, get_column_profiles())
+
+    # --- 5. 템플릿 파일 관리 ---
+    with st.expander("📁 템플릿 파일 관리", expanded=False):
+        show_template_library(template_manager)
+
+    # --- 6. 네비게이션 ---
+    st.markdown("---")
+    
+    # 템플릿 검증
+    validation = validate_smart_template(
+            st.session_state.smart_template, 
+            excel_columns,
+            ["product_name", "payment_due_date", "base_exchange_rate", 
+            "current_exchange_rate", "exchange_rate_diff", "company_burden",  # 추가
+            "exchange_burden",
+            "bank_account", "group_members_text", "group_size",               # 추가
+            "additional_fee_per_person"]
+        )
+    
+    nav_cols = st.columns([1, 1])
+    
+    if nav_cols[0].button("⬅️ 이전 단계", use_container_width=True):
+        st.session_state.current_step = 2
+        st.rerun()
+    
+    # 진행 가능 여부 체크
+    can_proceed = not validation.get('errors', [])
+    
+    # 편집 중인 내용이 있는데 적용하지 않은 경우
+    if st.session_state.temp_template_editing != st.session_state.smart_template:
+        st.warning("⚠️ 편집한 내용을 적용하지 않았습니다. '적용하기' 버튼을 먼저 클릭하세요.")
+        can_proceed = False
+    
+    if nav_cols[1].button(
+        "➡️ 다음 단계", 
+        type="primary", 
+        use_container_width=True, 
+        disabled=not can_proceed
+    ) and can_proceed:
+        # 템플릿을 파일에 자동 저장 (편집기 영역만 다시 실행된 뒤 눌렸을 수 있으므로 진행 가능 여부를 다시 확인)
+        template_manager.save_file_template(file_template_key, st.session_state.smart_template)
+        st.session_state.template = st.session_state.smart_template
+        st.session_state.current_step = 4
+        st.success("✅ 템플릿이 저장되고 다음 단계로 이동합니다!")
+        st.rerun()
+    
+    # 검증 오류 표시
+    if validation.get('errors'):
+        st.error("**⚠️ 템플릿 오류:**")
+        for error in validation['errors']:
+            st.write(f"• {error}")
+
+    # --- 7. 사이드바 도움말 ---
+    with st.sidebar:
+        st.markdown("### 💡 템플릿 편집 도움말")
+        st.markdown("""
+        **✏️ 편집 방법:**
+        1. 편집기에서 내용 수정
+        2. **'적용하기'** 버튼 클릭
+        3. 미리보기에서 결과 확인
+        
+        **📌 중요:**
+        - 편집 후 반드시 '적용하기' 클릭
+        - 미리보기는 적용된 내용만 표시
+        - 다음 단계 전 자동 저장됨
+        
+        **🔤 템플릿 문법:**
+        - `[컬럼:컬럼명]` - 텍스트 값
+        - `[컬럼:컬럼명:,]` - 숫자 (천단위)
+        - `{변수명}` - 시스템 변수
+        """)
+        
+        with st.expander("🚨 문제 해결"):
+            st.markdown("""
+            **편집 내용이 사라짐:**
+            → '적용하기' 버튼을 클릭하세요
+            
+            **미리보기가 갱신 안됨:**
+            → '적용하기' 후 확인하세요
+            
+            **다음 단계 진행 불가:**
+            → 편집 내용을 먼저 적용하세요
+            """)
+                                 
+def get_template_inputs():
+    """템플릿 단계의 (엑셀 컬럼 목록, 미리보기 데이터) 반환 (파일/시트/헤더 행/고정 정보 매핑별로 한 번만 생성)"""
+    mapping_data = st.session_state.mapping_data
+    header_row = mapping_data.get('table_settings', {}).get('header_row', 1)
+    fixed_data_mapping = mapping_data.get('fixed_data_mapping', {})
+    file_hash = get_uploaded_file_hash(st.session_state.uploaded_file)
+    cache_key = content_hash(file_hash, st.session_state.selected_sheet, header_row, fixed_data_mapping)
+    
+    cached = st.session_state.get('template_inputs')
+    if cached and cached['key'] == cache_key:
+        return cached['excel_columns'], cached['preview_data']
+    
+    df_table = cached_read_sheet(
+        st.session_state.uploaded_file, file_hash,
+        st.session_state.selected_sheet, header=header_row - 1, dtype=str, fillna=''
+    )
+    excel_columns = df_table.columns.tolist()
+    
+    # 미리보기용 첫 번째 행 데이터
+    preview_data = {}
+    if not df_table.empty:
+        first_row = df_table.iloc[0]
+        for col in excel_columns:
+            preview_data[col] = first_row[col] if pd.notna(first_row[col]) else ""
+    
+    # 고정 데이터 추가
+    for var_name, cell in fixed_data_mapping.items():
+        preview_data[var_name] = get_cell_value(st.session_state.sheet_data, cell)
+    
+    st.session_state.template_inputs = {'key': cache_key, 'excel_columns': excel_columns, 'preview_data': preview_data}
+    return excel_columns, preview_data
 
-    # --- 3. 메인 편집기 및 미리보기 ---
+def get_preview_groups():
+    """템플릿 미리보기용 (그룹 테이블, 고정 정보, 데이터 키) 반환 (컬럼 매핑이 완성되지 않았으면 None)"""
+    mapping_data = st.session_state.mapping_data
+    column_mappings = mapping_data.get('column_mappings', {})
+    try:
+        # 생성 단계와 같은 공유 캐시 그룹 테이블을 사용 (4단계에서 다시 만들지 않음)
+        group_data = build_group_table(column_mappings)
+    except Exception:
+        return None
+    if not group_data:
+        return None
+    
+    fixed_data = EnhancedDataProcessor().extract_fixed_data(
+        st.session_state.sheet_data, mapping_data.get('fixed_data_mapping', {})
+    )
+    data_key = content_hash(
+        get_uploaded_file_hash(st.session_state.uploaded_file), st.session_state.selected_sheet,
+        mapping_data["table_settings"]["header_row"], column_mappings, fixed_data
+    )
+    return group_data, fixed_data, data_key
+
+def get_template_preview_samples(template):
+    """샘플 그룹 목록과 그룹별 미리보기 함수 반환 (미리보기는 (템플릿 해시, 그룹ID)별로 캐시)"""
+    preview = get_preview_groups()
+    if preview is None:
+        return None, None
+    group_data, fixed_data, data_key = preview
+    template_hash = content_hash(template)
+    compiled = cached_compiled_template(template)
+    cache = get_shared_cache()
+    
+    sample_ids = cache.get_or_create(
+        ('preview_samples', template_hash, data_key, PREVIEW_SAMPLE_COUNT),
+        lambda: select_preview_group_ids(compiled, group_data, fixed_data, PREVIEW_SAMPLE_COUNT)
+    )
+    samples = []
+    for group_id, note in sample_ids:
+        group_info = group_data[group_id]
+        label = f"{group_id} · {group_info.get('team_name', '')} {group_info.get('sender', '')}님"
+        samples.append((group_id, f"{label} ({note})" if note else label))
+    
+    message_generator = EnhancedMessageGenerator()
+    
+    def render_sample(group_id):
+        return cache.get_or_create(
+            ('preview', template_hash, data_key, group_id),
+            lambda: message_generator.render_message(compiled, group_data[group_id], fixed_data)
+        )
+    
+    return samples, render_sample
+
+def apply_template_content(content, notice=None):
+    """불러온 템플릿을 적용하도록 예약하고 전체 다시 실행 (편집기 위젯이 만들어지기 전에 반영)"""
+    st.session_state.pending_template_content = (content, notice)
+    st.rerun()
+
+def apply_pending_template_content():
+    """예약된 템플릿을 적용하고 편집기 내용도 바꿈"""
+    pending = st.session_state.pop('pending_template_content', None)
+    if pending:
+        content, notice = pending
+        st.session_state.smart_template = content
+        st.session_state.temp_template_editing = content
+        st.session_state.template_editor_area = content
+        if notice:
+            st.session_state.template_step_notice = notice
+
+def set_insert_ready_text(text):
+    """빠른 삽입 패널에 표시할 코드 설정 (버튼 콜백)"""
+    st.session_state.insert_ready_text = text
+
+def delete_library_template(template_manager, template_id, name):
+    """라이브러리 템플릿 삭제 (버튼 콜백)"""
+    if template_id and template_manager.delete_template(template_id):
+        st.session_state.template_library_notice = ('success', f"✅ '{name}' 템플릿을 삭제했습니다!")
+
+def save_library_template(template_manager, name):
+    """현재 템플릿을 라이브러리에 저장 (버튼 콜백)"""
+    try:
+        template_manager.create_user_template(name=name, content=st.session_state.smart_template)
+        st.session_state.template_library_notice = ('success', f"✅ '{name}' 템플릿을 저장했습니다!")
+    except Exception as e:
+        st.session_state.template_library_notice = ('error', f"저장 실패: {e}")
+
+@st.fragment
+def show_template_editor(template_manager, file_template_key, preview_data, excel_columns):
+    """템플릿 편집기와 미리보기 (입력할 때 이 영역만 다시 실행)"""
     col_editor, col_preview = st.columns([1, 1], gap="large")
     
     with col_editor:
         st.markdown("##### ✍️ 스마트 템플릿 편집기")
         
-        # 텍스트 에디터 - key를 고정하여 값이 유지되도록 함
+        # 텍스트 에디터 - key를 고정하여 값이 유지되도록 함 (초기값은 세션 상태로 지정)
+        if 'template_editor_area' not in st.session_state:
+            st.session_state.template_editor_area = st.session_state.temp_template_editing
         template_input = st.text_area(
             "Smart Template Editor", 
-            value=st.session_state.temp_template_editing,
             height=350, 
             key="template_editor_area",
             label_visibility="collapsed",
@@ -547,9 +859,12 @@ def show_template_step():
         )
         
         if apply_clicked:
-            # 편집된 내용을 실제 템플릿으로 적용
+            # 편집된 내용을 실제 템플릿으로 적용 (검증/다음 단계 버튼도 갱신되도록 전체 다시 실행)
             st.session_state.smart_template = st.session_state.temp_template_editing
-            st.success("✅ 템플릿이 적용되었습니다!")
+            st.session_state.template_step_notice = "✅ 템플릿이 적용되었습니다!"
+            st.rerun()
+        if st.session_state.get('template_step_notice'):
+            st.success(st.session_state.pop('template_step_notice'))
         
         # 파일 저장 버튼
         save_clicked = col_save.button(
@@ -572,13 +887,43 @@ def show_template_step():
             st.info("💡 편집한 내용이 있습니다. '적용하기' 버튼을 눌러 미리보기를 갱신하세요.")
     
     with col_preview:
-        # 현재 적용된 템플릿으로 미리보기 표시
-        show_smart_template_preview(st.session_state.smart_template, preview_data, excel_columns)
-
-    # --- 4. 빠른 삽입 패널 ---
-    st.markdown("---")
-    st.markdown("### 🚀 빠른 삽입 패널")
+        # 현재 적용된 템플릿으로 샘플 그룹 미리보기 표시 (그룹을 만들 수 없으면 첫 번째 행 기준)
+        samples, render_sample = get_template_preview_samples(st.session_state.smart_template)
+        show_smart_template_preview(st.session_state.smart_template, preview_data, excel_columns,
+                                    samples=samples, render_sample=render_sample)
+
+def reset_column_page():
+    """컬럼 검색어가 바뀌면 첫 페이지로 (입력 콜백)"""
+    st.session_state.col_page = 1
+
+def show_column_insert_card(col, column_profiles, position):
+    """컬럼 하나의 샘플 값과 삽입 버튼 (숫자 버튼은 숫자 컬럼일 때만)"""
+    profile = None
+    if column_profiles is not None and str(col).strip() in column_profiles.index:
+        profile = column_profiles.loc[str(col).strip()]
+        if isinstance(profile, pd.DataFrame):
+            profile = profile.iloc[0]
+    
+    st.markdown(f"**{col}**")
+    if profile is not None:
+        # 샘플 값 표시
+        sample_val = ", ".join(profile['samples'][:2])
+        if len(sample_val) > 15:
+            sample_val = sample_val[:15] + "..."
+        st.caption(f"예: {sample_val or '-'} · 빈 값 {profile['null_rate']:.0%}")
+    
+    # 텍스트 삽입 버튼
+    st.button(f"📄 텍스트", key=f"txt_{position}", use_container_width=True,
+              on_click=set_insert_ready_text, args=(f"[컬럼:{col}]",))
     
+    # 숫자 삽입 버튼 (숫자형일 때만)
+    if profile is not None and profile['numeric_ratio'] >= NUMERIC_COLUMN_RATIO:
+        st.button(f"🔢 숫자", key=f"num_{position}", use_container_width=True,
+                  on_click=set_insert_ready_text, args=(f"[컬럼:{col}:,]",))
+
+@st.fragment
+def show_quick_insert_panel(excel_columns, column_profiles):
+    """빠른 삽입 패널 (삽입 버튼, 컬럼 검색 시 이 영역만 다시 실행)"""
     # 삽입 대기 텍스트 초기화
     if 'insert_ready_text' not in st.session_state:
         st.session_state.insert_ready_text = ""
@@ -592,9 +937,7 @@ def show_template_step():
             # 복사하기 쉽도록 code 블록으로 표시
             st.code(st.session_state.insert_ready_text, language="text")
         with col_clear:
-            if st.button("❌ 닫기", use_container_width=True):
-                st.session_state.insert_ready_text = ""
-                st.rerun()
+            st.button("❌ 닫기", use_container_width=True, on_click=set_insert_ready_text, args=("",))
     
     # 빠른 삽입 탭
     tab_columns, tab_fixed, tab_auto = st.tabs(["📊 엑셀 컬럼", "🏷️ 고정 정보", "⚡ 자동 계산"])
@@ -602,50 +945,32 @@ def show_template_step():
     with tab_columns:
         st.markdown("##### 📋 엑셀 컬럼 목록")
         
-        # 검색 기능
-        search_term = st.text_input("🔍 컬럼 검색", placeholder="컬럼명 입력...", key="col_search")
+        # 검색 기능 (검색어가 바뀌면 첫 페이지로)
+        search_term = st.text_input("🔍 컬럼 검색", placeholder="컬럼명 입력...", key="col_search",
+                                    on_change=reset_column_page)
         filtered_columns = [col for col in excel_columns if search_term.lower() in str(col).lower()] if search_term else excel_columns
         
         if not filtered_columns:
             st.info("검색 결과가 없습니다.")
         else:
+            # 현재 페이지의 컬럼만 위젯 생성
+            total_pages = max(1, -(-len(filtered_columns) // COLUMN_PAGE_SIZE))
+            if st.session_state.get('col_page', 1) > total_pages:
+                st.session_state.col_page = total_pages
+            if total_pages > 1:
+                page = st.number_input("페이지", min_value=1, max_value=total_pages, key="col_page")
+                st.caption(f"총 {len(filtered_columns)}개 컬럼 ({page}/{total_pages} 페이지)")
+            else:
+                page = 1
+            start = (page - 1) * COLUMN_PAGE_SIZE
+            page_columns = filtered_columns[start:start + COLUMN_PAGE_SIZE]
+            
             # 3열로 표시
-            for i in range(0, len(filtered_columns), 3):
+            for i in range(0, len(page_columns), 3):
                 cols = st.columns(3)
-                for j, col in enumerate(filtered_columns[i:i+3]):
-                    if j < len(cols):
-                        with cols[j]:
-                            # 샘플 값 표시
-                            sample_val = str(preview_data.get(col, ""))[:15]
-                            if len(str(preview_data.get(col, ""))) > 15:
-                                sample_val += "..."
-                            
-                            # 숫자 타입 추정
-                            is_numeric = False
-                            sample_value = preview_data.get(col, "")
-                            try:
-                                if isinstance(sample_value, (int, float)):
-                                    is_numeric = True
-                                elif isinstance(sample_value, str):
-                                    clean_val = sample_value.replace(',', '').replace('.', '').replace('-', '').strip()
-                                    if clean_val and clean_val.isdigit():
-                                        is_numeric = True
-                            except:
-                                pass
-                            
-                            st.markdown(f"**{col}**")
-                            st.caption(f"예: {sample_val}")
-                            
-                            # 텍스트 삽입 버튼
-                            if st.button(f"📄 텍스트", key=f"txt_{col}_{i}_{j}", use_container_width=True):
-                                st.session_state.insert_ready_text = f"[컬럼:{col}]"
-                                st.rerun()
-                            
-                            # 숫자 삽입 버튼 (숫자형일 때만)
-                            if is_numeric:
-                                if st.button(f"🔢 숫자", key=f"num_{col}_{i}_{j}", use_container_width=True):
-                                    st.session_state.insert_ready_text = f"[컬럼:{col}:,]"
-                                    st.rerun()
+                for j, col in enumerate(page_columns[i:i+3]):
+                    with cols[j]:
+                        show_column_insert_card(col, column_profiles, start + i + j)
     
     with tab_fixed:
         st.markdown("##### 🏷️ 고정 정보 변수")
@@ -663,9 +988,8 @@ def show_template_step():
         cols = st.columns(2)
         for i, (var_code, var_name, desc) in enumerate(fixed_vars):
             with cols[i % 2]:
-                if st.button(f"🏷️ {var_name}", key=f"fixed_{var_code}", help=desc, use_container_width=True):
-                    st.session_state.insert_ready_text = f"{{{var_code}}}"
-                    st.rerun()
+                st.button(f"🏷️ {var_name}", key=f"fixed_{var_code}", help=desc, use_container_width=True,
+                          on_click=set_insert_ready_text, args=(f"{{{var_code}}}",))
     
     with tab_auto:
         st.markdown("##### ⚡ 자동 계산 변수")
@@ -680,157 +1004,63 @@ def show_template_step():
             with cols[i % 2]:
                 is_numeric = var_code in ["group_size", "additional_fee_per_person"]
                 icon = "🔢" if is_numeric else "📝"
-                if st.button(f"{icon} {var_name}", key=f"auto_{var_code}", help=desc, use_container_width=True):
-                    if is_numeric:
-                        st.session_state.insert_ready_text = f"{{{var_code}:,}}"
-                    else:
-                        st.session_state.insert_ready_text = f"{{{var_code}}}"
-                    st.rerun()
-
-    # --- 5. 템플릿 파일 관리 ---
-    with st.expander("📁 템플릿 파일 관리", expanded=False):
-        tab_upload, tab_library = st.tabs(["📤 파일 업로드", "🗂️ 내 라이브러리"])
-        
-        with tab_upload:
-            st.markdown("##### 템플릿 파일 업로드")
-            uploaded_file = st.file_uploader(
-                "텍스트 파일(.txt) 선택", 
-                type=['txt'],
-                help="저장된 템플릿 파일을 불러옵니다"
-            )
-            
-            if uploaded_file is not None:
-                try:
-                    content = uploaded_file.getvalue().decode("utf-8")
-                    st.text_area("파일 내용", content, height=200, disabled=True)
-                    
-                    if st.button("📥 이 템플릿 적용", type="primary"):
-                        st.session_state.smart_template = content
-                        st.session_state.temp_template_editing = content
-                        st.success("✅ 파일의 템플릿을 적용했습니다!")
-                        st.rerun()
-                        
-                except Exception as e:
-                    st.error(f"파일 읽기 오류: {e}")
-        
-        with tab_library:
-            st.markdown("##### 저장된 템플릿")
-            templates = template_manager.get_user_template_list()
-            
-            if templates:
-                template_dict = {t['name']: t['id'] for t in templates}
-                selected = st.selectbox("템플릿 선택", ["선택 안 함"] + list(template_dict.keys()))
-                
-                col1, col2 = st.columns(2)
-                if col1.button("📂 불러오기", disabled=(selected == "선택 안 함")):
-                    tid = template_dict[selected]
-                    tdata = template_manager.load_template(tid)
-                    if tdata:
-                        st.session_state.smart_template = tdata['content']
-                        st.session_state.temp_template_editing = tdata['content']
-                        st.success(f"✅ '{selected}' 템플릿을 불러왔습니다!")
-                        st.rerun()
-                
-                if col2.button("🗑️ 삭제", disabled=(selected == "선택 안 함")):
-                    tid = template_dict[selected]
-                    if template_manager.delete_template(tid):
-                        st.success(f"✅ '{selected}' 템플릿을 삭제했습니다!")
-                        st.rerun()
-            else:
-                st.info("저장된 템플릿이 없습니다.")
-            
-            st.markdown("---")
-            new_name = st.text_input("새 템플릿 이름")
-            if st.button("💾 현재 템플릿을 라이브러리에 저장", disabled=not new_name):
-                try:
-                    tid = template_manager.create_user_template(
-                        name=new_name,
-                        content=st.session_state.smart_template
-                    )
-                    st.success(f"✅ '{new_name}' 템플릿을 저장했습니다!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"저장 실패: {e}")
-
-    # --- 6. 네비게이션 ---
-    st.markdown("---")
+                insert_text = f"{{{var_code}:,}}" if is_numeric else f"{{{var_code}}}"
+                st.button(f"{icon} {var_name}", key=f"auto_{var_code}", help=desc, use_container_width=True,
+                          on_click=set_insert_ready_text, args=(insert_text,))
+
+@st.fragment
+def show_template_library(template_manager):
+    """템플릿 파일 업로드 및 라이브러리 관리"""
+    tab_upload, tab_library = st.tabs(["📤 파일 업로드", "🗂️ 내 라이브러리"])
     
-    # 템플릿 검증
-    validation = validate_smart_template(
-            st.session_state.smart_template, 
-            excel_columns,
-            ["product_name", "payment_due_date", "base_exchange_rate", 
-            "current_exchange_rate", "exchange_rate_diff", "company_burden",  # 추가
-            "exchange_burden",
-            "bank_account", "group_members_text", "group_size",               # 추가
-            "additional_fee_per_person"]
+    with tab_upload:
+        st.markdown("##### 템플릿 파일 업로드")
+        uploaded_file = st.file_uploader(
+            "텍스트 파일(.txt) 선택", 
+            type=['txt'],
+            help="저장된 템플릿 파일을 불러옵니다"
         )
-    
-    nav_cols = st.columns([1, 1])
-    
-    if nav_cols[0].button("⬅️ 이전 단계", use_container_width=True):
-        st.session_state.current_step = 2
-        st.rerun()
-    
-    # 진행 가능 여부 체크
-    can_proceed = not validation.get('errors', [])
-    
-    # 편집 중인 내용이 있는데 적용하지 않은 경우
-    if st.session_state.temp_template_editing != st.session_state.smart_template:
-        st.warning("⚠️ 편집한 내용을 적용하지 않았습니다. '적용하기' 버튼을 먼저 클릭하세요.")
-        can_proceed = False
-    
-    if nav_cols[1].button(
-        "➡️ 다음 단계", 
-        type="primary", 
-        use_container_width=True, 
-        disabled=not can_proceed
-    ):
-        # 템플릿을 파일에 자동 저장
-        template_manager.save_file_template(file_template_key, st.session_state.smart_template)
-        st.session_state.template = st.session_state.smart_template
-        st.session_state.current_step = 4
-        st.success("✅ 템플릿이 저장되고 다음 단계로 이동합니다!")
-        st.rerun()
-    
-    # 검증 오류 표시
-    if validation.get('errors'):
-        st.error("**⚠️ 템플릿 오류:**")
-        for error in validation['errors']:
-            st.write(f"• {error}")
-
-    # --- 7. 사이드바 도움말 ---
-    with st.sidebar:
-        st.markdown("### 💡 템플릿 편집 도움말")
-        st.markdown("""
-        **✏️ 편집 방법:**
-        1. 편집기에서 내용 수정
-        2. **'적용하기'** 버튼 클릭
-        3. 미리보기에서 결과 확인
         
-        **📌 중요:**
-        - 편집 후 반드시 '적용하기' 클릭
-        - 미리보기는 적용된 내용만 표시
-        - 다음 단계 전 자동 저장됨
-        
-        **🔤 템플릿 문법:**
-        - `[컬럼:컬럼명]` - 텍스트 값
-        - `[컬럼:컬럼명:,]` - 숫자 (천단위)
-        - `{변수명}` - 시스템 변수
-        """)
+        if uploaded_file is not None:
+            try:
+                content = uploaded_file.getvalue().decode("utf-8")
+                st.text_area("파일 내용", content, height=200, disabled=True)
+                
+                if st.button("📥 이 템플릿 적용", type="primary"):
+                    apply_template_content(content, "✅ 파일의 템플릿을 적용했습니다!")
+                    
+            except Exception as e:
+                st.error(f"파일 읽기 오류: {e}")
+    
+    with tab_library:
+        st.markdown("##### 저장된 템플릿")
+        # 삭제/저장은 버튼 콜백에서 처리하므로 목록은 항상 최신 상태
+        notice = st.session_state.pop('template_library_notice', None)
+        if notice:
+            getattr(st, notice[0])(notice[1])
+        templates = template_manager.get_user_template_list()
         
-        with st.expander("🚨 문제 해결"):
-            st.markdown("""
-            **편집 내용이 사라짐:**
-            → '적용하기' 버튼을 클릭하세요
+        if templates:
+            template_dict = {t['name']: t['id'] for t in templates}
+            selected = st.selectbox("템플릿 선택", ["선택 안 함"] + list(template_dict.keys()))
             
-            **미리보기가 갱신 안됨:**
-            → '적용하기' 후 확인하세요
+            col1, col2 = st.columns(2)
+            if col1.button("📂 불러오기", disabled=(selected == "선택 안 함")):
+                tid = template_dict[selected]
+                tdata = template_manager.load_template(tid)
+                if tdata:
+                    apply_template_content(tdata['content'], f"✅ '{selected}' 템플릿을 불러왔습니다!")
             
-            **다음 단계 진행 불가:**
-            → 편집 내용을 먼저 적용하세요
-            """)
-                                 
+            col2.button("🗑️ 삭제", disabled=(selected == "선택 안 함"),
+                        on_click=delete_library_template, args=(template_manager, template_dict.get(selected), selected))
+        else:
+            st.info("저장된 템플릿이 없습니다.")
+        
+        st.markdown("---")
+        new_name = st.text_input("새 템플릿 이름")
+        st.button("💾 현재 템플릿을 라이브러리에 저장", disabled=not new_name,
+                  on_click=save_library_template, args=(template_manager, new_name))
+
 def validate_smart_template(template, excel_columns, system_variables):
     """스마트 템플릿 검증 (숫자 포맷 지원)"""
     errors = []
@@ -851,6 +1081,12 @@ def validate_smart_template(template, excel_columns, system_variables):
 def show_message_generation_step():
     st.header("4️⃣ 메시지 생성")
     
+    # 진행 중인 작업은 새로고침 후 연결된 세션(템플릿 설정이 없음)에서도 이어서 표시
+    job_id, task = get_generation_job()
+    if task is not None:
+        show_generation_progress(job_id)
+        return
+    
     if 'template' not in st.session_state:
         st.warning("⚠️ 먼저 템플릿을 설정해주세요.")
         if st.button("⬅️ 이전 단계로"):
@@ -860,106 +1096,346 @@ def show_message_generation_step():
     
     st.markdown("**🚀 데이터 처리 및 메시지 생성**")
     
+    show_generation_notice()
+    
     if st.button("📊 데이터 처리 및 메시지 생성", type="primary"):
-        with st.spinner("데이터를 처리하고 메시지를 생성하고 있습니다..."):
-            try:
-                # 데이터 처리
-                process_data_and_generate_messages()
-                st.success("✅ 메시지 생성이 완료되었습니다!")
-                st.session_state.current_step = 5
-                st.rerun()
-                
-            except Exception as e:
-                st.error(f"❌ 메시지 생성 중 오류 발생: {str(e)}")
+        try:
+            start_generation_job()
+        except Exception as e:
+            show_error_details(e, "스마트 데이터 처리 및 메시지 생성 준비 중")
+            st.error(f"❌ 메시지 생성 중 오류 발생: {str(e)}")
+        else:
+            st.rerun()
     
     # 네비게이션
     if st.button("⬅️ 이전 단계"):
         st.session_state.current_step = 3
         st.rerun()
 
-def process_data_and_generate_messages():
-    """데이터 처리 및 스마트 메시지 생성 (개선된 버전)"""
-    
+def generate_messages_job(task, context, keys=None, group_build=None):
+    """메시지 생성 파이프라인 실행 (백그라운드 스레드에서 실행, 세션 상태에 접근하지 않음)
+
+    입력이 바뀌지 않은 단계는 이전 결과를 재사용하므로 템플릿만 바꾸면 메시지 생성만 다시 실행됩니다.
+    keys를 넘기면 저장된 단계 키로 디스크 체크포인트에서 이어 갑니다 (서버 재시작 후).
+    group_build가 있으면 진행 중인 그룹 테이블 미리 생성이 끝나기를 기다려 그 결과를 재사용합니다.
+    """
+    if group_build is not None and group_build.is_running():
+        task.report(0, 0, "👥 미리 만들고 있던 그룹 테이블을 기다리는 중...")
+        wait_for_build(group_build)
+    context = dict(
+        context,
+        progress_callback=lambda done, total: task.report(done, total, f"✨ {done}/{total}개 그룹 메시지 생성 중"),
+        cancel_check=task.is_cancelled
+    )
     try:
-        # 향상된 프로세서 초기화
-        data_processor = EnhancedDataProcessor()
-        message_generator = EnhancedMessageGenerator()
-        
-        # 1. 고정 데이터 추출
-        df_raw = st.session_state.sheet_data
-        fixed_data = data_processor.extract_fixed_data(
-            df_raw, 
-            st.session_state.mapping_data["fixed_data_mapping"]
-        )
-        st.session_state.fixed_data = fixed_data
-        
-        # 진행 상황 표시
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        status_text.text("🔍 고정 정보 추출 완료...")
-        progress_bar.progress(20)
-        
-        # 2. 테이블 데이터 읽기
-        header_row = st.session_state.mapping_data["table_settings"]["header_row"] - 1
-        customer_df = pd.read_excel(st.session_state.uploaded_file, 
-                                   sheet_name=st.session_state.selected_sheet, 
-                                   header=header_row)
-        
-        # [해결 코드] 여기서도 컬럼명 공백을 제거합니다.
-        customer_df.columns = customer_df.columns.str.strip()
-        
-        status_text.text("📊 테이블 데이터 로드 완료...")
-        progress_bar.progress(40)
-        
-        # 3. 그룹 데이터 생성 (컬럼 매핑 정보 전달)
-        column_mappings = st.session_state.mapping_data["column_mappings"]
-        group_data = data_processor.process_group_data_dynamic(
-            customer_df,
-            column_mappings
+        outputs, timings = get_generation_pipeline().run(
+            context, get_shared_cache(), targets=GENERATION_TARGETS,
+            on_stage=lambda stage: task.report(0, 0, f"{stage.label} 중..."),
+            checkpoints=CheckpointStore(), keys=keys
         )
-        st.session_state.group_data = group_data
+    except PipelineCancelled:
+        return None
+    return dict(outputs['render'], group_data=outputs['groups'], fixed_data=outputs['fixed_data'],
+                template=context['template'], timings=timings)
+
+def get_pipeline_context():
+    """현재 세션 설정으로 파이프라인 입력 구성 (단계 키 계산에 쓰이는 값과 데이터 원본)"""
+    mapping_data = st.session_state.mapping_data
+    return {
+        'uploaded_file': st.session_state.uploaded_file,
+        'sheet_data': st.session_state.get('sheet_data'),
+        'file_hash': get_uploaded_file_hash(st.session_state.uploaded_file),
+        'sheet_name': st.session_state.selected_sheet,
+        'header_row': mapping_data["table_settings"]["header_row"],
+        'fixed_data_mapping': mapping_data.get("fixed_data_mapping", {}),
+        'column_mappings': mapping_data.get("column_mappings", {}),
+        'template': st.session_state.get('smart_template', st.session_state.get('template', ''))
+    }
 
-        status_text.text(f"👥 {len(group_data)}개 그룹 생성 완료...")
-        progress_bar.progress(60)
-        
-        # 4. 스마트 메시지 생성 (컬럼 매핑 정보 전달)
-        template = st.session_state.get('smart_template', st.session_state.get('template', ''))
-        
-        # message_generator에 컬럼 매핑 정보 설정
-        message_generator.column_mappings = column_mappings
-        message_generator.excel_columns = customer_df.columns.tolist()
-        
-        result = message_generator.generate_messages(
-            template, 
-            group_data, 
-            fixed_data
-        )
-        
-        st.session_state.generated_messages = result['messages']
-        
-        status_text.text("✨ 스마트 메시지 생성 완료!")
-        progress_bar.progress(100)
-        
-        # 완료 메시지
-        success_info = f"""
+def start_generation_job():
+    """메시지 생성을 백그라운드 작업으로 시작 (작업 ID는 세션과 주소창에 기록)"""
+    context = get_pipeline_context()
+    task = BackgroundTask(generate_messages_job, context, group_build=get_speculative_group_build(context), name="generation")
+    job_id = get_task_registry().submit(task)
+    # 서버가 다시 시작되어도 체크포인트에서 이어 갈 수 있도록 단계 키와 템플릿을 기록
+    CheckpointStore().save_manifest(job_id, {
+        'keys': get_generation_pipeline().stage_keys(context, GENERATION_TARGETS),
+        'template': context['template']
+    })
+    st.session_state.generation_job_id = job_id
+    # 새로고침으로 세션이 새로 만들어져도 결과를 이어 받을 수 있도록 주소에 작업 ID 기록
+    st.query_params["job"] = job_id
+    return job_id
+
+def resume_from_checkpoints(job_id):
+    """서버 재시작 등으로 사라진 작업을 디스크 체크포인트에서 다시 시작, 이어 갈 수 없으면 False"""
+    store = CheckpointStore()
+    manifest = store.load_manifest(job_id)
+    if not manifest:
+        return False
+    keys = manifest.get('keys')
+    # 형식이 맞지 않는 매니페스트는 이어 갈 수 없으므로 삭제
+    if not (isinstance(keys, dict) and isinstance(manifest.get('template'), str)
+            and all(store.is_valid_key(keys.get(stage)) for stage in GENERATION_TARGETS)):
+        store.discard_manifest(job_id)
+        return False
+    # 원본 파일 없이 이어 가려면 고정 정보와 그룹 테이블 체크포인트가 있어야 함 (메시지는 중간부터 가능)
+    if not all(store.has(stage, keys[stage]) for stage in ('fixed_data', 'groups')):
+        store.discard_manifest(job_id)
+        return False
+    task = BackgroundTask(generate_messages_job, {'template': manifest['template']}, keys, name="generation")
+    get_task_registry().submit(task, job_id=job_id)
+    return True
+
+def get_generation_job():
+    """현재 세션의 메시지 생성 작업 (job_id, task), 없으면 (None, None)"""
+    job_id = st.session_state.get('generation_job_id')
+    task = get_task_registry().get(job_id)
+    if job_id and task is None:
+        # 서버가 다시 시작되었거나 보관 시간이 지난 작업
+        forget_generation_job()
+        return None, None
+    return job_id, task
+
+def forget_generation_job():
+    """세션과 주소창에서 작업 ID 제거 (이어 가기용 매니페스트도 삭제)"""
+    job_id = st.session_state.pop('generation_job_id', None)
+    if job_id:
+        CheckpointStore().discard_manifest(job_id)
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+def resume_generation_job():
+    """주소창의 작업 ID로 새 세션에 진행 중이거나 끝난 생성 작업을 다시 연결"""
+    job_id = st.query_params.get("job")
+    if not job_id or st.session_state.get('generation_job_id') == job_id:
+        return
+    if get_task_registry().get(job_id) is None and not resume_from_checkpoints(job_id):
+        del st.query_params["job"]
+        st.warning("⚠️ 이전 메시지 생성 작업을 이어 갈 수 없습니다. 파일을 다시 올려 생성해주세요.")
+        return
+    st.session_state.generation_job_id = job_id
+    st.session_state.current_step = 4
+
+def attach_generation_result(job_id, task):
+    """끝난 생성 작업의 결과를 세션에 반영하고 결과 단계로 이동"""
+    result = task.result
+    st.session_state.fixed_data = result['fixed_data']
+    st.session_state.group_data = result['group_data']
+    # 메시지 생성 결과는 공유 캐시에도 있으므로 세션이 고칠 수 있도록 그룹별 항목을 복사 (메시지/그룹 정보는 공유)
+    st.session_state.generated_messages = {group_id: dict(data) for group_id, data in result['messages'].items()}
+    st.session_state.pipeline_timings = result['timings']
+    # 새로고침 후 연결된 세션에서도 선택한 그룹 다시 생성이 같은 템플릿을 쓰도록
+    st.session_state.setdefault('template', result['template'])
+    st.session_state.setdefault('smart_template', result['template'])
+    # 다운로드 캐시 무효화를 위한 생성 버전 갱신
+    st.session_state.generation_version = st.session_state.get('generation_version', 0) + 1
+    st.session_state.message_order = dict(result['message_order'], generation_version=st.session_state.generation_version)
+    
+    get_task_registry().discard(job_id)
+    forget_generation_job()
+    st.session_state.current_step = 5
+
+def cancel_generation_job(job_id):
+    """생성 작업 취소 (버튼 콜백, 처음부터 다시 시작할 때도 사용)"""
+    if job_id:
+        get_task_registry().discard(job_id)
+        st.session_state.generation_notice = ('warning', "⏹️ 메시지 생성을 취소했습니다.")
+    forget_generation_job()
+
+def show_generation_notice():
+    """생성 작업이 남긴 완료/취소/오류 알림 표시"""
+    if st.session_state.get('generation_notice'):
+        kind, notice = st.session_state.pop('generation_notice')
+        getattr(st, kind)(notice)
+
+@st.fragment(run_every=1.0)
+def show_generation_progress(job_id):
+    """생성 작업 진행 상황 (1초마다 이 영역만 갱신, 끝나면 전체 다시 실행)"""
+    task = get_task_registry().get(job_id)
+    if task is None or st.session_state.get('generation_job_id') != job_id:
+        st.rerun()
+    
+    if task.is_running():
+        eta = task.eta
+        eta_text = f" · 남은 시간 약 {eta:.0f}초" if eta is not None else ""
+        st.progress(task.progress, text=f"{task.message or '⏳ 준비 중...'}{eta_text}")
+        st.caption(f"경과 시간 {task.elapsed:.0f}초 · 새로고침해도 작업은 계속되며 결과가 이어집니다.")
+        st.button("⏹️ 생성 취소", key="generation_cancel", on_click=cancel_generation_job, args=(job_id,))
+    elif task.is_done():
+        result = task.result
+        attach_generation_result(job_id, task)
+        st.session_state.generation_notice = ('success', f"""
         🎉 **스마트 메시지 생성 완료!**
         
         📊 **처리 결과:**
-        - 📁 처리된 그룹 수: **{len(group_data)}개**
+        - 📁 처리된 그룹 수: **{len(result['group_data'])}개**
         - 📝 생성된 메시지 수: **{result['total_count']}개**
-        - 🔗 사용된 컬럼 참조: **{len(result.get('column_refs_found', []))}개**
-        """
-        
-        st.success(success_info)
-        
-        progress_bar.empty()
-        status_text.empty()
+        - ⏱️ 소요 시간: **{task.elapsed:.1f}초**
+        """)
+        st.rerun()
+    else:
+        get_task_registry().discard(job_id)
+        forget_generation_job()
+        if task.error is not None:
+            st.session_state.generation_notice = ('error', f"❌ 메시지 생성 중 오류 발생: {str(task.error)}")
+        st.rerun()
 
-    except Exception as e:
-        show_error_details(e, "스마트 데이터 처리 및 메시지 생성 중")
-        raise
+def get_uploaded_file_hash(uploaded_file):
+    """업로드 파일 내용 해시 (파일이 바뀔 때만 다시 계산)"""
+    cached = st.session_state.get('uploaded_file_hash')
+    if not cached or cached[0] != uploaded_file.file_id:
+        cached = (uploaded_file.file_id, file_content_hash(uploaded_file))
+        st.session_state.uploaded_file_hash = cached
+    return cached[1]
+
+def prefetch_sheets_job(task, uploaded_file, file_hash, sheet_names):
+    """통합 문서의 시트를 순서대로 읽어 공유 캐시에 넣음 (백그라운드 스레드에서 실행)"""
+    return prefetch_sheets(
+        uploaded_file, file_hash, sheet_names,
+        progress_callback=lambda done, total, name: task.report(done, total, f"📄 {name}"),
+        cancel_check=task.is_cancelled, **SHEET_PREVIEW_OPTIONS
+    )
+
+def start_sheet_prefetch(uploaded_file, file_hash, sheet_names, selected_sheet):
+    """업로드한 파일의 모든 시트를 선택한 시트부터 백그라운드에서 미리 읽기 (파일당 한 번)
+
+    시트가 하나뿐이면 시작하지 않고 None을 반환합니다.
+    """
+    if len(sheet_names) < 2:
+        return None
+    current = st.session_state.get('sheet_prefetch')
+    if current and current['file_hash'] == file_hash:
+        return current['task']
+    if current:
+        current['task'].cancel()
+    
+    order = [selected_sheet] + [name for name in sheet_names if name != selected_sheet]
+    task = BackgroundTask(prefetch_sheets_job, uploaded_file, file_hash, order, name="sheet_prefetch").start()
+    st.session_state.sheet_prefetch = {'file_hash': file_hash, 'task': task}
+    return task
+
+def show_sheet_prefetch(task):
+    """시트 미리 읽기 상태 표시"""
+    if task is None:
+        return
+    if task.is_running():
+        st.caption(f"⚡ 다른 시트를 미리 읽고 있습니다... ({task.completed}/{task.total or '?'})")
+    elif task.is_done():
+        st.caption(f"⚡ 모든 시트({task.total}개)를 미리 읽어 두어 시트를 바로 바꿀 수 있습니다.")
+
+def read_customer_table():
+    """매핑에서 지정한 헤더 행 기준으로 고객 테이블 읽기 (세션 간 공유 캐시, 수정하지 말 것)"""
+    header_row = st.session_state.mapping_data["table_settings"]["header_row"] - 1
+    # [해결 코드] 여기서도 컬럼명 공백을 제거합니다.
+    return cached_read_sheet(
+        st.session_state.uploaded_file, get_uploaded_file_hash(st.session_state.uploaded_file),
+        st.session_state.selected_sheet, header=header_row, strip_columns=True
+    )
+
+def get_table_key():
+    """현재 파일/시트/헤더 행을 나타내는 캐시 키"""
+    return table_cache_key(
+        get_uploaded_file_hash(st.session_state.uploaded_file),
+        st.session_state.selected_sheet,
+        st.session_state.mapping_data["table_settings"]["header_row"]
+    )
+
+def build_group_table(column_mappings):
+    """현재 파일/시트/헤더 행과 컬럼 매핑 기준의 그룹 테이블 (생성 파이프라인의 그룹 단계 결과를 공유)"""
+    context = dict(get_pipeline_context(), column_mappings=column_mappings)
+    # 매핑 단계에서 같은 매핑으로 미리 만들고 있으면 중복으로 만들지 않고 그 결과를 기다림
+    wait_for_build(get_speculative_group_build(context))
+    outputs, _ = get_generation_pipeline().run(context, get_shared_cache(), targets=['groups'], checkpoints=CheckpointStore())
+    return outputs['groups']
+
+def get_column_profiles():
+    """현재 고객 테이블의 컬럼 프로필 (시트마다 한 번만 계산), 읽을 수 없으면 None"""
+    try:
+        return cached_column_profiles(read_customer_table(), get_table_key())
+    except Exception:
+        return None
+
+def regenerate_selected_groups(group_ids, reload_data=False):
+    """선택한 그룹만 현재 템플릿으로 다시 생성 (다른 그룹의 결과와 수정 내용은 유지)
+
+    reload_data가 True면 엑셀에서 고정 정보와 그룹 데이터를 다시 읽어 선택한 그룹에 반영합니다.
+    """
+    generated_messages = st.session_state.generated_messages
+    # 다시 읽지 않으면 생성 당시의 그룹 정보를 그대로 사용
+    group_data = {group_id: data['group_info'] for group_id, data in generated_messages.items()}
+    fixed_data = st.session_state.get('fixed_data', {})
+    
+    if reload_data:
+        # 결과 단계에서 디스크로 내보냈을 수 있는 원본 데이터를 다시 불러옴
+        get_session_memory_manager().restore(('sheet_data', 'group_data'))
+        data_processor = EnhancedDataProcessor()
+        fixed_data = data_processor.extract_fixed_data(
+            st.session_state.sheet_data,
+            st.session_state.mapping_data["fixed_data_mapping"]
+        )
+        st.session_state.fixed_data = fixed_data
+        group_data = build_group_table(st.session_state.mapping_data["column_mappings"])
+    
+    template = st.session_state.get('smart_template', st.session_state.get('template', ''))
+    result = EnhancedMessageGenerator().regenerate_messages(cached_compiled_template(template), group_data, fixed_data, group_ids, generated_messages)
+    regenerated = result['regenerated']
+    
+    # 다시 생성한 그룹의 수정 내용과 편집기 입력값은 버림
+    overlay = get_edit_overlay()
+    for group_id in regenerated:
+        overlay.discard(group_id)
+        st.session_state.pop(f"editor_{group_id}", None)
+    
+    if reload_data and 'group_data' in st.session_state:
+        st.session_state.group_data = dict(st.session_state.group_data, **{group_id: group_data[group_id] for group_id in regenerated})
+    st.session_state.generated_messages = result['messages']
+    # 다운로드/검색 캐시 무효화를 위한 생성 버전 갱신
+    st.session_state.generation_version = st.session_state.get('generation_version', 0) + 1
+    st.session_state.message_order = dict(result['message_order'], generation_version=st.session_state.generation_version)
+    return regenerated
+
+def show_selective_regeneration(filtered_ids):
+    """팀/그룹ID/현재 검색 결과 단위로 일부 그룹만 다시 생성"""
+    generated_messages = st.session_state.generated_messages
+    ordered_ids = get_message_order()['ids']
+    
+    target = st.radio("다시 생성할 대상", ["팀 선택", "그룹 ID 입력", "현재 검색 결과"], horizontal=True, key="regen_target")
+    if target == "팀 선택":
+        team_names = list(dict.fromkeys(generated_messages[group_id]['group_info']['team_name'] for group_id in ordered_ids))
+        teams = st.multiselect("팀", team_names, key="regen_teams")
+        group_ids = select_group_ids(generated_messages, ordered_ids, teams) if teams else []
+    elif target == "그룹 ID 입력":
+        raw_ids = st.text_input("그룹 ID (쉼표로 구분)", placeholder="예: G001, G015", key="regen_ids")
+        requested = [group_id.strip().upper() for group_id in raw_ids.split(',') if group_id.strip()]
+        group_ids = [group_id for group_id in requested if group_id in generated_messages]
+        unknown = [group_id for group_id in requested if group_id not in generated_messages]
+        if unknown:
+            st.caption(f"⚠️ 없는 그룹 ID: {', '.join(unknown)}")
+    else:
+        group_ids = list(filtered_ids)
     
+    reload_data = st.checkbox(
+        "엑셀 데이터 다시 읽기", key="regen_reload",
+        disabled='uploaded_file' not in st.session_state,
+        help="업로드한 파일에서 고정 정보와 그룹 데이터를 다시 읽어 선택한 그룹에 반영합니다."
+    )
+    edited_count = sum(1 for group_id in group_ids if group_id in get_edit_overlay())
+    if edited_count:
+        st.caption(f"⚠️ 선택한 그룹 중 {edited_count}개 그룹의 수정 내용은 다시 생성하면 사라집니다.")
+    
+    if st.session_state.get('regen_notice'):
+        st.success(st.session_state.pop('regen_notice'))
+    
+    if st.button(f"♻️ {len(group_ids)}개 그룹 다시 생성", key="regen_apply", disabled=not group_ids):
+        try:
+            regenerated = regenerate_selected_groups(group_ids, reload_data=reload_data)
+        except Exception as e:
+            show_error_details(e, "선택한 그룹 다시 생성 중")
+            return
+        st.session_state.regen_notice = f"✅ {len(regenerated)}개 그룹을 현재 템플릿으로 다시 생성했습니다."
+        st.rerun()
+
 def show_results_step():
     st.header("5️⃣ 결과 확인 및 활용")
 
@@ -971,44 +1447,38 @@ def show_results_step():
         return
 
     # 수정된 메시지를 저장하기 위한 세션 상태 초기화
-    if 'edited_messages' not in st.session_state:
-        st.session_state.edited_messages = {}
+    get_edit_overlay()
+    if 'edits_version' not in st.session_state:
+        st.session_state.edits_version = 0
 
+    show_generation_notice()
     total_messages = len(st.session_state.generated_messages)
     st.success(f"✅ 총 {total_messages}개의 메시지 그룹이 생성되었습니다!")
 
     # --- 1. 결과 필터링 및 검색 UI ---
     st.markdown("#### 🔍 결과 검색 및 필터링")
-    search_query = st.text_input("팀명 또는 대표자 이름으로 검색하세요:", placeholder="예: 1팀 또는 홍길동")
-
-    sorted_messages = sorted(st.session_state.generated_messages.items(), key=lambda item: item[1]['group_info'].get('excel_order', 0))
-
-    # 검색 쿼리에 따라 결과 필터링
-    filtered_messages = []
-    if search_query:
-        for group_id, data in sorted_messages:
-            group_info = data['group_info']
-            # 팀명 또는 대표자 이름에 검색어가 포함되어 있으면 추가
-            if search_query.lower() in group_info.get('team_name', '').lower() or search_query.lower() in group_info.get('sender', '').lower():
-                filtered_messages.append((group_id, data))
-    else:
-        filtered_messages = sorted_messages
+    search_col, option_col = st.columns([4, 1])
+    search_query = search_col.text_input("팀명, 대표자/멤버 이름 또는 연락처로 검색하세요:", placeholder="예: 1팀 또는 홍길동")
+    search_messages = option_col.checkbox("메시지 내용 포함", key="search_include_messages", help="수정한 내용을 포함해 메시지 본문까지 검색합니다.")
+
+    generated_messages = st.session_state.generated_messages
+
+    # 생성 시 한 번 만든 n-gram 색인으로 검색 (엑셀 순서 유지)
+    filtered_ids = get_search_index(search_messages).search(search_query)
 
-    if not filtered_messages:
+    if not filtered_ids:
         st.warning(f"'{search_query}'에 해당하는 그룹이 없습니다.")
         return
 
     # --- 2. 그룹 선택 및 메시지 수정 UI ---
-    group_options = [f"{gid} - {d['group_info']['team_name']} ({d['group_info'].get('sender', '')}님 그룹)" for gid, d in filtered_messages]
-    selected_group_label = st.selectbox("📋 확인할 그룹을 선택하세요:", group_options)
+    selected_group_id = show_group_browser(filtered_ids, search_query)
 
-    if selected_group_label:
-        selected_group_id = selected_group_label.split(' ')[0]
+    if selected_group_id:
         original_message_data = st.session_state.generated_messages[selected_group_id]
         group_info = original_message_data['group_info']
 
         # 수정된 메시지가 있으면 가져오고, 없으면 원본 메시지 사용
-        message_to_display = st.session_state.edited_messages.get(selected_group_id, original_message_data['message'])
+        message_to_display = get_edit_overlay().get(selected_group_id, original_message_data['message'])
 
         st.markdown("#### ✍️ 개별 메시지 확인 및 수정")
         edited_message = st.text_area(
@@ -1017,8 +1487,20 @@ def show_results_step():
             height=300,
             key=f"editor_{selected_group_id}"
         )
-        # 수정된 내용을 세션에 저장
-        st.session_state.edited_messages[selected_group_id] = edited_message
+        # 내용이 실제로 바뀐 경우에만 수정 레이어에 기록하고 수정 버전을 올려 다운로드 캐시를 무효화
+        if edited_message != message_to_display:
+            get_edit_overlay().set(selected_group_id, edited_message)
+            st.session_state.edits_version += 1
+            update_copy_all_segment(selected_group_id, edited_message)
+            update_search_index(selected_group_id, edited_message)
+
+    # 여러 그룹에 걸친 오타 등을 한 번에 수정
+    with st.expander("🔁 전체 찾아 바꾸기"):
+        show_bulk_replace()
+
+    # 템플릿이나 일부 팀 데이터를 고친 뒤 해당 그룹만 다시 생성
+    with st.expander("♻️ 선택한 그룹만 다시 생성"):
+        show_selective_regeneration(filtered_ids)
 
     st.markdown("---")
 
@@ -1027,27 +1509,41 @@ def show_results_step():
     
     # '전체 복사' 기능을 위한 확장 박스
     with st.expander("📋 원클릭 전체 복사 (모든 메시지 이어붙이기)"):
-        all_messages_content = []
-        # 필터링된 결과가 아닌, 전체 메시지를 대상으로 함
-        for group_id, data in sorted_messages:
-            # 수정된 내용이 있으면 수정본을, 없으면 원본을 사용
-            content = st.session_state.edited_messages.get(group_id, data['message'])
-            all_messages_content.append(f"--- 📣 {data['group_info']['team_name']} {data['group_info'].get('sender', '')}님 그룹 ---")
-            all_messages_content.append(content)
-            all_messages_content.append("\n")
-        
-        full_text = "\n".join(all_messages_content)
-        st.text_area("All Messages", value=full_text, height=400, help="이 박스의 전체 내용을 복사하여 사용하세요.")
+        # 펼쳐도 요청하기 전에는 텍스트를 만들거나 브라우저로 보내지 않음
+        if st.checkbox("전체 메시지 불러오기", key="copy_all_enabled", help="선택한 페이지의 메시지만 화면에 표시합니다."):
+            show_copy_all_messages()
+
+    # 모든 형식을 스레드 풀에서 동시에 준비
+    show_export_all()
 
-    # 파일 다운로드 버튼
-    col_dl1, col_dl2 = st.columns(2)
+    # 파일 다운로드 버튼 (수정된 내용을 포함, 버전별로 한 번만 생성)
+    col_dl1, col_dl2, col_dl3 = st.columns(3)
     with col_dl1:
-        txt_content = create_text_download(include_edited=True) # 수정된 내용을 포함하여 다운로드
-        st.download_button("📄 텍스트로 다운로드", data=txt_content, file_name=f"messages_{datetime.now().strftime('%Y%m%d')}.txt", mime="text/plain", use_container_width=True)
+        show_cached_download_button(
+            'txt', lambda: create_text_download(include_edited=True),
+            "📄 텍스트로 다운로드", f"messages_{datetime.now().strftime('%Y%m%d')}.txt", "text/plain"
+        )
     with col_dl2:
-        excel_content = create_excel_download(include_edited=True) # 수정된 내용을 포함하여 다운로드
-        st.download_button("📊 엑셀로 다운로드", data=excel_content, file_name=f"messages_{datetime.now().strftime('%Y%m%d')}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
+        show_cached_download_button(
+            'xlsx', lambda: create_excel_download(include_edited=True),
+            "📊 엑셀로 다운로드", f"messages_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    with col_dl3:
+        show_cached_download_button(
+            'csv', lambda: export_to_bytes(get_export_records(include_edited=True), 'csv', **EXPORT_ALL_OPTIONS['csv']),
+            "📋 CSV로 다운로드", f"messages_{datetime.now().strftime('%Y%m%d')}.csv", "text/csv"
+        )
+
+    # 상담원 배포용 그룹별 ZIP 묶음, 팀장 배포용 팀별 엑셀 묶음 (백그라운드 생성)
+    col_bundle1, col_bundle2 = st.columns(2)
+    with col_bundle1:
+        show_zip_bundle_download()
+    with col_bundle2:
+        show_team_workbooks_download()
 
+    # 대량 문자 발송 시스템 업로드용 파일
+    show_sms_gateway_download()
 
     # --- 4. 네비게이션 ---
     st.markdown("---")
@@ -1056,66 +1552,436 @@ def show_results_step():
         st.session_state.current_step = 3
         st.rerun()
     if nav_cols[1].button("🔄 처음부터 새로 시작", use_container_width=True):
+        get_session_memory_manager().clear()
+        cancel_generation_job(st.session_state.get('generation_job_id'))
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.rerun()
 
-def create_text_download(include_edited=False):
-    """텍스트 파일 다운로드 컨텐츠 생성 (수정본 포함 기능 추가)"""
-    content = []
+def get_message_order():
+    """생성 시 만들어 둔 정렬 인덱스 반환 (없으면 현재 생성 버전에 대해 한 번만 생성)"""
+    generation_version = st.session_state.get('generation_version', 0)
+    message_order = st.session_state.get('message_order')
+    
+    if not message_order or message_order.get('generation_version') != generation_version:
+        message_order = dict(build_message_order(st.session_state.generated_messages), generation_version=generation_version)
+        st.session_state.message_order = message_order
     
-    sorted_messages = sorted(st.session_state.generated_messages.items(), key=lambda item: item[1]['group_info'].get('excel_order', 0))
+    return message_order
 
-    for group_id, data in sorted_messages:
-        group_info = data['group_info']
-        # 수정된 내용이 있고, 포함 옵션이 켜져 있으면 수정본 사용
-        if include_edited and group_id in st.session_state.get('edited_messages', {}):
-            message = st.session_state.edited_messages[group_id]
-        else:
-            message = data['message']
-        
-        content.append(f"=== {group_id} ({group_info['team_name']}-{group_info['sender_group']}) ===")
-        content.append(f"발송인: {group_info['sender']}")
-        content.append(f"대상자: {', '.join(group_info['members'])}")
-        content.append(f"연락처: {group_info.get('contact', '')}")
-        content.append("-" * 60)
-        content.append(message)
-        content.append("\n" + "="*60 + "\n")
+def get_edit_overlay():
+    """생성된 메시지 위의 수정 레이어 반환 (메시지를 새로 생성했으면 새 메시지 기준으로 옮김)"""
+    overlay = st.session_state.get('edited_messages')
+    generated_messages = st.session_state.generated_messages
+    
+    if not isinstance(overlay, EditOverlay):
+        overlay = EditOverlay(generated_messages, overlay)
+        st.session_state.edited_messages = overlay
+    elif overlay.base is not generated_messages:
+        overlay.rebase(generated_messages)
+    return overlay
+
+def show_bulk_replace():
+    """전체(또는 선택한 팀) 메시지에 찾아 바꾸기 적용 (일치 건수 미리보기 후 적용)"""
+    generated_messages = st.session_state.generated_messages
+    ordered_ids = get_message_order()['ids']
     
-    return "\n".join(content)
+    col_find, col_replace = st.columns(2)
+    find = col_find.text_input("찾을 내용", key="bulk_find")
+    replace = col_replace.text_input("바꿀 내용", key="bulk_replace")
+    col_regex, col_teams = st.columns([1, 3])
+    use_regex = col_regex.checkbox("정규식 사용", key="bulk_regex", help="바꿀 내용에서 \\1 처럼 그룹을 참조할 수 있습니다.")
+    team_names = list(dict.fromkeys(generated_messages[group_id]['group_info']['team_name'] for group_id in ordered_ids))
+    teams = col_teams.multiselect("적용할 팀 (비우면 전체)", team_names, key="bulk_teams")
+    
+    if st.session_state.get('bulk_replace_notice'):
+        st.success(st.session_state.pop('bulk_replace_notice'))
+    if not find:
+        return
+    
+    overlay = get_edit_overlay()
+    group_ids = select_group_ids(generated_messages, ordered_ids, teams)
+    try:
+        matches = count_matches(overlay, group_ids, find, regex=use_regex)
+    except re.error as e:
+        st.error(f"정규식 오류: {e}")
+        return
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return
+    
+    if matches.empty:
+        st.info("일치하는 내용이 없습니다.")
+        return
+    
+    st.caption(f"🔎 {len(matches)}개 그룹에서 {int(matches.sum())}건 일치 (예: {', '.join(matches.index[:5])})")
+    if st.button(f"🔁 {int(matches.sum())}건 모두 바꾸기", key="bulk_apply"):
+        changed = apply_replace(overlay, matches.index, find, replace, regex=use_regex)
+        if changed:
+            st.session_state.edits_version += 1
+            for group_id, message in changed.items():
+                update_copy_all_segment(group_id, message)
+                update_search_index(group_id, message)
+                # 편집기에 남아 있는 이전 입력값이 바뀐 내용을 덮어쓰지 않도록 제거
+                st.session_state.pop(f"editor_{group_id}", None)
+        st.session_state.bulk_replace_notice = f"✅ {len(changed)}개 그룹의 메시지를 바꿨습니다."
+        st.rerun()
 
-def create_excel_download(include_edited=False):
-    """엑셀 파일 다운로드 컨텐츠 생성 (수정본 포함 기능 추가)"""
-    data_to_export = []
+def get_search_index(include_messages=False):
+    """생성 버전별로 캐시된 결과 검색 색인 반환 (메시지 본문 포함 여부별로 따로 보관)"""
+    generation_version = st.session_state.get('generation_version', 0)
+    indexes = st.session_state.get('search_indexes')
+    
+    if not indexes or indexes['generation_version'] != generation_version:
+        indexes = {'generation_version': generation_version}
+        st.session_state.search_indexes = indexes
+    
+    if include_messages not in indexes:
+        indexes[include_messages] = NgramSearchIndex.from_messages(
+            st.session_state.generated_messages,
+            get_message_order()['ids'],
+            get_edit_overlay(),
+            include_messages=include_messages
+        )
+    return indexes[include_messages]
+
+def update_search_index(group_id, message):
+    """수정된 메시지를 본문 검색 색인에 반영 (색인을 만든 경우에만)"""
+    indexes = st.session_state.get('search_indexes')
+    if indexes and True in indexes:
+        index = indexes[True]
+        group_info = st.session_state.generated_messages[group_id]['group_info']
+        index.update(group_id, index.document_text(group_info, message))
+
+def format_copy_all_segment(group_info, message):
+    """전체 복사 텍스트의 그룹별 구간 생성"""
+    return f"--- 📣 {group_info['team_name']} {group_info.get('sender', '')}님 그룹 ---\n{message}\n\n"
+
+def get_copy_all_buffer():
+    """생성 버전별로 캐시된 전체 복사용 그룹별 구간 반환"""
+    generation_version = st.session_state.get('generation_version', 0)
+    buffer = st.session_state.get('copy_all_buffer')
+    
+    if not buffer or buffer['generation_version'] != generation_version:
+        # 필터링된 결과가 아닌, 전체 메시지를 대상으로 함
+        edited_messages = get_edit_overlay()
+        generated_messages = st.session_state.generated_messages
+        ordered_ids = get_message_order()['ids']
+        buffer = {
+            'generation_version': generation_version,
+            'order': ordered_ids,
+            'segments': {
+                group_id: format_copy_all_segment(
+                    generated_messages[group_id]['group_info'],
+                    edited_messages.get(group_id, generated_messages[group_id]['message'])
+                )
+                for group_id in ordered_ids
+            }
+        }
+        st.session_state.copy_all_buffer = buffer
+    
+    return buffer
+
+def update_copy_all_segment(group_id, message):
+    """수정된 그룹의 구간만 전체 복사 캐시에 반영"""
+    buffer = st.session_state.get('copy_all_buffer')
+    if buffer and group_id in buffer['segments']:
+        group_info = st.session_state.generated_messages[group_id]['group_info']
+        buffer['segments'][group_id] = format_copy_all_segment(group_info, message)
+
+def format_group_label(group_id):
+    """그룹 선택 목록에 표시할 라벨"""
+    group_info = st.session_state.generated_messages[group_id]['group_info']
+    return f"{group_id} - {group_info['team_name']} ({group_info.get('sender', '')}님 그룹)"
+
+def move_group_page(offset, total_pages):
+    """이전/다음 페이지 이동 (버튼 콜백)"""
+    page = st.session_state.get('group_page', 1) + offset
+    st.session_state.group_page = min(max(page, 1), total_pages)
+
+def jump_to_group(filtered_ids):
+    """입력한 그룹 ID가 있는 페이지로 이동 (입력 콜백)"""
+    group_id = st.session_state.get('group_jump', '').strip().upper()
+    if group_id not in filtered_ids:
+        st.session_state.group_jump_error = group_id
+        return
+    page_size = st.session_state.get('group_page_size', GROUP_PAGE_SIZES[0])
+    st.session_state.group_page = filtered_ids.index(group_id) // page_size + 1
+    st.session_state.selected_group_id = group_id
+    st.session_state.group_jump_error = None
+
+def show_group_browser(filtered_ids, search_query=""):
+    """그룹 목록을 페이지 단위로 보여주고 선택된 그룹 ID 반환 (현재 페이지의 라벨만 생성)"""
+    # 검색어가 바뀌면 첫 페이지로
+    if st.session_state.get('group_browser_query') != search_query:
+        st.session_state.group_browser_query = search_query
+        st.session_state.group_page = 1
+    
+    col_size, col_page, col_jump = st.columns([1, 1, 2])
+    page_size = col_size.selectbox("페이지당 그룹 수", GROUP_PAGE_SIZES, key="group_page_size")
+    total_pages = max(1, -(-len(filtered_ids) // page_size))
+    if st.session_state.get('group_page', 1) > total_pages:
+        st.session_state.group_page = total_pages
+    page = col_page.number_input("페이지", min_value=1, max_value=total_pages, key="group_page")
+    col_jump.text_input(
+        "그룹 ID로 이동", placeholder="예: G120", key="group_jump",
+        on_change=jump_to_group, args=(filtered_ids,)
+    )
+    if st.session_state.get('group_jump_error'):
+        col_jump.caption(f"⚠️ '{st.session_state.group_jump_error}' 그룹이 검색 결과에 없습니다.")
+    
+    start = (page - 1) * page_size
+    page_ids = filtered_ids[start:start + page_size]
+    
+    prev_shortcut, next_shortcut = GROUP_PAGE_SHORTCUTS if BUTTON_SHORTCUTS_SUPPORTED else (None, None)
+    shortcut_options = lambda shortcut: {'shortcut': shortcut} if shortcut else {}
+    
+    nav_prev, nav_info, nav_next = st.columns([1, 3, 1])
+    nav_prev.button("◀ 이전", key="group_page_prev", use_container_width=True, disabled=page <= 1,
+                    on_click=move_group_page, args=(-1, total_pages), **shortcut_options(prev_shortcut))
+    nav_info.caption(
+        f"총 {len(filtered_ids)}개 그룹 중 {start + 1}~{start + len(page_ids)}번째 ({page}/{total_pages} 페이지)"
+        + (f" · ⌨️ {prev_shortcut}/{next_shortcut} 키로 이동" if prev_shortcut else "")
+    )
+    nav_next.button("다음 ▶", key="group_page_next", use_container_width=True, disabled=page >= total_pages,
+                    on_click=move_group_page, args=(1, total_pages), **shortcut_options(next_shortcut))
+    
+    # 선택된 그룹이 현재 페이지에 없으면 페이지 첫 그룹 선택
+    selected_group_id = st.session_state.get('selected_group_id')
+    index = page_ids.index(selected_group_id) if selected_group_id in page_ids else 0
+    page_labels = [format_group_label(group_id) for group_id in page_ids]
+    selected_label = st.selectbox("📋 확인할 그룹을 선택하세요:", page_labels, index=index)
     
-    sorted_messages = sorted(st.session_state.generated_messages.items(), key=lambda item: item[1]['group_info'].get('excel_order', 0))
+    st.session_state.selected_group_id = page_ids[page_labels.index(selected_label)]
+    return st.session_state.selected_group_id
 
-    for group_id, message_data in sorted_messages:
-        group_info = message_data['group_info']
-        
-        if include_edited and group_id in st.session_state.get('edited_messages', {}):
-            message = st.session_state.edited_messages[group_id]
+def show_copy_all_messages():
+    """전체 복사 텍스트를 페이지 단위로 표시"""
+    buffer = get_copy_all_buffer()
+    order = buffer['order']
+    
+    col_size, col_page = st.columns(2)
+    page_size = col_size.selectbox("페이지당 그룹 수", [50, 100, 300, 1000], key="copy_all_page_size")
+    total_pages = max(1, -(-len(order) // page_size))
+    if st.session_state.get('copy_all_page', 1) > total_pages:
+        st.session_state.copy_all_page = total_pages
+    page = col_page.number_input("페이지", min_value=1, max_value=total_pages, key="copy_all_page")
+    
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(order))
+    page_text = "\n".join(buffer['segments'][group_id] for group_id in order[start:end])
+    
+    st.caption(f"총 {len(order)}개 그룹 중 {start + 1}~{end}번째 ({page}/{total_pages} 페이지)")
+    st.text_area("All Messages", value=page_text, height=400, help="이 박스의 전체 내용을 복사하여 사용하세요.")
+
+def get_export_cache_key():
+    """다운로드 캐시 키: (생성 버전, 수정 버전)"""
+    return (st.session_state.get('generation_version', 0), st.session_state.get('edits_version', 0))
+
+def get_export_cache():
+    """현재 (생성 버전, 수정 버전)에 해당하는 다운로드 캐시 반환"""
+    cache_key = get_export_cache_key()
+    cache = st.session_state.get('export_cache')
+    if not cache or cache['key'] != cache_key:
+        cache = {'key': cache_key, 'artifacts': {}}
+        st.session_state.export_cache = cache
+    return cache['artifacts']
+
+def get_export_job(state_key):
+    """현재 버전의 백그라운드 내보내기 작업 반환 (메시지가 바뀌었으면 이전 작업은 취소하고 폐기)"""
+    job = st.session_state.get(state_key)
+    if job and job['key'] != get_export_cache_key():
+        job['task'].cancel()
+        del st.session_state[state_key]
+        return None
+    return job['task'] if job else None
+
+def start_export_job(state_key, func, *args, name=""):
+    """백그라운드 내보내기 작업을 시작하고 현재 버전과 함께 세션에 보관"""
+    task = BackgroundTask(func, *args, name=name).start()
+    st.session_state[state_key] = {'key': get_export_cache_key(), 'task': task}
+    return task
+
+def show_cached_download_button(kind, builder, label, file_name, mime):
+    """캐시된 다운로드 버튼 표시 (캐시가 없으면 준비 버튼을 먼저 표시)"""
+    artifacts = get_export_cache()
+    
+    if kind not in artifacts:
+        if st.button(f"{label} 준비", key=f"prepare_{kind}", use_container_width=True):
+            with st.spinner("다운로드 파일을 준비하고 있습니다..."):
+                artifacts[kind] = builder()
         else:
-            message = message_data['message']
-        
-        data_to_export.append({
-            '그룹ID': group_id,
-            '팀명': group_info['team_name'],
-            '발송그룹': group_info['sender_group'],
-            '발송인': group_info['sender'],
-            '연락처': group_info.get('contact', ''),
-            '그룹멤버': ', '.join(group_info['members']),
-            '인원수': group_info['group_size'],
-            '메시지': message
-        })
-    
-    df = pd.DataFrame(data_to_export)
-    
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='메시지')
-    
-    return output.getvalue()
+            return
+    
+    st.download_button(label, data=artifacts[kind], file_name=file_name, mime=mime, key=f"download_{kind}", use_container_width=True)
+
+def get_export_records(include_edited=True):
+    """백그라운드 작업에 넘길 (그룹ID, 그룹정보, 메시지) 스냅샷 생성"""
+    edited_messages = get_edit_overlay() if include_edited else {}
+    return iter_export_records(st.session_state.generated_messages, edited_messages, get_message_order()['ids'])
+
+def build_all_exports(task, records):
+    """모든 형식을 스레드 풀에서 동시에 생성 (백그라운드 스레드에서 실행)"""
+    return export_formats_concurrently(
+        records,
+        EXPORT_ALL_FORMATS,
+        EXPORT_ALL_OPTIONS,
+        progress_callback=task.report_detail,
+        cancel_check=task.is_cancelled
+    )
+
+def show_export_all():
+    """'모든 형식 한 번에 준비' 버튼과 형식별 진행 상황 UI"""
+    artifacts = get_export_cache()
+    if all(fmt in artifacts for fmt in EXPORT_ALL_FORMATS):
+        return
+    
+    task = get_export_job('export_all_job')
+    if task is None:
+        if st.button("📦 모든 형식 한 번에 준비", help="텍스트/엑셀/CSV/ZIP 파일을 동시에 만들어 둡니다.", use_container_width=True):
+            start_export_job('export_all_job', build_all_exports, get_export_records(include_edited=True), name="export_all")
+            st.rerun()
+        return
+    
+    if task.is_running():
+        for fmt in EXPORT_ALL_FORMATS:
+            st.progress(task.detail_progress(fmt), text=f"{EXPORT_FORMAT_LABELS[fmt]} 생성 중...")
+        col_refresh, col_cancel = st.columns(2)
+        col_refresh.button("🔄 진행 상황 새로고침", key="export_all_refresh", use_container_width=True)
+        if col_cancel.button("⏹️ 취소", key="export_all_cancel", use_container_width=True):
+            task.cancel()
+            del st.session_state.export_all_job
+            st.rerun()
+    elif task.is_done():
+        artifacts.update(task.result)
+        del st.session_state.export_all_job
+        st.rerun()
+    else:
+        st.error(f"❌ 파일 생성 실패: {task.error}")
+        del st.session_state.export_all_job
+
+def build_zip_bundle(task, records):
+    """그룹별 ZIP 묶음을 임시 파일에 기록 (백그라운드 스레드에서 실행)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    create_zip_bundle_content(
+        records,
+        spool,
+        progress_callback=lambda done, total: task.report(done, total, f"{done}/{total}개 그룹 처리 중"),
+        cancel_check=task.is_cancelled
+    )
+    spool.seek(0)
+    return spool
+
+def build_team_workbooks(task, records):
+    """팀별 엑셀 파일 ZIP을 임시 파일에 기록 (백그라운드 스레드에서 실행, 워크북은 프로세스 풀에서 생성)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    export_team_workbooks(
+        records,
+        spool,
+        progress_callback=lambda done, total: task.report(done, total, f"{done}/{total}개 팀 처리 중"),
+        cancel_check=task.is_cancelled
+    )
+    spool.seek(0)
+    return spool
+
+def show_background_export(kind, build_func, start_label, start_help, download_label, file_name, mime):
+    """백그라운드에서 만드는 다운로드 파일의 생성/진행 상황/다운로드 UI
+
+    완료된 결과는 버전별 다운로드 캐시에 kind 이름으로 보관합니다.
+    """
+    state_key = f"{kind}_job"
+    artifacts = get_export_cache()
+    
+    if kind in artifacts:
+        st.download_button(download_label, data=artifacts[kind], file_name=file_name, mime=mime, key=f"download_{kind}", use_container_width=True)
+        return
+    
+    task = get_export_job(state_key)
+    if task is None:
+        if st.button(start_label, help=start_help, key=f"start_{kind}", use_container_width=True):
+            start_export_job(state_key, build_func, get_export_records(include_edited=True), name=kind)
+            st.rerun()
+        return
+    
+    if task.is_running():
+        st.progress(task.progress, text=f"{start_label} 진행 중... {task.message}")
+        col_refresh, col_cancel = st.columns(2)
+        col_refresh.button("🔄 진행 상황 새로고침", key=f"refresh_{kind}", use_container_width=True)
+        if col_cancel.button("⏹️ 취소", key=f"cancel_{kind}", use_container_width=True):
+            task.cancel()
+            del st.session_state[state_key]
+            st.rerun()
+    elif task.is_done():
+        result = task.result
+        if hasattr(result, 'read'):
+            result.seek(0)
+            result = result.read()
+        artifacts[kind] = result
+        del st.session_state[state_key]
+        st.rerun()
+    else:
+        st.error(f"❌ 파일 생성 실패: {task.error}")
+        del st.session_state[state_key]
+
+def show_zip_bundle_download():
+    """상담원 배포용 그룹별 ZIP 묶음 UI"""
+    show_background_export(
+        'zip', build_zip_bundle,
+        "🗜️ 그룹별 ZIP 묶음 만들기", "그룹별 텍스트 파일과 manifest.csv를 백그라운드에서 묶습니다.",
+        "🗜️ 그룹별 ZIP 다운로드", f"messages_{datetime.now().strftime('%Y%m%d')}.zip", "application/zip"
+    )
+
+def show_team_workbooks_download():
+    """팀장 배포용 팀별 엑셀 묶음 UI"""
+    show_background_export(
+        'team_workbooks', build_team_workbooks,
+        "👥 팀별 엑셀 묶음 만들기", "팀마다 별도의 엑셀 파일을 만들어 ZIP으로 묶습니다.",
+        "👥 팀별 엑셀 ZIP 다운로드", f"team_workbooks_{datetime.now().strftime('%Y%m%d')}.zip", "application/zip"
+    )
+
+def create_sms_gateway_download(fmt):
+    """문자 발송용 파일 (내용, 제외된 그룹 수) 반환
+
+    연락처/메시지 컬럼을 바로 모아 만들고, 다운로드 버튼이 어차피 내용을 메모리에 들고 있으므로 메모리에 기록합니다.
+    """
+    # 유효한 휴대폰 번호가 없는 그룹은 발송 목록에서 제외
+    frame, skipped = sms_gateway_frame_from_messages(
+        st.session_state.generated_messages, get_edit_overlay(), get_message_order()['ids'], drop_invalid=True
+    )
+    return write_sms_gateway_export(frame, io.StringIO(), fmt).getvalue(), skipped
+
+def show_sms_gateway_download():
+    """대량 문자 발송용 CSV/JSONL 다운로드 UI"""
+    st.markdown("##### 📲 문자 발송 시스템 업로드용 파일")
+    fmt = st.selectbox("파일 형식", ["csv", "jsonl"], format_func=str.upper, key="sms_gateway_format")
+    
+    artifacts = get_export_cache()
+    kind = f"gateway_{fmt}"
+    
+    def builder():
+        content, skipped = create_sms_gateway_download(fmt)
+        artifacts[f"{kind}_skipped"] = skipped
+        return content
+    
+    show_cached_download_button(
+        kind, builder,
+        f"📲 발송용 {fmt.upper()} 다운로드", f"sms_send_list_{datetime.now().strftime('%Y%m%d')}.{fmt}",
+        "text/csv" if fmt == "csv" else "application/jsonl"
+    )
+    
+    skipped = artifacts.get(f"{kind}_skipped")
+    if skipped:
+        st.warning(f"⚠️ 유효한 휴대폰 번호가 없는 {skipped}개 그룹은 발송 목록에서 제외되었습니다.")
+
+def create_text_download(include_edited=False):
+    """텍스트 파일 다운로드 컨텐츠 생성 (수정본 포함 기능 추가)"""
+    writer = TextExportWriter(io.StringIO(), layout='results')
+    return run_export(get_export_records(include_edited), [writer])['txt'].getvalue()
+
+def create_excel_download(include_edited=False):
+    """엑셀 파일 다운로드 컨텐츠 생성 (수정본 포함 기능 추가)"""
+    writer = XlsxExportWriter(io.BytesIO(), columns=RESULT_COLUMNS, sheet_name='메시지')
+    return run_export(get_export_records(include_edited), [writer])['xlsx'].getvalue()
             
 if __name__ == "__main__":
     main()
\ No newline at end of file
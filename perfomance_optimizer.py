@@ -8,6 +8,10 @@ from functools import wraps
 from typing import Any, Callable, Dict, Optional
 import logging
 
+from shared_cache import get_shared_cache
+from session_memory import SessionMemoryManager, STEP_KEYS
+from pipeline import get_generation_pipeline
+
 class PerformanceOptimizer:
     """성능 최적화 클래스"""
     
@@ -310,19 +314,72 @@ class StreamlitPerformanceMonitor:
             with st.expander("📋 캐시 파일 상세"):
                 for file_info in cache_stats['files']:
                     st.write(f"📄 {file_info['filename']}: {file_info['size_mb']:.2f}MB, {file_info['age_hours']:.1f}시간 전")
+        
+        # 모든 세션이 함께 쓰는 메모리 캐시 (시트, 그룹 테이블, 템플릿)
+        st.markdown("### 🌐 공유 캐시 (모든 세션)")
+        shared_cache = get_shared_cache()
+        shared_stats = shared_cache.stats()
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("항목 수", shared_stats['entries'])
+        with col2:
+            st.metric("메모리", f"{shared_stats['size_mb']:.1f} / {shared_stats['max_mb']:.0f}MB")
+        with col3:
+            lookups = shared_stats['hits'] + shared_stats['misses']
+            st.metric("적중률", f"{shared_stats['hits'] / lookups * 100:.0f}%" if lookups else "-")
+        
+        if shared_stats['size_mb_by_kind']:
+            st.caption(", ".join(f"{kind}: {size:.1f}MB" for kind, size in shared_stats['size_mb_by_kind'].items())
+                       + f" (제거된 항목 {shared_stats['evictions']}개)")
+        
+        if st.button("🗑️ 공유 캐시 비우기"):
+            shared_cache.clear()
+            st.success("✅ 공유 캐시를 비웠습니다.")
+            st.rerun()
+        
+        # 메시지 생성 파이프라인 단계별 소요 시간
+        st.markdown("### ⏱️ 생성 파이프라인")
+        timings = st.session_state.get('pipeline_timings')
+        if timings:
+            cols = st.columns(len(timings))
+            for col, timing in zip(cols, timings):
+                status = "재사용" if timing['status'] == 'cached' else "실행"
+                col.metric(timing['label'], f"{timing['seconds']:.2f}초", status, delta_color="off")
+        pipeline_stats = get_generation_pipeline().stats()
+        if pipeline_stats:
+            with st.expander("📋 단계별 누적 통계 (모든 세션)"):
+                for name, stats in pipeline_stats.items():
+                    st.write(f"{name}: 실행 {stats['runs']}회, 재사용 {stats['cached']}회, "
+                             f"누적 {stats['total_seconds']:.2f}초, 최근 {stats['last_seconds']:.2f}초")
+        elif not timings:
+            st.caption("아직 실행된 생성 파이프라인이 없습니다.")
+        
+        # 이 세션의 메모리 사용량 (공유 캐시 객체 제외)
+        st.markdown("### 🧠 세션 메모리")
+        manager = SessionMemoryManager(st.session_state)
+        total, sizes = manager.summary()
+        st.metric("사용량", f"{total / 1024 / 1024:.1f} / {manager.budget / 1024 / 1024:.0f}MB")
+        for group, placeholder in manager.spilled().items():
+            st.caption(f"💽 {group}: 디스크에 보관 중 ({placeholder.size / 1024 / 1024:.1f}MB)")
+        with st.expander("📋 키별 사용량"):
+            for key, size in sizes[:20]:
+                st.write(f"{key}: {size / 1024:.0f}KB")
     
     def optimize_session_state(self):
-        """세션 상태 최적화"""
-        # 불필요한 큰 데이터 제거
-        large_keys = []
-        for key, value in st.session_state.items():
-            if hasattr(value, '__sizeof__'):
-                size = value.__sizeof__()
-                if size > 1024 * 1024:  # 1MB 이상
-                    large_keys.append((key, size))
+        """세션 상태 최적화 (실제 메모리를 측정하고 예산을 넘으면 현재 단계에서 쓰지 않는 큰 데이터를 디스크로)"""
+        manager = SessionMemoryManager(st.session_state)
+        total, sizes = manager.summary()
         
+        large_keys = [(key, size) for key, size in sizes if size > 1024 * 1024]  # 1MB 이상
         if large_keys:
-            self.optimizer.perf_logger.warning(f"Large session state objects: {large_keys}")
+            self.optimizer.perf_logger.warning(f"Large session state objects (total {total / 1024 / 1024:.1f}MB): {large_keys}")
+        
+        current_step = st.session_state.get('current_step', 1)
+        spilled = manager.enforce_budget(protected=STEP_KEYS.get(current_step, ()))
+        if spilled:
+            self.optimizer.perf_logger.info(f"Spilled session data to disk: {spilled}")
+        return spilled
     
     def memory_usage_alert(self):
         """메모리 사용량 경고"""
@@ -0,0 +1,347 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from background_tasks import BackgroundTask
+from enhanced_processor import EnhancedDataProcessor, EnhancedMessageGenerator, build_message_order
+from shared_cache import content_hash, cached_read_sheet, cached_compiled_template
+
+# 메시지 생성 중간 결과를 저장하는 간격 (초)과 한 번에 생성하는 그룹 수
+RENDER_CHECKPOINT_INTERVAL = 15
+RENDER_CHUNK_SIZE = 500
+
+logger = logging.getLogger('performance')
+
+class PipelineCancelled(Exception):
+    """실행 중 취소 요청으로 파이프라인이 중단됨"""
+
+class Stage:
+    """파이프라인 단계
+
+    func(context, *이전 단계 결과)로 실행되며, inputs는 결과를 받을 이전 단계 이름,
+    params는 context 중 결과에 영향을 주는 값(내용 해시 대상)의 이름입니다.
+    memoize가 False인 단계는 결과를 따로 저장하지 않습니다 (함수가 이미 내용 기준 공유 캐시를 쓰는 경우).
+    checkpoint를 지정하면 결과를 디스크에도 저장해 서버가 다시 시작되어도 재사용합니다.
+    """
+
+    def __init__(self, name: str, func: Callable, inputs: Sequence[str] = (), params: Sequence[str] = (),
+                 memoize: bool = True, label: str = "", checkpoint: Optional['Checkpoint'] = None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+        self.memoize = memoize
+        self.label = label or name
+        self.checkpoint = checkpoint
+
+class Checkpoint:
+    """단계 결과와 DataFrame 사이의 변환 (디스크 체크포인트용)
+
+    to_frame(결과) -> DataFrame, from_frame(DataFrame, *inputs 단계 결과) -> 결과.
+    inputs는 결과를 복원하는 데 필요한 이전 단계입니다 (예: 메시지 컬럼에 붙일 그룹 정보).
+    """
+
+    def __init__(self, to_frame: Callable, from_frame: Callable, inputs: Sequence[str] = ()):
+        self.to_frame = to_frame
+        self.from_frame = from_frame
+        self.inputs = tuple(inputs)
+
+class Pipeline:
+    """단계별 내용 해시 메모이제이션 파이프라인
+
+    단계 키는 (단계 이름, 선언한 파라미터 값, 입력 단계의 키)의 해시이므로 입력이 바뀐 단계와
+    그 뒤 단계만 다시 실행됩니다. 결과는 공유 캐시에 저장되어 같은 입력이면 세션이 달라도 재사용합니다.
+    실행마다 단계별 소요 시간을 반환하고, 프로세스 전체 통계는 stats()로 확인합니다.
+    """
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            missing = [name for name in stage.inputs if name not in self.stages]
+            if missing:
+                raise ValueError(f"'{stage.name}' 단계의 입력 단계가 앞에 없습니다: {', '.join(missing)}")
+            self.stages[stage.name] = stage
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def required_stages(self, targets: Optional[Iterable[str]] = None) -> List[str]:
+        """targets를 만드는 데 필요한 단계 (실행 순서대로)"""
+        if targets is None:
+            return list(self.stages)
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+        return [name for name in self.stages if name in needed]
+
+    def stage_keys(self, context: Dict[str, Any], targets: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """실행하지 않고 단계별 키만 계산"""
+        keys: Dict[str, str] = {}
+        for name in self.required_stages(targets):
+            stage = self.stages[name]
+            keys[name] = content_hash(
+                name,
+                {param: context[param] for param in stage.params},
+                [keys[input_name] for input_name in stage.inputs]
+            )
+        return keys
+
+    def is_cached(self, cache, name: str, key: str) -> bool:
+        """단계 결과가 공유 캐시에 있는지 (실행하지 않고 확인)"""
+        return ('stage', name, key) in cache
+
+    def run(self, context: Dict[str, Any], cache, targets: Optional[Iterable[str]] = None,
+            on_stage: Optional[Callable[[Stage], None]] = None, checkpoints=None,
+            keys: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """targets 단계 결과를 만들고 (단계별 결과, 단계별 실행 기록) 반환
+
+        각 단계는 공유 캐시 → 디스크 체크포인트(checkpoints) → 실행 순서로 찾으며, 저장된 결과가 있으면
+        그 단계를 만드는 데만 필요했던 이전 단계는 실행하지 않습니다. keys를 넘기면 context 대신 저장해 둔
+        단계 키를 사용합니다 (서버 재시작 후 이어 가기). 실행 기록은 {'stage', 'label',
+        'status'('cached'|'checkpoint'|'run'), 'seconds'} 목록이며, context의 cancel_check()가 True면
+        단계 사이에서 PipelineCancelled를 발생시킵니다.
+        """
+        cancel_check = context.get('cancel_check')
+        keys = keys or self.stage_keys(context, targets)
+        outputs: Dict[str, Any] = {}
+        timings: List[Dict[str, Any]] = []
+
+        def resolve(name):
+            if name in outputs:
+                return outputs[name]
+            if cancel_check and cancel_check():
+                raise PipelineCancelled(name)
+            stage = self.stages[name]
+            key = keys[name]
+            memo_key = ('stage', name, key)
+            started = time.perf_counter()
+
+            output = cache.get(memo_key) if stage.memoize else None
+            status = 'cached'
+            if output is None and stage.checkpoint and checkpoints is not None:
+                frame = checkpoints.load(name, key)
+                if frame is not None:
+                    restore_inputs = [resolve(input_name) for input_name in stage.checkpoint.inputs]
+                    started = time.perf_counter()
+                    output = stage.checkpoint.from_frame(frame, *restore_inputs)
+                    status = 'checkpoint'
+            if output is None:
+                inputs = [resolve(input_name) for input_name in stage.inputs]
+                if on_stage:
+                    on_stage(stage)
+                started = time.perf_counter()
+                output = stage.func(dict(context, stage_key=key, checkpoints=checkpoints), *inputs)
+                status = 'run'
+                if stage.checkpoint and checkpoints is not None:
+                    checkpoints.save(name, key, stage.checkpoint.to_frame(output))
+            if stage.memoize and status != 'cached':
+                cache.put(memo_key, output)
+
+            seconds = time.perf_counter() - started
+            outputs[name] = output
+            timings.append({'stage': name, 'label': stage.label, 'status': status, 'seconds': seconds})
+            self._record(name, status, seconds)
+            return output
+
+        targets = list(self.stages) if targets is None else list(targets)
+        for name in targets:
+            resolve(name)
+
+        logger.info("Pipeline run: " + ", ".join(f"{t['stage']}={t['status']}({t['seconds']:.3f}s)" for t in timings))
+        # 실행 기록은 단계 순서대로 정렬
+        order = list(self.stages)
+        timings.sort(key=lambda timing: order.index(timing['stage']))
+        return {name: outputs[name] for name in targets}, timings
+
+    def _record(self, name: str, status: str, seconds: float):
+        with self._lock:
+            stats = self._stats.setdefault(name, {'runs': 0, 'cached': 0, 'total_seconds': 0.0, 'last_seconds': 0.0})
+            stats['runs' if status == 'run' else 'cached'] += 1
+            stats['total_seconds'] += seconds
+            stats['last_seconds'] = seconds
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """단계별 누적 통계 (실행 수, 재사용 수, 누적/최근 소요 시간)"""
+        with self._lock:
+            return {name: dict(self._stats[name]) for name in self.stages if name in self._stats}
+
+def wait_for_build(task: Optional[BackgroundTask]):
+    """진행 중인 미리 실행 작업이 끝나기를 기다림 (실패했으면 호출한 쪽이 다시 실행하고 오류도 그때 보고)"""
+    if task is None or not task.is_running():
+        return
+    try:
+        task.wait()
+    except Exception:
+        pass
+
+class SpeculativeStage:
+    """입력이 확정되면 단계 하나를 백그라운드에서 미리 실행
+
+    결과는 파이프라인 메모(와 체크포인트)에 저장되므로 나중에 같은 입력으로 실행하면 재사용됩니다.
+    입력(단계 키)이 바뀌면 이전 작업을 취소하고 새로 시작하며, 같은 입력으로 실행하려는 쪽은
+    wait()로 진행 중인 작업을 기다려 같은 단계를 두 번 실행하지 않습니다.
+    """
+
+    def __init__(self, pipeline: Pipeline, name: str, cache, checkpoints=None):
+        self.pipeline = pipeline
+        self.name = name
+        self.cache = cache
+        self.checkpoints = checkpoints
+        self.key: Optional[str] = None
+        self.task: Optional[BackgroundTask] = None
+
+    def stage_key(self, context: Dict[str, Any]) -> str:
+        return self.pipeline.stage_keys(context, [self.name])[self.name]
+
+    def _run(self, task: BackgroundTask, context: Dict[str, Any]):
+        try:
+            outputs, _ = self.pipeline.run(
+                dict(context, cancel_check=task.is_cancelled), self.cache,
+                targets=[self.name], checkpoints=self.checkpoints
+            )
+        except PipelineCancelled:
+            return None
+        return outputs[self.name]
+
+    def start(self, context: Dict[str, Any]) -> Optional[BackgroundTask]:
+        """context로 미리 실행 시작 (같은 입력의 작업이 있으면 그 작업, 결과가 이미 있으면 None 반환)"""
+        key = self.stage_key(context)
+        if self.task is not None and self.key == key:
+            return self.task
+        self.cancel()
+        if self.pipeline.is_cached(self.cache, self.name, key):
+            return None
+        self.key = key
+        self.task = BackgroundTask(self._run, context, name=f"speculative_{self.name}").start()
+        return self.task
+
+    def cancel(self):
+        """입력이 더 이상 유효하지 않으면 진행 중인 작업을 취소하고 잊음"""
+        if self.task is not None:
+            self.task.cancel()
+        self.key, self.task = None, None
+
+    def task_for(self, context: Dict[str, Any]) -> Optional[BackgroundTask]:
+        """context와 같은 입력으로 시작된 작업 (없거나 입력이 다르면 None)"""
+        if self.task is None or self.key != self.stage_key(context):
+            return None
+        return self.task
+
+    def wait(self, context: Dict[str, Any]):
+        """context와 같은 입력의 작업이 진행 중이면 끝나기를 기다림"""
+        wait_for_build(self.task_for(context))
+
+# --- 메시지 생성 파이프라인 ---
+# context: uploaded_file, sheet_data, file_hash, sheet_name, header_row, fixed_data_mapping,
+#          column_mappings, template (+ 선택적으로 progress_callback, cancel_check)
+
+def extract_fixed_data_stage(context):
+    return EnhancedDataProcessor().extract_fixed_data(context['sheet_data'], context['fixed_data_mapping'])
+
+def read_table_stage(context):
+    # 컬럼명 공백 제거 (세션 간 공유 캐시, 수정하지 말 것)
+    return cached_read_sheet(
+        context['uploaded_file'], context['file_hash'], context['sheet_name'],
+        header=context['header_row'] - 1, strip_columns=True
+    )
+
+def build_groups_stage(context, customer_df):
+    return EnhancedDataProcessor().process_group_data_dynamic(customer_df, context['column_mappings'])
+
+def assemble_messages(message_column, group_data):
+    """그룹ID별 메시지와 그룹 정보를 generate_messages 결과 형식으로 합침 (그룹 순서 유지)"""
+    messages = {
+        group_id: {'message': message_column[group_id], 'group_info': group_info}
+        for group_id, group_info in group_data.items()
+    }
+    return {'messages': messages, 'total_count': len(messages), 'message_order': build_message_order(messages)}
+
+def render_messages_stage(context, group_data, fixed_data):
+    """그룹을 나눠 메시지를 생성하고, 중간 결과를 주기적으로 체크포인트에 저장
+
+    이전 실행이 중간에 끝났으면(서버 재시작, 취소) 저장된 메시지 컬럼 다음부터 이어서 생성합니다.
+    """
+    if not group_data:
+        raise ValueError("그룹 데이터가 없습니다.")
+    cancel_check = context.get('cancel_check')
+    progress_callback = context.get('progress_callback')
+    checkpoints, key = context.get('checkpoints'), context.get('stage_key')
+    compiled = cached_compiled_template(context['template'])
+    generator = EnhancedMessageGenerator()
+
+    rendered = {}
+    partial = checkpoints.load('render', key, partial=True) if checkpoints is not None else None
+    if partial is not None:
+        rendered = partial['message'].to_dict()
+    remaining = [group_id for group_id in group_data if group_id not in rendered]
+    total = len(group_data)
+
+    def save_partial():
+        if checkpoints is not None and rendered:
+            checkpoints.save('render', key, pd.DataFrame({'message': pd.Series(rendered, dtype=object)}), partial=True)
+
+    last_saved = time.time()
+    for start in range(0, len(remaining), RENDER_CHUNK_SIZE):
+        chunk = {group_id: group_data[group_id] for group_id in remaining[start:start + RENDER_CHUNK_SIZE]}
+        done_before = len(rendered)
+        result = generator.generate_messages(
+            compiled, chunk, fixed_data,
+            progress_callback=(lambda done, _: progress_callback(done_before + done, total)) if progress_callback else None,
+            cancel_check=cancel_check
+        )
+        rendered.update((group_id, data['message']) for group_id, data in result['messages'].items())
+        # 중간에 취소된 결과는 단계 결과로 저장하지 않고, 다음 실행이 이어 갈 수 있도록 중간 결과만 저장
+        if cancel_check and cancel_check():
+            save_partial()
+            raise PipelineCancelled('render')
+        if time.time() - last_saved >= RENDER_CHECKPOINT_INTERVAL:
+            save_partial()
+            last_saved = time.time()
+
+    return assemble_messages(rendered, group_data)
+
+def groups_to_frame(group_data):
+    return pd.DataFrame.from_records(list(group_data.values()))
+
+def groups_from_frame(frame):
+    group_data = {}
+    for group_info in frame.to_dict('records'):
+        group_info['members'] = [str(name) for name in group_info['members']]
+        group_data[group_info['group_id']] = group_info
+    return group_data
+
+def messages_to_frame(result):
+    messages = result['messages']
+    return pd.DataFrame({'message': [data['message'] for data in messages.values()]}, index=list(messages))
+
+def messages_from_frame(frame, group_data):
+    return assemble_messages(frame['message'].to_dict(), group_data)
+
+def create_generation_pipeline() -> Pipeline:
+    """고정 정보 추출 → 테이블 읽기 → 그룹 생성 → 메시지 생성 파이프라인
+
+    고정 정보, 그룹 테이블, 메시지 컬럼은 디스크 체크포인트로도 저장됩니다.
+    """
+    return Pipeline([
+        Stage('fixed_data', extract_fixed_data_stage, params=('file_hash', 'sheet_name', 'fixed_data_mapping'),
+              label="🔍 고정 정보 추출",
+              checkpoint=Checkpoint(lambda fixed_data: pd.DataFrame([fixed_data]), lambda frame: frame.iloc[0].to_dict())),
+        Stage('table', read_table_stage, params=('file_hash', 'sheet_name', 'header_row'),
+              memoize=False, label="📊 테이블 읽기"),
+        Stage('groups', build_groups_stage, inputs=('table',), params=('column_mappings',),
+              label="👥 그룹 생성", checkpoint=Checkpoint(groups_to_frame, groups_from_frame)),
+        Stage('render', render_messages_stage, inputs=('groups', 'fixed_data'), params=('template',),
+              label="✨ 메시지 생성", checkpoint=Checkpoint(messages_to_frame, messages_from_frame, inputs=('groups',))),
+    ])
+
+@st.cache_resource
+def get_generation_pipeline() -> Pipeline:
+    """모든 세션이 함께 쓰는 메시지 생성 파이프라인 (서버 프로세스당 하나)"""
+    return create_generation_pipeline()
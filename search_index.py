@@ -0,0 +1,119 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from export_engine import find_phone_column
+
+class NgramSearchIndex:
+    """결과 화면 검색용 n-gram 역색인
+
+    문서마다 1-gram과 2-gram 포스팅을 만들어 두고, 검색어의 n-gram 포스팅을
+    교집합한 뒤 실제 부분 문자열 포함 여부로 한 번 더 확인합니다.
+    한글은 띄어쓰기 없이도 부분 검색이 되며, 결과는 문서 추가 순서(엑셀 순서)로 반환됩니다.
+    """
+
+    def __init__(self, include_messages: bool = False):
+        self.include_messages = include_messages
+        self.doc_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """검색용 정규화 (소문자, 연속 공백 축소)"""
+        return re.sub(r'\s+', ' ', str(text).lower()).strip()
+
+    @staticmethod
+    def _ngrams(text: str) -> Set[str]:
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def document_text(self, group_info: Dict, message: str = "") -> str:
+        """그룹 정보에서 검색 대상 텍스트 생성 (팀명, 발송인, 멤버, 연락처, 선택적으로 메시지)"""
+        fields = [
+            group_info.get('team_name', ''),
+            group_info.get('sender', ''),
+            ' '.join(str(name) for name in group_info.get('members', [])),
+        ]
+        phone_column = find_phone_column(group_info.keys())
+        contact = str(group_info.get(phone_column, '') or '') if phone_column else ''
+        if contact:
+            # 하이픈 없이 입력해도 찾을 수 있도록 숫자만 남긴 번호도 함께 색인
+            fields.extend([contact, re.sub(r'\D', '', contact)])
+        if self.include_messages and message:
+            fields.append(message)
+        # 필드 경계를 넘는 n-gram이 생기지 않도록 줄바꿈으로 구분
+        return '\n'.join(self.normalize(field) for field in fields if field)
+
+    def add(self, doc_id: str, text: str):
+        """문서 추가 (이미 있는 문서면 내용을 교체)"""
+        if doc_id in self.positions:
+            self.update(doc_id, text)
+            return
+        position = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.positions[doc_id] = position
+        self._texts.append(text)
+        for gram in self._ngrams(text):
+            self._postings[gram].add(position)
+
+    def update(self, doc_id: str, text: str):
+        """문서 내용 교체 (수정된 메시지 반영용)"""
+        position = self.positions[doc_id]
+        old_text = self._texts[position]
+        for gram in self._ngrams(old_text) - self._ngrams(text):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(position)
+                if not postings:
+                    del self._postings[gram]
+        for gram in self._ngrams(text):
+            self._postings[gram].add(position)
+        self._texts[position] = text
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """검색어를 부분 문자열로 포함하는 문서 ID 목록 (추가 순서대로)"""
+        query = self.normalize(query)
+        if not query:
+            return list(self.doc_ids[:limit] if limit else self.doc_ids)
+
+        grams = [query] if len(query) == 1 else {query[i:i + 2] for i in range(len(query) - 1)}
+        posting_lists = []
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if not postings:
+                return []
+            posting_lists.append(postings)
+
+        # 가장 짧은 포스팅부터 교집합
+        posting_lists.sort(key=len)
+        candidates = set(posting_lists[0])
+        for postings in posting_lists[1:]:
+            candidates &= postings
+            if not candidates:
+                return []
+
+        results = []
+        for position in sorted(candidates):
+            if len(query) <= 2 or query in self._texts[position]:
+                results.append(self.doc_ids[position])
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def from_messages(cls, generated_messages: Dict, ordered_ids: Iterable[str],
+                      edited_messages: Optional[Dict] = None, include_messages: bool = False) -> 'NgramSearchIndex':
+        """생성된 메시지로부터 색인 생성"""
+        index = cls(include_messages=include_messages)
+        edited_messages = edited_messages or {}
+        for group_id in ordered_ids:
+            data = generated_messages[group_id]
+            message = edited_messages.get(group_id, data['message'])
+            index.add(group_id, index.document_text(data['group_info'], message))
+        return index
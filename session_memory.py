@@ -0,0 +1,243 @@
+import io
+import logging
+import os
+import pickle
+import shutil
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from shared_cache import estimate_size, get_shared_cache
+
+# 세션 하나가 메모리에 들고 있을 수 있는 최대 크기 (넘으면 오래 안 쓴 큰 데이터부터 디스크로)
+SESSION_MEMORY_BUDGET = 200 * 1024 * 1024
+# 이보다 작은 데이터는 디스크로 내보내지 않음
+SPILL_MIN_BYTES = 1024 * 1024
+SPILL_DIR = os.path.join("cache", "sessions")
+# 이 시간보다 오래된 세션 폴더는 끝난 세션으로 보고 삭제
+STALE_SPILL_HOURS = 24
+# 메모리 측정 간격 (초, 큰 세션은 측정 자체도 비용이 있으므로 매 실행마다 하지 않음)
+MEASURE_INTERVAL = 30
+
+# 함께 내보내고 함께 불러오는 키 묶음 (수정 레이어는 원본 메시지를 참조하므로 같이 저장)
+SPILL_GROUPS = {
+    'sheet_data': ('sheet_data',),
+    'group_data': ('group_data',),
+    'generated_messages': ('generated_messages', 'edited_messages'),
+}
+# 내보낼 때 버리는 파생 캐시 (필요할 때 다시 만들어짐)
+DERIVED_KEYS = {
+    'generated_messages': ('search_indexes', 'copy_all_buffer', 'export_cache'),
+}
+# 단계별로 메모리에 있어야 하는 데이터
+STEP_KEYS = {
+    1: ('sheet_data',),
+    2: ('sheet_data',),
+    3: ('sheet_data',),
+    4: ('sheet_data', 'group_data'),
+    5: ('generated_messages',),
+}
+
+logger = logging.getLogger('performance')
+
+class SpilledValue:
+    """디스크로 내보낸 세션 데이터 자리 표시자"""
+
+    def __init__(self, group: str, path: str, size: int):
+        self.group = group
+        self.path = path
+        self.size = size
+        self.spilled_at = time.time()
+
+    def __repr__(self):
+        return f"SpilledValue({self.group}, {self.size / 1024 / 1024:.1f}MB)"
+
+def write_spill(path: str, values: Dict[str, Any]):
+    """세션 데이터를 압축 형식으로 저장 (DataFrame 하나는 parquet, 그 외는 zlib 압축 pickle)"""
+    frame = next(iter(values.values())) if len(values) == 1 else None
+    if isinstance(frame, pd.DataFrame):
+        try:
+            buffer = io.BytesIO()
+            # parquet은 문자열 컬럼명만 허용하므로 원래 컬럼명은 따로 보관
+            frame.set_axis([str(col) for col in frame.columns], axis=1).to_parquet(buffer, index=True)
+            payload = (next(iter(values)), list(frame.columns), buffer.getvalue())
+            with open(path, 'wb') as f:
+                f.write(b'P')
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return
+        except ImportError:
+            # pyarrow가 없으면 pickle로 저장
+            pass
+    with open(path, 'wb') as f:
+        f.write(b'Z')
+        f.write(zlib.compress(pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL), 1))
+
+def read_spill(path: str) -> Dict[str, Any]:
+    """write_spill로 저장한 세션 데이터 읽기"""
+    with open(path, 'rb') as f:
+        kind = f.read(1)
+        data = f.read()
+    if kind == b'P':
+        key, columns, parquet_bytes = pickle.loads(data)
+        frame = pd.read_parquet(io.BytesIO(parquet_bytes))
+        frame.columns = columns
+        return {key: frame}
+    return pickle.loads(zlib.decompress(data))
+
+class SessionMemoryManager:
+    """세션 메모리 예산 관리
+
+    세션 상태의 실제 메모리(공유 캐시에 있는 객체 제외)를 측정하고, 예산을 넘으면 현재 단계에서
+    쓰지 않는 큰 데이터를 오래 안 쓴 순서로 디스크에 내보냅니다. 내보낸 데이터는 restore()로
+    필요한 단계에서 다시 불러옵니다.
+    """
+
+    def __init__(self, session_state, session_id: Optional[str] = None,
+                 budget: int = SESSION_MEMORY_BUDGET, spill_dir: str = SPILL_DIR,
+                 min_spill_bytes: int = SPILL_MIN_BYTES):
+        self.session_state = session_state
+        self.budget = budget
+        self.min_spill_bytes = min_spill_bytes
+        if session_id is None:
+            session_id = session_state.get('_memory_session_id') or uuid.uuid4().hex
+            session_state['_memory_session_id'] = session_id
+        self.spill_dir = os.path.join(spill_dir, session_id)
+
+    # --- 측정 ---
+
+    def _shared_ids(self) -> set:
+        return get_shared_cache().value_ids()
+
+    def measure(self) -> Dict[str, int]:
+        """키별 메모리 사용량 (공유 캐시 객체와 이미 센 객체는 제외)"""
+        seen = self._shared_ids()
+        sizes = {}
+        for key in list(self.session_state.keys()):
+            value = self.session_state.get(key)
+            if isinstance(value, SpilledValue):
+                continue
+            sizes[key] = estimate_size(value, seen)
+        return sizes
+
+    def measure_groups(self) -> Dict[str, int]:
+        """내보낼 수 있는 키 묶음별 메모리 사용량"""
+        shared = self._shared_ids()
+        sizes = {}
+        for group, keys in SPILL_GROUPS.items():
+            value = self.session_state.get(group)
+            if value is None or isinstance(value, SpilledValue) or id(value) in shared:
+                continue
+            seen = set(shared)
+            sizes[group] = sum(estimate_size(self.session_state.get(key), seen) for key in keys if key in self.session_state)
+        return sizes
+
+    def spilled(self) -> Dict[str, SpilledValue]:
+        return {group: self.session_state[group] for group in SPILL_GROUPS
+                if isinstance(self.session_state.get(group), SpilledValue)}
+
+    # --- 내보내기/불러오기 ---
+
+    def touch(self, groups: Iterable[str]):
+        """최근 사용 시각 기록"""
+        last_used = self.session_state.get('_memory_last_used', {})
+        now = time.time()
+        for group in groups:
+            last_used[group] = now
+        self.session_state['_memory_last_used'] = last_used
+
+    def spill(self, group: str, size: Optional[int] = None) -> Optional[SpilledValue]:
+        """키 묶음을 디스크로 내보내고 자리 표시자로 교체"""
+        keys = [key for key in SPILL_GROUPS[group] if key in self.session_state]
+        value = self.session_state.get(group)
+        if value is None or isinstance(value, SpilledValue):
+            return None
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{group}.spill")
+        write_spill(path, {key: self.session_state[key] for key in keys})
+
+        placeholder = SpilledValue(group, path, size if size is not None else 0)
+        for key in keys:
+            del self.session_state[key]
+        self.session_state[group] = placeholder
+        for key in DERIVED_KEYS.get(group, ()):
+            self.session_state.pop(key, None)
+        logger.info(f"Spilled session data {group} ({placeholder.size / 1024 / 1024:.1f}MB) to {path}")
+        return placeholder
+
+    def restore(self, groups: Iterable[str]) -> List[str]:
+        """내보낸 키 묶음을 다시 불러옴 (이미 메모리에 있으면 그대로)"""
+        restored = []
+        for group in groups:
+            placeholder = self.session_state.get(group)
+            if isinstance(placeholder, SpilledValue):
+                values = read_spill(placeholder.path)
+                for key, value in values.items():
+                    self.session_state[key] = value
+                try:
+                    os.remove(placeholder.path)
+                except OSError:
+                    pass
+                restored.append(group)
+        self.touch(groups)
+        return restored
+
+    def enforce_budget(self, protected: Iterable[str] = ()) -> List[str]:
+        """예산을 넘으면 보호되지 않은 큰 데이터를 오래 안 쓴 순서로 내보냄, 내보낸 묶음 반환"""
+        protected = set(protected)
+        total = sum(self.measure().values())
+        if total <= self.budget:
+            return []
+
+        last_used = self.session_state.get('_memory_last_used', {})
+        candidates = [
+            (group, size) for group, size in self.measure_groups().items()
+            if group not in protected and size >= self.min_spill_bytes
+        ]
+        candidates.sort(key=lambda item: last_used.get(item[0], 0))
+
+        spilled = []
+        for group, size in candidates:
+            if total <= self.budget:
+                break
+            if self.spill(group, size):
+                total -= size
+                spilled.append(group)
+        return spilled
+
+    def run_step(self, step: int) -> List[str]:
+        """현재 단계에 필요한 데이터를 불러오고, 측정 간격이 지났으면 예산을 적용"""
+        needed = STEP_KEYS.get(step, ())
+        self.restore(needed)
+
+        now = time.time()
+        if now - self.session_state.get('_memory_checked_at', 0) < MEASURE_INTERVAL:
+            return []
+        self.session_state['_memory_checked_at'] = now
+        return self.enforce_budget(protected=needed)
+
+    def summary(self) -> Tuple[int, List[Tuple[str, int]]]:
+        """(전체 사용량, 큰 순서의 키별 사용량)"""
+        sizes = self.measure()
+        return sum(sizes.values()), sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+
+    def clear(self):
+        """이 세션이 내보낸 파일 모두 삭제 (처음부터 다시 시작할 때)"""
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    @staticmethod
+    def cleanup_stale(spill_dir: str = SPILL_DIR, max_age_hours: float = STALE_SPILL_HOURS) -> int:
+        """끝난 세션이 남긴 폴더 삭제"""
+        if not os.path.isdir(spill_dir):
+            return 0
+        removed = 0
+        cutoff = time.time() - max_age_hours * 3600
+        for name in os.listdir(spill_dir):
+            path = os.path.join(spill_dir, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
@@ -0,0 +1,263 @@
+import hashlib
+import io
+import json
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import pandas as pd
+import streamlit as st
+
+from enhanced_processor import compile_template, profile_columns
+
+# 모든 세션이 함께 쓰는 캐시의 최대 메모리 (넘으면 가장 오래 안 쓴 항목부터 제거)
+SHARED_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def estimate_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """객체의 실제 메모리 사용량 추정 (DataFrame, 중첩 dict/list 포함, 공유 객체는 한 번만 계산)"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key, _seen) + estimate_size(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += estimate_size(vars(obj), _seen)
+    return size
+
+def content_hash(*parts: Any) -> str:
+    """바이트/문자열/JSON 직렬화 가능한 값들의 내용 해시"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        elif isinstance(part, str):
+            digest.update(part.encode('utf-8'))
+        else:
+            digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+def collect_object_ids(obj: Any, ids: set):
+    """obj와 그 안의 dict/list/tuple/set에 들어 있는 모든 객체의 id를 ids에 추가"""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in ids:
+            continue
+        ids.add(id(item))
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+
+class SharedLRUCache:
+    """크기 제한이 있는 프로세스 공용 LRU 캐시
+
+    항목마다 추정 메모리를 기록하고, 합계가 max_bytes를 넘으면 가장 오래 사용하지 않은 항목부터 제거합니다.
+    여러 세션이 같은 객체를 공유하므로 꺼낸 값은 읽기 전용으로 다뤄야 합니다 (수정하려면 복사).
+    """
+
+    def __init__(self, max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # 키 -> (값, 크기)
+        self._creating: Dict[Hashable, threading.Event] = {}  # 다른 스레드가 만드는 중인 키
+        self._version = 0  # 항목이 바뀔 때마다 증가 (value_ids 재계산 여부 판단)
+        self._value_ids: Optional[tuple] = None  # (버전, id 집합)
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> Any:
+        """값 저장 (캐시 전체보다 큰 값은 저장하지 않고 그대로 반환)"""
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._version += 1
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """캐시에 있으면 반환, 없으면 만들어 저장 후 반환
+
+        같은 키를 다른 스레드가 만들고 있으면 중복으로 만들지 않고 끝나기를 기다립니다.
+        """
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                creating = self._creating.get(key)
+                if creating is None:
+                    creating = self._creating[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # 만든 쪽이 실패했거나 값이 너무 커 저장되지 않았으면 다시 확인 후 직접 만듦
+            creating.wait()
+        # 만드는 동안에는 잠그지 않아 다른 세션의 조회를 막지 않음
+        try:
+            return self.put(key, factory())
+        finally:
+            with self._lock:
+                self._creating.pop(key, None)
+            creating.set()
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self._version += 1
+
+    def value_ids(self) -> set:
+        """캐시에 있는 값과 그 안에 중첩된 객체들의 id (세션 메모리 측정 시 공유 객체를 빼기 위해 사용)
+
+        세션이 캐시 값의 일부(예: 메시지 생성 결과 안의 메시지 딕셔너리)를 들고 있어도 공유 객체로 봅니다.
+        항목이 바뀌었을 때만 다시 계산하며, 호출한 쪽이 수정해도 되도록 복사본을 반환합니다.
+        """
+        with self._lock:
+            if self._value_ids is None or self._value_ids[0] != self._version:
+                ids = set()
+                for value, _ in self._entries.values():
+                    collect_object_ids(value, ids)
+                self._value_ids = (self._version, ids)
+            return set(self._value_ids[1])
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """캐시 통계"""
+        with self._lock:
+            kinds: Dict[str, int] = {}
+            for key, (_, size) in self._entries.items():
+                kind = key[0] if isinstance(key, tuple) else 'other'
+                kinds[kind] = kinds.get(kind, 0) + size
+            return {
+                'entries': len(self._entries),
+                'size_mb': self.current_bytes / 1024 / 1024,
+                'max_mb': self.max_bytes / 1024 / 1024,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size_mb_by_kind': {kind: size / 1024 / 1024 for kind, size in kinds.items()}
+            }
+
+@st.cache_resource
+def get_shared_cache() -> SharedLRUCache:
+    """모든 세션이 함께 쓰는 캐시 (서버 프로세스당 하나)"""
+    return SharedLRUCache(SHARED_CACHE_MAX_BYTES)
+
+# --- 내용 해시 기반 캐시 항목 ---
+
+def file_content_hash(uploaded_file) -> str:
+    """업로드 파일 내용 해시 (같은 파일을 여러 세션이 올려도 같은 키)"""
+    return content_hash(uploaded_file.getvalue())
+
+def cached_sheet_names(uploaded_file, file_hash: str) -> list:
+    """통합 문서의 시트 이름 목록"""
+    return get_shared_cache().get_or_create(
+        ('sheet_names', file_hash), lambda: pd.ExcelFile(io.BytesIO(uploaded_file.getvalue())).sheet_names
+    )
+
+def sheet_cache_key(file_hash: str, sheet_name: str, header=None, dtype=None,
+                    strip_columns: bool = False, fillna=None) -> tuple:
+    """시트를 읽은 결과의 캐시 키 (같은 시트라도 읽기 옵션이 다르면 다른 항목)"""
+    return ('sheet', file_hash, sheet_name, header, str(dtype), strip_columns, fillna)
+
+def _read_sheet(source, sheet_name: str, header=None, dtype=None,
+                strip_columns: bool = False, fillna=None) -> pd.DataFrame:
+    df = pd.read_excel(source, sheet_name=sheet_name, header=header, dtype=dtype)
+    if strip_columns:
+        df.columns = df.columns.str.strip()
+    if fillna is not None:
+        df = df.fillna(fillna)
+    return df
+
+def cached_read_sheet(uploaded_file, file_hash: str, sheet_name: str, **read_options) -> pd.DataFrame:
+    """시트를 한 번만 읽어 공유 (반환된 DataFrame은 수정하지 말 것)
+
+    read_options: header, dtype, strip_columns, fillna
+    """
+    return get_shared_cache().get_or_create(
+        sheet_cache_key(file_hash, sheet_name, **read_options),
+        lambda: _read_sheet(io.BytesIO(uploaded_file.getvalue()), sheet_name, **read_options)
+    )
+
+def prefetch_sheets(uploaded_file, file_hash: str, sheet_names: list, progress_callback=None,
+                    cancel_check=None, **read_options) -> int:
+    """시트들을 주어진 순서대로 미리 읽어 캐시에 넣음, 새로 읽은 시트 수 반환
+
+    통합 문서는 한 번만 열고, 이미 캐시에 있는 시트는 건너뜁니다.
+    progress_callback(처리한 시트 수, 전체 시트 수, 시트 이름)
+    """
+    cache = get_shared_cache()
+    workbook = None
+    loaded = 0
+    try:
+        for index, sheet_name in enumerate(sheet_names):
+            if cancel_check and cancel_check():
+                break
+            key = sheet_cache_key(file_hash, sheet_name, **read_options)
+            if key not in cache:
+                if workbook is None:
+                    workbook = pd.ExcelFile(io.BytesIO(uploaded_file.getvalue()))
+                cache.get_or_create(key, lambda: _read_sheet(workbook, sheet_name, **read_options))
+                loaded += 1
+            if progress_callback:
+                progress_callback(index + 1, len(sheet_names), sheet_name)
+    finally:
+        # 시트를 읽다 실패해도 통합 문서는 닫음
+        if workbook is not None:
+            workbook.close()
+    return loaded
+
+def table_cache_key(file_hash: str, sheet_name: str, header_row: int) -> str:
+    """고객 테이블(파일/시트/헤더 행)을 나타내는 캐시 키"""
+    return content_hash(file_hash, sheet_name, header_row)
+
+def cached_column_profiles(customer_df: pd.DataFrame, table_key: str) -> pd.DataFrame:
+    """컬럼 프로필을 시트 키 기준으로 한 번만 계산해 공유"""
+    return get_shared_cache().get_or_create(('column_profiles', table_key), lambda: profile_columns(customer_df))
+
+def cached_compiled_template(template: str) -> tuple:
+    """템플릿 분석 결과를 내용 해시 기준으로 공유"""
+    return get_shared_cache().get_or_create(('template', content_hash(template)), lambda: compile_template(template))
@@ -116,7 +116,7 @@ class TravelMessageGeneratorStarter:
                     
                     # 개별 패키지 설치 시도
                     essential_packages = [
-                        'streamlit>=1.28.0',
+                        'streamlit>=1.37.0',
                         'pandas>=1.5.0', 
                         'openpyxl>=3.1.0'
                     ]
@@ -1,9 +1,16 @@
 import json
 import os
 import hashlib
+import tempfile
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional
 
+# 사용자 템플릿 목록용 메타데이터 인덱스 (템플릿 디렉토리 안, 템플릿 파일로 취급하지 않음)
+TEMPLATE_INDEX_FILE = "_index.json"
+# 모든 세션이 한 프로세스에서 인덱스를 읽고 고치므로 읽기-수정-쓰기는 이 잠금 안에서 수행
+_INDEX_LOCK = threading.RLock()
+
 class TemplateManager:
     """템플릿 관리 시스템 (사용자 템플릿 중심)"""
     
@@ -19,31 +26,114 @@ class TemplateManager:
                 os.makedirs(directory)
     
     def get_user_template_list(self) -> List[Dict]:
-        """사용자가 저장한 템플릿 목록만 반환"""
-        templates = []
-        
-        for filename in os.listdir(self.template_dir):
-            if filename.endswith('.json') and not filename.startswith('default_'):
-                try:
-                    template_id = filename.replace('.json', '')
-                    template_data = self.load_template(template_id)
-                    if template_data:
-                        templates.append({
-                            'id': template_id,
-                            'name': template_data.get('name', template_id),
-                            'description': template_data.get('description', ''),
-                            'created_at': template_data.get('created_at', ''),
-                            'updated_at': template_data.get('updated_at', ''),
-                            'variables_count': len(template_data.get('variables', []))
-                        })
-                except Exception as e:
-                    print(f"템플릿 {filename} 로드 중 오류: {e}")
-                    continue
+        """사용자가 저장한 템플릿 목록만 반환
+
+        목록은 메타데이터 인덱스에서 만들고, 파일의 수정 시각/크기가 인덱스와 다른 템플릿만 다시 읽습니다.
+        인덱스는 다른 프로세스가 템플릿을 고쳤거나 저장이 실패해 오래된 상태일 수 있지만, 이 확인으로
+        다음 목록 조회 때 바로잡힙니다.
+        """
+        with _INDEX_LOCK:
+            entries = self._refresh_index()
         
+        templates = [dict(entry['meta']) for entry in entries.values() if entry['meta']]
         # 업데이트 순으로 정렬
         templates.sort(key=lambda x: x.get('updated_at', ''), reverse=True)
         return templates
     
+    # --- 메타데이터 인덱스 ---
+    
+    def _refresh_index(self) -> Dict[str, Dict]:
+        """디렉토리의 템플릿 파일과 인덱스를 맞추고 최신 인덱스 항목 반환"""
+        index = self._load_index()
+        entries = {}
+        changed = False
+        
+        for entry in os.scandir(self.template_dir):
+            if not self._is_user_template_file(entry.name):
+                continue
+            template_id = entry.name[:-len('.json')]
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            cached = index.get(template_id)
+            if cached and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                entries[template_id] = cached
+                continue
+            
+            # 새로 생겼거나 바뀐 템플릿만 읽음 (읽을 수 없는 파일도 기록해 매번 다시 읽지 않음)
+            template_data = self.load_template(template_id)
+            entries[template_id] = {
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'meta': self._template_meta(template_id, template_data) if template_data else None
+            }
+            changed = True
+        
+        if changed or len(entries) != len(index):
+            self._save_index(entries)
+        return entries
+    
+    @staticmethod
+    def _is_user_template_file(filename: str) -> bool:
+        return filename.endswith('.json') and not filename.startswith('default_') and filename != TEMPLATE_INDEX_FILE
+    
+    @staticmethod
+    def _template_meta(template_id: str, template_data: Dict) -> Dict:
+        """목록/검색에 쓰는 템플릿 정보 (본문 제외)"""
+        return {
+            'id': template_id,
+            'name': template_data.get('name', template_id),
+            'description': template_data.get('description', ''),
+            'created_at': template_data.get('created_at', ''),
+            'updated_at': template_data.get('updated_at', ''),
+            'variables_count': len(template_data.get('variables', []))
+        }
+    
+    def _index_path(self) -> str:
+        return os.path.join(self.template_dir, TEMPLATE_INDEX_FILE)
+    
+    def _load_index(self) -> Dict[str, Dict]:
+        """템플릿 ID별 {mtime, size, meta} (없거나 깨졌으면 빈 인덱스)"""
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                return json.load(f).get('templates', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+    
+    def _save_index(self, entries: Dict[str, Dict]):
+        """인덱스 저장 (쓰기마다 만든 임시 파일에 쓴 뒤 교체하므로 반쯤 쓴 파일을 읽지 않음)"""
+        index_file = self._index_path()
+        fd, temp_file = tempfile.mkstemp(dir=self.template_dir, prefix=f"{TEMPLATE_INDEX_FILE}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'templates': entries}, f, ensure_ascii=False)
+            os.replace(temp_file, index_file)
+        except Exception as e:
+            # 인덱스는 다음 목록 조회 때 다시 만들어지므로 저장 실패는 무시
+            print(f"템플릿 인덱스 저장 오류: {e}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    
+    def _update_index(self, template_id: str, template_data: Optional[Dict] = None):
+        """템플릿 하나의 인덱스 항목 갱신 (template_data가 없으면 삭제)
+
+        인덱스 갱신이 실패해도 다음 목록 조회의 수정 시각 확인으로 바로잡힙니다.
+        """
+        template_file = os.path.join(self.template_dir, f"{template_id}.json")
+        with _INDEX_LOCK:
+            entries = self._load_index()
+            if template_data is None or not self._is_user_template_file(f"{template_id}.json"):
+                entries.pop(template_id, None)
+            else:
+                stat = os.stat(template_file)
+                entries[template_id] = {
+                    'mtime': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'meta': self._template_meta(template_id, template_data)
+                }
+            self._save_index(entries)
+    
     def get_template_list(self) -> List[Dict]:
         """하위 호환성을 위한 기존 메서드"""
         return self.get_user_template_list()
@@ -73,6 +163,7 @@ class TemplateManager:
             with open(template_file, 'w', encoding='utf-8') as f:
                 json.dump(template_data, f, ensure_ascii=False, indent=2)
             
+            self._update_index(template_id, template_data)
             return True
         except Exception as e:
             print(f"템플릿 저장 오류: {e}")
@@ -87,6 +178,7 @@ class TemplateManager:
         
         try:
             os.remove(template_file)
+            self._update_index(template_id)
             return True
         except Exception as e:
             print(f"템플릿 삭제 오류: {e}")
@@ -274,7 +366,7 @@ class TemplateManager:
             raise Exception(f"템플릿 가져오기 중 오류: {str(e)}")
     
     def search_templates(self, query: str) -> List[Dict]:
-        """템플릿 검색"""
+        """템플릿 검색 (인덱스의 이름/설명만 검색하므로 본문은 읽지 않음)"""
         all_templates = self.get_user_template_list()
         query_lower = query.lower()
         
@@ -4,6 +4,7 @@
 """
 
 import unittest
+import csv
 import pandas as pd
 import tempfile
 import os
@@ -14,11 +15,25 @@ import io
 
 # 테스트할 모듈들 import
 try:
-    from enhanced_processor import EnhancedDataProcessor, EnhancedMessageGenerator
+    from enhanced_processor import (
+        EnhancedDataProcessor, EnhancedMessageGenerator, compile_template, select_preview_group_ids,
+        profile_columns
+    )
     from ui_helpers import *
     from error_handler import ErrorHandler
     from config_manager import ConfigManager
-    from template_manager import TemplateManager
+    from template_manager import TemplateManager, TEMPLATE_INDEX_FILE
+    from background_tasks import BackgroundTask, TaskRegistry
+    from export_engine import *
+    from search_index import NgramSearchIndex
+    from shared_cache import (
+        SharedLRUCache, estimate_size, content_hash, get_shared_cache, sheet_cache_key,
+        cached_read_sheet, prefetch_sheets
+    )
+    from session_memory import SessionMemoryManager, SpilledValue
+    from edit_overlay import EditOverlay, select_group_ids, count_matches, apply_replace
+    from pipeline import Pipeline, Stage, Checkpoint, PipelineCancelled, SpeculativeStage, render_messages_stage
+    from checkpoints import CheckpointStore
     from sample_data import SampleDataGenerator
 except ImportError as e:
     print(f"Warning: Could not import module: {e}")
@@ -95,6 +110,22 @@ class TestEnhancedDataProcessor(unittest.TestCase):
         self.assertEqual(result['payment_due_date'], '2024-12-20')
         self.assertEqual(result['base_exchange_rate'], 1300)
     
+    def test_profile_columns(self):
+        """컬럼 프로필 계산 테스트"""
+        df = pd.DataFrame({
+            '이름': ['김철수', '이영희', None, '김철수'],
+            '잔금': ['1,000,000원', '2000', '', '미정'],
+            '인원': [1, 2, 3, 4]
+        })
+        
+        profiles = profile_columns(df, sample_count=2)
+        
+        self.assertEqual(profiles.loc['이름', 'samples'], ['김철수', '이영희'])
+        self.assertAlmostEqual(profiles.loc['이름', 'null_rate'], 0.25)
+        self.assertAlmostEqual(profiles.loc['잔금', 'numeric_ratio'], 2 / 3)
+        self.assertEqual(profiles.loc['인원', 'numeric_ratio'], 1.0)
+        self.assertEqual(profiles.loc['인원', 'dtype'], 'int64')
+    
     def test_process_group_data(self):
         """그룹 데이터 처리 테스트"""
         result = self.processor.process_group_data(
@@ -170,6 +201,43 @@ class TestEnhancedMessageGenerator(unittest.TestCase):
         self.assertIn('3,000,000원', message)
         self.assertIn('2024-12-20', message)
     
+    def test_generate_messages_message_order(self):
+        """정렬 인덱스 생성 테스트"""
+        self.group_data['G000'] = dict(self.group_data['G001'], group_id='G000', excel_order=-1)
+        self.group_data['G001']['excel_order'] = 5
+        
+        result = self.generator.generate_messages(self.test_template, self.group_data, self.fixed_data)
+        
+        self.assertEqual(result['message_order']['ids'], ['G000', 'G001'])
+        self.assertEqual(result['message_order']['positions'], {'G000': 0, 'G001': 1})
+        self.assertEqual([gid for gid, _ in self.generator.get_sorted_messages()], ['G000', 'G001'])
+    
+    def test_regenerate_messages_subset(self):
+        """선택한 그룹만 다시 생성하는지 테스트"""
+        self.group_data['G002'] = dict(self.group_data['G001'], group_id='G002', team_name='2팀', excel_order=1)
+        existing = self.generator.generate_messages(self.test_template, self.group_data, self.fixed_data)['messages']
+        
+        result = self.generator.regenerate_messages("{team_name} 새 안내", self.group_data, self.fixed_data, ['G002', 'G999'], existing)
+        
+        self.assertEqual(result['regenerated'], ['G002'])
+        self.assertEqual(result['messages']['G002']['message'], '2팀 새 안내')
+        self.assertIs(result['messages']['G001'], existing['G001'])
+        self.assertIn('하와이 7일', existing['G002']['message'])  # 기존 결과는 변경하지 않음
+    
+    def test_select_preview_group_ids(self):
+        """미리보기 샘플에 가장 긴 메시지와 빈 값이 가장 많은 그룹이 포함되는지 테스트"""
+        for index in range(2, 6):
+            self.group_data[f'G00{index}'] = dict(self.group_data['G001'], group_id=f'G00{index}')
+        self.group_data['G004']['team_name'] = '아주 긴 팀 이름을 가진 팀'
+        self.group_data['G005']['team_name'] = ''
+        
+        samples = dict(select_preview_group_ids("{team_name} {product_name}", self.group_data, self.fixed_data, sample_count=2))
+        
+        self.assertEqual(list(samples)[:2], ['G001', 'G002'])
+        self.assertEqual(samples['G004'], '가장 긴 메시지')
+        self.assertEqual(samples['G005'], '빈 값 1개')
+        self.assertNotIn('G003', samples)
+    
     def test_generate_messages_missing_variable(self):
         """누락된 변수 처리 테스트"""
         template_with_missing = "{product_name} - {missing_variable}"
@@ -195,6 +263,727 @@ class TestEnhancedMessageGenerator(unittest.TestCase):
         self.assertIsInstance(result, dict)
 
 
+class TestExportHelpers(unittest.TestCase):
+    """다운로드 컨텐츠 생성 테스트"""
+    
+    def setUp(self):
+        """테스트 준비"""
+        self.generated_messages = {
+            'G001': {
+                'message': '안녕하세요, 하와이 7일 잔금 안내입니다.',
+                'group_info': {
+                    'group_id': 'G001',
+                    'team_name': '1팀',
+                    'sender_group': 'A그룹',
+                    'sender': '김철수',
+                    'members': ['김철수', '이영희'],
+                    'group_size': 2,
+                    'contact': '010-1234-5678',
+                    'excel_order': 0
+                }
+            }
+        }
+    
+    def test_compute_column_widths(self):
+        """열 너비 계산 테스트"""
+        df = pd.DataFrame({'이름': ['김철수', None], '메시지': ['가' * 100, '짧음']})
+        widths = compute_column_widths(df)
+        
+        self.assertEqual(widths['이름'], 5)  # 3자 + 여백 2
+        self.assertEqual(widths['메시지'], 50)  # 최대 너비 제한
+        
+        # 표본 추출 시에도 모든 컬럼의 너비가 계산되는지 확인
+        sampled = compute_column_widths(df, sample_size=1)
+        self.assertEqual(set(sampled.keys()), {'이름', '메시지'})
+    
+    def test_create_excel_download_content(self):
+        """엑셀 다운로드 열 너비 적용 테스트"""
+        from openpyxl import load_workbook
+        
+        content = create_excel_download_content(self.generated_messages)
+        worksheet = load_workbook(io.BytesIO(content))['메시지목록']
+        
+        self.assertEqual(worksheet['A2'].value, 'G001')
+        self.assertEqual(worksheet.column_dimensions['A'].width, 6)
+    
+    def test_download_content_keeps_dict_order(self):
+        """텍스트/엑셀/CSV 다운로드가 엑셀 순서로 다시 정렬하지 않고 딕셔너리 순서를 유지하는지 테스트"""
+        from openpyxl import load_workbook
+        
+        group_info = self.generated_messages['G001']['group_info']
+        generated_messages = {
+            'G002': {'message': '두 번째', 'group_info': dict(group_info, group_id='G002', excel_order=5)},
+            'G001': self.generated_messages['G001'],
+        }
+        
+        worksheet = load_workbook(io.BytesIO(create_excel_download_content(generated_messages)))['메시지목록']
+        self.assertEqual([worksheet['A2'].value, worksheet['A3'].value], ['G002', 'G001'])
+        
+        csv_rows = list(csv.reader(io.StringIO(create_csv_download_content(generated_messages).lstrip('\ufeff'))))
+        self.assertEqual([row[0] for row in csv_rows[1:]], ['G002', 'G001'])
+        
+        text = create_text_download_content(generated_messages)
+        self.assertLess(text.index('[G002]'), text.index('[G001]'))
+
+    
+    def test_create_zip_bundle_content(self):
+        """그룹별 ZIP 묶음 생성 테스트"""
+        import zipfile
+        
+        records = [
+            (group_id, data['group_info'], data['message'])
+            for group_id, data in self.generated_messages.items()
+        ]
+        output = create_zip_bundle_content(records, io.BytesIO())
+        output.seek(0)
+        
+        with zipfile.ZipFile(output) as zf:
+            self.assertIn('messages/G001_1팀_김철수.txt', zf.namelist())
+            self.assertEqual(zf.read('messages/G001_1팀_김철수.txt').decode('utf-8'), records[0][2])
+            manifest = zf.read('manifest.csv').decode('utf-8-sig')
+            self.assertIn('G001_1팀_김철수.txt,G001,1팀', manifest)
+    
+    def test_create_zip_bundle_duplicate_names(self):
+        """파일명이 겹치는 그룹은 확장자 앞에 번호를 붙이는지 테스트"""
+        import zipfile
+        
+        group_info = {'team_name': 'a.txt팀', 'sender': '김철수'}
+        records = [('G001', group_info, '첫 번째'), ('G001', group_info, '두 번째')]
+        output = create_zip_bundle_content(records, io.BytesIO())
+        
+        with zipfile.ZipFile(output) as zf:
+            self.assertEqual(
+                sorted(name for name in zf.namelist() if name.startswith('messages/')),
+                ['messages/G001_a.txt팀_김철수.txt', 'messages/G001_a.txt팀_김철수_2.txt']
+            )
+    
+    def test_normalize_phone_numbers(self):
+        """휴대폰 번호 정규화 테스트"""
+        phones = pd.Series(['010-1234-5678', '+82 10-1234-5678', '1012345678', None, '02-123-4567'])
+        result = normalize_phone_numbers(phones).tolist()
+        self.assertEqual(result, ['01012345678', '01012345678', '01012345678', '', ''])
+    
+    def test_build_sms_gateway_frame(self):
+        """문자 발송용 파일 생성 테스트"""
+        self.generated_messages['G002'] = {
+            'message': '가' * 100,
+            'group_info': dict(self.generated_messages['G001']['group_info'], group_id='G002', excel_order=1)
+        }
+        frame = build_sms_gateway_frame(self.generated_messages, {'G001': '수정된 메시지'})
+        
+        self.assertEqual(frame.columns.tolist(), ['recipient', 'message', 'message_type', 'group_id'])
+        self.assertEqual(frame['recipient'].tolist(), ['01012345678', '01012345678'])
+        self.assertEqual(frame['message'].tolist()[0], '수정된 메시지')
+        self.assertEqual(frame['message_type'].tolist(), ['SMS', 'LMS'])
+        
+        # 컬럼 단위로 만든 결과는 레코드 writer로 만든 결과와 같음
+        writer = SmsGatewayExportWriter(phone_column='contact')
+        records = iter_export_records(self.generated_messages, {'G001': '수정된 메시지'})
+        pd.testing.assert_frame_equal(frame, run_export(records, [writer])['gateway'])
+        
+        # 정렬 인덱스 순서를 따르고, 번호가 없는 그룹은 제외
+        self.generated_messages['G002']['group_info'] = dict(self.generated_messages['G002']['group_info'], contact='')
+        overlay = EditOverlay(self.generated_messages, {'G002': '수정'})
+        dropped, skipped = sms_gateway_frame_from_messages(self.generated_messages, overlay, ['G002', 'G001'], drop_invalid=True)
+        self.assertEqual((dropped['group_id'].tolist(), skipped), (['G001'], 1))
+        
+        output = io.StringIO()
+        write_sms_gateway_export(frame, output, fmt='jsonl', chunk_size=1)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])['group_id'], 'G002')
+    
+    def test_run_export_single_pass(self):
+        """한 번의 순회로 여러 형식 내보내기 테스트"""
+        records = iter_export_records(self.generated_messages, {'G001': '수정본'})
+        writers = [create_export_writer(fmt) for fmt in ['txt', 'csv', 'xlsx', 'zip', 'jsonl']]
+        progress = []
+        
+        results = run_export(records, writers, progress_callback=lambda done, total: progress.append(done))
+        
+        self.assertEqual(set(results.keys()), {'txt', 'csv', 'xlsx', 'zip', 'jsonl'})
+        self.assertEqual(progress, [1])
+        self.assertIn('수정본', results['txt'].getvalue())
+        self.assertIn('G001,1팀,A그룹,김철수', results['csv'].getvalue())
+        self.assertEqual(json.loads(results['jsonl'].getvalue())['message'], '수정본')
+    
+    def test_export_formats_concurrently(self):
+        """스레드 풀 동시 내보내기 테스트"""
+        records = iter_export_records(self.generated_messages)
+        progress = {}
+        
+        results = export_formats_concurrently(
+            records, ['txt', 'xlsx', 'csv', 'zip'],
+            progress_callback=lambda fmt, done, total: progress.__setitem__(fmt, (done, total))
+        )
+        
+        self.assertEqual(set(results.keys()), {'txt', 'xlsx', 'csv', 'zip'})
+        self.assertTrue(all(isinstance(value, bytes) for value in results.values()))
+        self.assertEqual(progress, {fmt: (1, 1) for fmt in ['txt', 'xlsx', 'csv', 'zip']})
+    
+    def test_export_team_workbooks(self):
+        """팀별 엑셀 묶음 테스트"""
+        import zipfile
+        from openpyxl import load_workbook
+        
+        self.generated_messages['G002'] = {
+            'message': '2팀 메시지',
+            'group_info': dict(self.generated_messages['G001']['group_info'], group_id='G002', team_name='2팀', excel_order=1)
+        }
+        records = iter_export_records(self.generated_messages)
+        
+        for max_workers in (1, 2):
+            output = export_team_workbooks(records, io.BytesIO(), max_workers=max_workers)
+            with zipfile.ZipFile(output) as zf:
+                self.assertEqual(sorted(zf.namelist()), ['1팀.xlsx', '2팀.xlsx'])
+                worksheet = load_workbook(io.BytesIO(zf.read('2팀.xlsx')))['메시지']
+                self.assertEqual(worksheet['A2'].value, 'G002')
+    
+    def test_export_team_workbooks_duplicate_names(self):
+        """파일명이 같아지는 팀도 각자 다른 ZIP 항목으로 저장되는지 테스트"""
+        import zipfile
+        
+        base_info = self.generated_messages['G001']['group_info']
+        self.generated_messages = {
+            'G001': {'message': '첫 팀', 'group_info': dict(base_info, group_id='G001', team_name='A/B')},
+            'G002': {'message': '둘째 팀', 'group_info': dict(base_info, group_id='G002', team_name='A:B')},
+        }
+        records = iter_export_records(self.generated_messages)
+        
+        output = export_team_workbooks(records, io.BytesIO(), max_workers=1)
+        with zipfile.ZipFile(output) as zf:
+            self.assertEqual(sorted(zf.namelist()), ['A_B.xlsx', 'A_B_2.xlsx'])
+
+class TestBackgroundTasks(unittest.TestCase):
+    """BackgroundTask/TaskRegistry 테스트"""
+    
+    def test_background_task(self):
+        """백그라운드 작업 진행률/결과 테스트"""
+        def work(task, count):
+            for i in range(1, count + 1):
+                task.report(i, count)
+            return count
+        
+        task = BackgroundTask(work, 3).start()
+        self.assertEqual(task.wait(5), 3)
+        self.assertTrue(task.is_done())
+        self.assertEqual(task.progress, 1.0)
+
+    def test_task_registry(self):
+        """작업 레지스트리 조회/취소/정리 테스트"""
+        import threading
+        release = threading.Event()
+        
+        def work(task, count):
+            for i in range(1, count + 1):
+                release.wait(5)
+                task.report(i, count)
+                if task.is_cancelled():
+                    break
+            return count
+        
+        registry = TaskRegistry(retention_seconds=0)
+        job_id = registry.submit(BackgroundTask(work, 2))
+        task = registry.get(job_id)
+        self.assertTrue(task.is_running())
+        self.assertIsNone(task.eta)  # 처리한 항목이 없으면 추정하지 않음
+        
+        self.assertIs(registry.discard(job_id), task)
+        release.set()
+        task.wait(5)
+        self.assertEqual(task.status, 'cancelled')
+        self.assertIsNone(registry.get(job_id))
+        
+        # 보관 시간이 지난 끝난 작업은 정리됨
+        done_task = BackgroundTask(work, 1)
+        done_id = registry.submit(done_task)
+        done_task.wait(5)
+        self.assertIsNone(registry.get(done_id))
+        self.assertEqual(len(registry), 0)
+
+class TestSearchIndex(unittest.TestCase):
+    """NgramSearchIndex 테스트"""
+    
+    def setUp(self):
+        self.generated_messages = {
+            'G001': {'message': '잔금 안내드립니다.', 'group_info': {'team_name': '1팀', 'sender': '홍길동', 'members': ['홍길동', '김철수'], '연락처': '010-1234-5678'}},
+            'G002': {'message': '추가 요금이 있습니다.', 'group_info': {'team_name': '2팀', 'sender': '이영희', 'members': ['이영희'], '연락처': '010-9876-5432'}},
+            'G003': {'message': '잔금 납부 바랍니다.', 'group_info': {'team_name': '서울 11팀', 'sender': '박지성', 'members': ['박지성', '홍길순'], '연락처': ''}}
+        }
+        self.order = ['G001', 'G002', 'G003']
+    
+    def test_search_fields(self):
+        """팀명/이름/연락처 부분 검색 테스트"""
+        index = NgramSearchIndex.from_messages(self.generated_messages, self.order)
+        
+        self.assertEqual(index.search('길'), ['G001', 'G003'])
+        self.assertEqual(index.search('홍길'), ['G001', 'G003'])
+        self.assertEqual(index.search('철수'), ['G001'])
+        self.assertEqual(index.search('11팀'), ['G003'])
+        self.assertEqual(index.search('98765432'), ['G002'])
+        self.assertEqual(index.search('1234-5678'), ['G001'])
+        self.assertEqual(index.search('잔금'), [])
+        self.assertEqual(index.search(''), self.order)
+    
+    def test_search_messages_and_update(self):
+        """메시지 본문 검색 및 수정 반영 테스트"""
+        index = NgramSearchIndex.from_messages(self.generated_messages, self.order, include_messages=True)
+        self.assertEqual(index.search('잔금'), ['G001', 'G003'])
+        
+        index.update('G001', index.document_text(self.generated_messages['G001']['group_info'], '일정 변경 안내'))
+        self.assertEqual(index.search('잔금'), ['G003'])
+        self.assertEqual(index.search('일정 변경'), ['G001'])
+
+class TestEditOverlay(unittest.TestCase):
+    """EditOverlay 테스트"""
+    
+    def setUp(self):
+        self.generated_messages = {
+            'G001': {'message': '안녕하세요 홍길동님, 잔금은 1,000,000원입니다. ' * 5, 'group_info': {'team_name': '1팀'}},
+            'G002': {'message': '2팀 메시지', 'group_info': {'team_name': '2팀'}}
+        }
+    
+    def test_copy_on_write(self):
+        """원본과 다른 수정만 기록되는지 테스트"""
+        overlay = EditOverlay(self.generated_messages)
+        original = self.generated_messages['G001']['message']
+        
+        self.assertFalse(overlay.set('G001', original))
+        self.assertEqual(len(overlay), 0)
+        
+        edited = original.replace('1,000,000원', '900,000원', 1)
+        self.assertTrue(overlay.set('G001', edited))
+        self.assertEqual(overlay['G001'], edited)
+        self.assertNotIsInstance(overlay._edits['G001'], str)  # 변경 구간만 저장
+        self.assertEqual(overlay.get('G002', '2팀 메시지'), '2팀 메시지')
+        
+        records = iter_export_records(self.generated_messages, overlay, ['G001', 'G002'])
+        self.assertEqual([record.message for record in records], [edited, '2팀 메시지'])
+        
+        overlay.set('G001', original)
+        self.assertNotIn('G001', overlay)
+    
+    def test_rebase(self):
+        """메시지 재생성 후 수정 내용 유지 테스트"""
+        overlay = EditOverlay(self.generated_messages, {'G002': '수정된 메시지'})
+        regenerated = {'G002': {'message': '새 2팀 메시지', 'group_info': {'team_name': '2팀'}}}
+        
+        overlay.rebase(regenerated)
+        self.assertEqual(dict(overlay), {'G002': '수정된 메시지'})
+        self.assertEqual(overlay.base_message('G002'), '새 2팀 메시지')
+    
+    def test_bulk_replace(self):
+        """전체 찾아 바꾸기 미리보기/적용 테스트"""
+        overlay = EditOverlay(self.generated_messages)
+        group_ids = select_group_ids(self.generated_messages, ['G001', 'G002'])
+        
+        matches = count_matches(overlay, group_ids, '1,000,000원')
+        self.assertEqual(matches.to_dict(), {'G001': 5})
+        
+        changed = apply_replace(overlay, group_ids, r'(\d)팀', r'\1조', regex=True)
+        self.assertEqual(changed, {'G002': '2조 메시지'})
+        self.assertEqual(overlay['G002'], '2조 메시지')
+        self.assertEqual(select_group_ids(self.generated_messages, ['G001', 'G002'], ['2팀']), ['G002'])
+        
+        # 빈 문자열에 일치하는 정규식은 미리보기와 적용 모두 거부
+        for find in ('^', 'a*', r'\b'):
+            with self.assertRaises(ValueError):
+                count_matches(overlay, group_ids, find, regex=True)
+            with self.assertRaises(ValueError):
+                apply_replace(overlay, group_ids, find, 'x', regex=True)
+        self.assertEqual(overlay['G002'], '2조 메시지')
+
+class TestSharedCache(unittest.TestCase):
+    """SharedLRUCache 테스트"""
+    
+    def test_lru_eviction(self):
+        """메모리 한도 초과 시 가장 오래 안 쓴 항목 제거 테스트"""
+        cache = SharedLRUCache(max_bytes=300)
+        cache.put(('sheet', 'a'), 'a', size=100)
+        cache.put(('sheet', 'b'), 'b', size=100)
+        cache.put(('groups', 'c'), 'c', size=100)
+        
+        self.assertEqual(cache.get(('sheet', 'a')), 'a')  # a를 최근 사용으로
+        cache.put(('template', 'd'), 'd', size=100)
+        
+        self.assertNotIn(('sheet', 'b'), cache)
+        self.assertIn(('sheet', 'a'), cache)
+        self.assertEqual(cache.current_bytes, 300)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        
+        # 캐시보다 큰 값은 저장하지 않음
+        self.assertEqual(cache.put(('sheet', 'big'), 'big', size=1000), 'big')
+        self.assertNotIn(('sheet', 'big'), cache)
+    
+    def test_get_or_create_and_size(self):
+        """한 번만 생성 및 메모리 추정 테스트"""
+        cache = SharedLRUCache()
+        calls = []
+        factory = lambda: calls.append(1) or compile_template("{a} 님 [컬럼:금액:,]원")
+        
+        first = cache.get_or_create(('template', content_hash("t")), factory)
+        second = cache.get_or_create(('template', content_hash("t")), factory)
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first, (('a', None), ' 님 ', ('금액', ':,'), '원'))
+        
+        df = pd.DataFrame({'이름': ['홍길동'] * 100})
+        self.assertGreaterEqual(estimate_size({'df': df}), df.memory_usage(deep=True).sum())
+        self.assertEqual(content_hash({'b': 1, 'a': 2}), content_hash({'a': 2, 'b': 1}))
+    
+    def test_get_or_create_waits_for_pending(self):
+        """다른 스레드가 만드는 중인 키는 중복으로 만들지 않고 기다리는지 테스트"""
+        import threading
+        cache = SharedLRUCache()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+        
+        def slow_factory():
+            calls.append('slow')
+            started.set()
+            release.wait(5)
+            return 'sheet'
+        
+        worker = threading.Thread(target=cache.get_or_create, args=(('sheet', 'a'), slow_factory))
+        worker.start()
+        started.wait(5)
+        threading.Timer(0.05, release.set).start()
+        
+        self.assertEqual(cache.get_or_create(('sheet', 'a'), lambda: calls.append('dup') or 'dup'), 'sheet')
+        worker.join(5)
+        self.assertEqual(calls, ['slow'])
+        
+        # 만드는 쪽이 실패하면 기다리던 쪽이 직접 만듦
+        started.clear()
+        release.clear()
+        errors = []
+        
+        def failing_factory():
+            calls.append('fail')
+            started.set()
+            release.wait(5)
+            raise ValueError()
+        
+        def create_failing():
+            try:
+                cache.get_or_create(('sheet', 'b'), failing_factory)
+            except ValueError as e:
+                errors.append(e)
+        
+        worker = threading.Thread(target=create_failing)
+        worker.start()
+        started.wait(5)
+        threading.Timer(0.05, release.set).start()
+        
+        self.assertEqual(cache.get_or_create(('sheet', 'b'), lambda: calls.append('b') or 'b'), 'b')
+        worker.join(5)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(calls, ['slow', 'fail', 'b'])
+    
+    def _make_workbook(self, sheet_names):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        for index, name in enumerate(sheet_names):
+            sheet = workbook.active if index == 0 else workbook.create_sheet()
+            sheet.title = name
+            sheet.append([name, index])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer
+    
+    def test_prefetch_sheets(self):
+        """시트 미리 읽기: 캐시에 있는 시트는 건너뛰고, 취소하면 멈추는지 테스트"""
+        import uuid
+        upload = self._make_workbook(['A', 'B', 'C'])
+        file_hash = uuid.uuid4().hex
+        options = {'header': None, 'dtype': str, 'fillna': ''}
+        cache = get_shared_cache()
+        cache.put(sheet_cache_key(file_hash, 'B', **options), 'cached')
+        
+        progress = []
+        loaded = prefetch_sheets(upload, file_hash, ['A', 'B', 'C'],
+                                 progress_callback=lambda done, total, name: progress.append(name), **options)
+        self.assertEqual(loaded, 2)
+        self.assertEqual(progress, ['A', 'B', 'C'])
+        self.assertEqual(cache.get(sheet_cache_key(file_hash, 'B', **options)), 'cached')
+        self.assertEqual(cached_read_sheet(upload, file_hash, 'C', **options).iloc[0, 0], 'C')
+        
+        # 첫 시트를 읽은 뒤 취소하면 나머지는 읽지 않음
+        other_hash = uuid.uuid4().hex
+        task = BackgroundTask(
+            lambda task: prefetch_sheets(upload, other_hash, ['C', 'A', 'B'],
+                                         progress_callback=lambda *args: task.cancel(),
+                                         cancel_check=task.is_cancelled, **options)
+        ).start()
+        self.assertEqual(task.wait(5), 1)
+        self.assertEqual(task.status, 'cancelled')
+        self.assertIn(sheet_cache_key(other_hash, 'C', **options), cache)
+        self.assertNotIn(sheet_cache_key(other_hash, 'A', **options), cache)
+        
+        # 없는 시트를 만나면 오류를 그대로 알림 (통합 문서는 닫힘)
+        with self.assertRaises(ValueError):
+            prefetch_sheets(upload, uuid.uuid4().hex, ['A', '없음'], **options)
+    
+    def test_start_sheet_prefetch(self):
+        """업로드 단계의 미리 읽기: 선택한 시트부터 읽고 같은 파일이면 작업을 다시 만들지 않는지 테스트"""
+        from streamlit.testing.v1 import AppTest
+        
+        def script():
+            import streamlit as st
+            from main_app import start_sheet_prefetch
+            upload = st.session_state.upload
+            st.session_state.tasks = [
+                start_sheet_prefetch(upload, 'file-a', ['A', 'B', 'C'], 'B'),
+                start_sheet_prefetch(upload, 'file-a', ['A', 'B', 'C'], 'C'),
+                start_sheet_prefetch(upload, 'file-b', ['A'], 'A'),
+            ]
+        
+        at = AppTest.from_function(script, default_timeout=30)
+        at.session_state.upload = self._make_workbook(['A', 'B', 'C'])
+        at.run()
+        self.assertFalse(at.exception)
+        first, again, single = at.session_state.tasks
+        self.assertIs(first, again)
+        self.assertIsNone(single)
+        self.assertEqual(first.args[2], ['B', 'A', 'C'])
+        self.assertEqual(first.wait(5), 3)
+
+class TestSessionMemory(unittest.TestCase):
+    """SessionMemoryManager 테스트"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        generated_messages = {
+            f"G{i:03d}": {'message': f"{i}번 그룹 잔금 안내 " * 50, 'group_info': {'team_name': f"{i % 3}팀"}}
+            for i in range(200)
+        }
+        self.session_state = {
+            'current_step': 5,
+            'sheet_data': pd.DataFrame({0: ['상품명'] * 500, 1: ['하와이 7일'] * 500}),
+            'generated_messages': generated_messages,
+            'edited_messages': EditOverlay(generated_messages, {'G001': '수정됨'}),
+            'search_indexes': {'generation_version': 1}
+        }
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_spill_and_restore(self):
+        """예산 초과 시 내보내기 및 다시 불러오기 테스트"""
+        manager = SessionMemoryManager(self.session_state, session_id='test', budget=0,
+                                       spill_dir=self.temp_dir, min_spill_bytes=0)
+        original_sheet = self.session_state['sheet_data'].copy()
+        
+        spilled = manager.enforce_budget(protected=('generated_messages',))
+        self.assertEqual(spilled, ['sheet_data'])
+        self.assertIsInstance(self.session_state['sheet_data'], SpilledValue)
+        
+        manager.spill('generated_messages')
+        self.assertNotIn('edited_messages', self.session_state)
+        self.assertNotIn('search_indexes', self.session_state)
+        
+        manager.restore(('sheet_data', 'generated_messages'))
+        pd.testing.assert_frame_equal(self.session_state['sheet_data'], original_sheet)
+        overlay = self.session_state['edited_messages']
+        self.assertIs(overlay.base, self.session_state['generated_messages'])
+        self.assertEqual(overlay['G001'], '수정됨')
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, 'test')), [])
+    
+    def test_within_budget(self):
+        """예산 이내면 내보내지 않는지 테스트"""
+        manager = SessionMemoryManager(self.session_state, session_id='test', spill_dir=self.temp_dir)
+        total, sizes = manager.summary()
+        self.assertGreater(total, 0)
+        self.assertEqual(sizes[0][0], 'generated_messages')
+        self.assertEqual(manager.enforce_budget(), [])
+    
+    def test_cached_render_not_counted(self):
+        """공유 캐시에 있는 메시지 생성 결과는 세션 메모리로 세지 않고 내보내지도 않는지 테스트"""
+        import uuid
+        pipeline = Pipeline([Stage('render', lambda context: {'messages': {
+            f"G{i:03d}": {'message': f"{context['run']} {i}번 그룹 잔금 안내 " * 50, 'group_info': {'team_name': f"{i % 3}팀"}}
+            for i in range(200)
+        }}, params=('run',))])
+        outputs, _ = pipeline.run({'run': uuid.uuid4().hex}, get_shared_cache())
+        messages = outputs['render']['messages']
+        
+        # 결과 딕셔너리를 그대로 들고 있으면 전부 공유 객체
+        session_state = {'generated_messages': messages}
+        manager = SessionMemoryManager(session_state, session_id='test', budget=0,
+                                       spill_dir=self.temp_dir, min_spill_bytes=0)
+        self.assertLess(manager.measure()['generated_messages'], 1024)
+        self.assertEqual(manager.enforce_budget(), [])
+        
+        # 세션용 복사본은 그룹별 항목만 세고, 메시지 본문과 그룹 정보는 세지 않음
+        session_state['generated_messages'] = {group_id: dict(data) for group_id, data in messages.items()}
+        self.assertLess(manager.measure()['generated_messages'], estimate_size(messages) / 5)
+
+class TestPipeline(unittest.TestCase):
+    """단계별 메모이제이션 파이프라인 테스트"""
+    
+    def setUp(self):
+        self.calls = []
+        
+        def stage(name, result):
+            def func(context, *inputs):
+                self.calls.append(name)
+                return result(context, *inputs)
+            return func
+        
+        self.pipeline = Pipeline([
+            Stage('fixed', stage('fixed', lambda c: {'product': c['product']}), params=('product',)),
+            Stage('groups', stage('groups', lambda c: [f"{c['team']}{i}" for i in range(2)]), params=('team',)),
+            Stage('render', stage('render', lambda c, groups, fixed: [c['template'].format(group=g, **fixed) for g in groups]),
+                  inputs=('groups', 'fixed'), params=('template',)),
+        ])
+        self.cache = SharedLRUCache()
+        self.context = {'product': '하와이', 'team': '1팀', 'template': '{product} {group}'}
+    
+    def test_partial_rerun(self):
+        """바뀐 입력에 영향을 받는 단계만 다시 실행되는지 테스트"""
+        outputs, timings = self.pipeline.run(self.context, self.cache)
+        self.assertEqual(outputs['render'], ['하와이 1팀0', '하와이 1팀1'])
+        self.assertEqual([t['status'] for t in timings], ['run', 'run', 'run'])
+        
+        # 템플릿만 바꾸면 메시지 생성만 다시 실행
+        self.calls.clear()
+        outputs, timings = self.pipeline.run(dict(self.context, template='{group}: {product}'), self.cache)
+        self.assertEqual(self.calls, ['render'])
+        self.assertEqual(outputs['render'][0], '1팀0: 하와이')
+        
+        # 고정 정보만 바꾸면 그룹은 재사용
+        self.calls.clear()
+        self.pipeline.run(dict(self.context, product='괌'), self.cache)
+        self.assertEqual(self.calls, ['fixed', 'render'])
+        
+        stats = self.pipeline.stats()
+        self.assertEqual((stats['groups']['runs'], stats['groups']['cached']), (1, 2))
+    
+    def test_targets_and_cancel(self):
+        """필요한 단계만 실행하고 취소 요청 시 중단하는지 테스트"""
+        key = self.pipeline.stage_keys(self.context, ['groups'])['groups']
+        self.assertFalse(self.pipeline.is_cached(self.cache, 'groups', key))
+        outputs, _ = self.pipeline.run(self.context, self.cache, targets=['groups'])
+        self.assertEqual(list(outputs), ['groups'])
+        self.assertTrue(self.pipeline.is_cached(self.cache, 'groups', key))
+        
+        with self.assertRaises(PipelineCancelled):
+            self.pipeline.run(dict(self.context, cancel_check=lambda: True), self.cache)
+        
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('render', lambda c, groups: groups, inputs=('groups',))])
+
+    def test_checkpoint_restore(self):
+        """공유 캐시가 비어도 디스크 체크포인트에서 복원하고 이전 단계는 건너뛰는지 테스트"""
+        store = CheckpointStore(tempfile.mkdtemp())
+        self.pipeline.stages['groups'].checkpoint = Checkpoint(
+            lambda groups: pd.DataFrame({'group': groups}), lambda frame: frame['group'].tolist()
+        )
+        self.pipeline.run(self.context, self.cache, checkpoints=store)
+        
+        self.calls.clear()
+        outputs, timings = self.pipeline.run(self.context, SharedLRUCache(), targets=['groups'], checkpoints=store)
+        self.assertEqual(outputs['groups'], ['1팀0', '1팀1'])
+        self.assertEqual(self.calls, [])
+        self.assertEqual(timings[0]['status'], 'checkpoint')
+    
+    def test_speculative_stage(self):
+        """미리 실행: 같은 입력이면 재사용, 입력이 바뀌면 취소, 실행하려는 쪽은 끝나기를 기다림"""
+        import threading
+        release = threading.Event()
+        build_groups = self.pipeline.stages['groups'].func
+        
+        def slow_groups(context):
+            release.wait(5)
+            return build_groups(context)
+        
+        self.pipeline.stages['groups'].func = slow_groups
+        speculative = SpeculativeStage(self.pipeline, 'groups', self.cache)
+        
+        first = speculative.start(self.context)
+        self.assertIs(speculative.start(dict(self.context, template='다른 템플릿')), first)
+        
+        # 매핑이 바뀌면 이전 작업은 취소하고 새 입력으로 시작
+        changed = dict(self.context, team='2팀')
+        second = speculative.start(changed)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.is_cancelled())
+        self.assertIsNone(speculative.task_for(self.context))
+        self.assertIs(speculative.task_for(changed), second)
+        
+        # 생성 쪽은 진행 중인 작업을 기다렸다가 그 결과를 재사용
+        threading.Timer(0.05, release.set).start()
+        speculative.wait(changed)
+        self.assertFalse(second.is_running())
+        first.wait(5)
+        self.calls.clear()
+        _, timings = self.pipeline.run(changed, self.cache)
+        self.assertEqual([t['status'] for t in timings], ['run', 'cached', 'run'])
+        self.assertNotIn('groups', self.calls)
+        
+        # 결과가 이미 있으면 시작하지 않음, 무효화하면 작업을 잊음
+        speculative.cancel()
+        self.assertIsNone(speculative.start(changed))
+        self.assertIsNone(speculative.task_for(changed))
+    
+    def test_job_manifest_rejects_invalid_ids(self):
+        """주소창에서 온 작업 ID가 형식에 맞지 않으면 체크포인트 폴더 밖 파일을 읽거나 지우지 않는지 테스트"""
+        base_dir = tempfile.mkdtemp()
+        store = CheckpointStore(os.path.join(base_dir, 'checkpoints'))
+        outside = os.path.join(base_dir, 'outside.json')
+        with open(outside, 'w', encoding='utf-8') as f:
+            json.dump({'keys': {}}, f)
+        
+        self.assertIsNone(store.load_manifest('../../outside'))
+        store.discard_manifest('../../outside')
+        self.assertTrue(os.path.exists(outside))
+        with self.assertRaises(ValueError):
+            store.save_manifest('../outside', {'keys': {}})
+        
+        job_id = TaskRegistry().submit(BackgroundTask(lambda task: None))
+        store.save_manifest(job_id, {'keys': {'groups': content_hash('g')}, 'template': ''})
+        self.assertEqual(store.load_manifest(job_id)['template'], '')
+        self.assertTrue(store.is_valid_key(content_hash('g')))
+        self.assertFalse(store.is_valid_key('../groups'))
+    
+    def test_concurrent_checkpoint_save(self):
+        """같은 단계 키를 여러 스레드가 동시에 저장해도 실패하지 않는지 테스트"""
+        import threading
+        store = CheckpointStore(tempfile.mkdtemp())
+        frame = pd.DataFrame({'group': [f"G{i:04d}" for i in range(2000)]})
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.save('groups', 'k', frame))) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(store.load('groups', 'k')['group'].tolist(), frame['group'].tolist())
+        self.assertEqual(os.listdir(store.directory), [os.path.basename(store.path('groups', 'k'))])
+        
+        # 저장할 수 없으면 예외 대신 False
+        blocked = os.path.join(store.directory, 'blocked')
+        open(blocked, 'w').close()
+        self.assertFalse(CheckpointStore(blocked).save('groups', 'k', frame))
+    
+    def test_render_resumes_from_partial_checkpoint(self):
+        """중간에 끝난 메시지 생성을 저장된 메시지 컬럼 다음부터 이어 가는지 테스트"""
+        store = CheckpointStore(tempfile.mkdtemp())
+        group_data = {
+            group_id: {'group_id': group_id, 'team_name': team, 'members': ['홍길동'], 'excel_order': order}
+            for order, (group_id, team) in enumerate([('G001', '1팀'), ('G002', '2팀')])
+        }
+        store.save('render', 'key', pd.DataFrame({'message': ['이전 결과']}, index=['G001']), partial=True)
+        
+        context = {'template': '{team_name} 안내', 'stage_key': 'key', 'checkpoints': store}
+        result = render_messages_stage(context, group_data, {})
+        
+        self.assertEqual(result['messages']['G001']['message'], '이전 결과')
+        self.assertEqual(result['messages']['G002']['message'], '2팀 안내')
+        self.assertEqual(result['message_order']['ids'], ['G001', 'G002'])
+
 class TestErrorHandler(unittest.TestCase):
     """ErrorHandler 테스트"""
     
@@ -330,6 +1119,56 @@ class TestTemplateManager(unittest.TestCase):
         self.assertIn('product_name', template['variables'])
         self.assertIn('total_balance', template['variables'])
     
+    def test_template_index(self):
+        """목록 조회가 인덱스를 쓰고 바뀐 템플릿만 다시 읽는지 테스트"""
+        template_id = self.template_manager.create_user_template("잔금 안내", "{team_name} [컬럼:잔금:,]원", "잔금")
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, TEMPLATE_INDEX_FILE)))
+        
+        loaded = []
+        original_load = self.template_manager.load_template
+        self.template_manager.load_template = lambda tid: loaded.append(tid) or original_load(tid)
+        
+        templates = self.template_manager.get_user_template_list()
+        self.assertEqual(templates[0]['id'], template_id)
+        self.assertEqual(templates[0]['variables_count'], 2)
+        self.template_manager.get_user_template_list()
+        self.assertNotIn(template_id, loaded)
+        
+        # 파일이 직접 바뀌면 수정 시각으로 감지해 다시 읽음
+        template_file = os.path.join(self.temp_dir, f"{template_id}.json")
+        data = original_load(template_id)
+        data['name'] = "환율 안내"
+        with open(template_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        self.assertEqual([t['id'] for t in self.template_manager.search_templates("환율")], [template_id])
+        self.assertIn(template_id, loaded)
+        
+        self.assertTrue(self.template_manager.delete_template(template_id))
+        self.assertEqual(self.template_manager.search_templates("안내"), [])
+    
+    def test_template_index_concurrent_saves(self):
+        """여러 세션이 동시에 저장해도 인덱스 항목을 잃지 않는지 테스트"""
+        import threading
+        managers = [TemplateManager(self.temp_dir) for _ in range(8)]
+        threads = [
+            threading.Thread(target=manager.save_template, args=(f"user_{i}", {'name': f"템플릿 {i}", 'content': "{name}"}))
+            for i, manager in enumerate(managers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        with open(os.path.join(self.temp_dir, TEMPLATE_INDEX_FILE), 'r', encoding='utf-8') as f:
+            indexed = json.load(f)['templates']
+        self.assertEqual(sorted(indexed), sorted(f"user_{i}" for i in range(8)))
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.endswith('.tmp')])
+        
+        loaded = []
+        self.template_manager.load_template = lambda tid: loaded.append(tid)
+        self.template_manager.get_user_template_list()
+        self.assertFalse([tid for tid in loaded if tid.startswith('user_')])
+    
     def test_validate_template(self):
         """템플릿 검증 테스트"""
         # 올바른 템플릿
@@ -457,6 +1296,13 @@ def run_all_tests():
     test_classes = [
         TestEnhancedDataProcessor,
         TestEnhancedMessageGenerator,
+        TestExportHelpers,
+        TestBackgroundTasks,
+        TestSearchIndex,
+        TestEditOverlay,
+        TestSharedCache,
+        TestSessionMemory,
+        TestPipeline,
         TestErrorHandler,
         TestConfigManager,
         TestTemplateManager,
@@ -520,6 +1366,13 @@ def run_specific_test(test_name):
     test_classes = {
         'processor': TestEnhancedDataProcessor,
         'generator': TestEnhancedMessageGenerator,
+        'export': TestExportHelpers,
+        'tasks': TestBackgroundTasks,
+        'search': TestSearchIndex,
+        'overlay': TestEditOverlay,
+        'cache': TestSharedCache,
+        'memory': TestSessionMemory,
+        'pipeline': TestPipeline,
         'error': TestErrorHandler,
         'config': TestConfigManager,
         'template': TestTemplateManager,
@@ -544,7 +1397,7 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='여행 잔금 문자 생성기 테스트')
-    parser.add_argument('--test', '-t', help='실행할 특정 테스트 (processor, generator, error, config, template, sample, integration)')
+    parser.add_argument('--test', '-t', help='실행할 특정 테스트 (processor, generator, export, tasks, error, config, template, sample, integration)')
     parser.add_argument('--verbose', '-v', action='store_true', help='상세 출력')
     
     args = parser.parse_args()
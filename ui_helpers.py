@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
 import re
+import io
 from datetime import datetime
+from enhanced_processor import render_compiled
+from export_engine import (
+    TextExportWriter, CsvExportWriter, XlsxExportWriter, ZipExportWriter, SUMMARY_COLUMNS, GROUP_LIST_COLUMNS,
+    sms_gateway_frame_from_messages, iter_export_records, run_export
+)
 
 def show_success_metric(title, value, delta=None):
     """성공 메트릭 표시"""
@@ -247,106 +253,33 @@ def create_download_section(generated_messages):
         )
 
 def create_text_download_content(generated_messages):
-    """텍스트 다운로드 컨텐츠 생성"""
-    content = []
-    content.append(f"여행 잔금 문자 메시지")
-    content.append(f"생성일시: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    content.append(f"총 {len(generated_messages)}개 그룹")
-    content.append("=" * 60)
-    content.append("")
-    
-    for group_id, data in generated_messages.items():
-        group_info = data['group_info']
-        message = data['message']
-        
-        content.append(f"[{group_id}] {group_info['team_name']} - {group_info['sender_group']}")
-        content.append(f"발송인: {group_info['sender']}")
-        content.append(f"대상자: {', '.join(group_info['members'])} ({group_info['group_size']}명)")
-        content.append(f"연락처: {group_info.get('contact', '')}")
-        content.append("-" * 40)
-        content.append(message)
-        content.append("")
-        content.append("=" * 60)
-        content.append("")
-    
-    return "\n".join(content)
+    """텍스트 다운로드 컨텐츠 생성 (generated_messages에 들어 있는 순서 그대로)"""
+    writer = TextExportWriter(io.StringIO(), layout='summary')
+    return run_export(iter_export_records(generated_messages, ordered_ids=list(generated_messages)), [writer])['txt'].getvalue()
 
-def create_excel_download_content(generated_messages):
-    """엑셀 다운로드 컨텐츠 생성"""
-    import io
-    
-    data = []
-    for group_id, message_data in generated_messages.items():
-        group_info = message_data['group_info']
-        message = message_data['message']
-        
-        data.append({
-            '그룹ID': group_id,
-            '팀명': group_info['team_name'],
-            '발송그룹': group_info['sender_group'],
-            '발송인': group_info['sender'],
-            '연락처': group_info.get('contact', ''),
-            '그룹멤버': ', '.join(group_info['members']),
-            '인원수': group_info['group_size'],
-            '총잔금': group_info.get('total_balance', ''),
-            '메시지': message
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # 메모리에 엑셀 파일 생성
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='메시지목록')
-        
-        # 워크시트 스타일링
-        workbook = writer.book
-        worksheet = writer.sheets['메시지목록']
-        
-        # 헤더 스타일
-        from openpyxl.styles import Font, PatternFill
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        
-        for col_num, column_title in enumerate(df.columns, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.font = header_font
-            cell.fill = header_fill
-        
-        # 열 너비 조정
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-    
-    return output.getvalue()
+def create_excel_download_content(generated_messages, width_sample_size=None):
+    """엑셀 다운로드 컨텐츠 생성 (generated_messages에 들어 있는 순서 그대로)"""
+    writer = XlsxExportWriter(io.BytesIO(), columns=SUMMARY_COLUMNS, sheet_name='메시지목록', width_sample_size=width_sample_size)
+    return run_export(iter_export_records(generated_messages, ordered_ids=list(generated_messages)), [writer])['xlsx'].getvalue()
 
 def create_csv_download_content(generated_messages):
-    """CSV 다운로드 컨텐츠 생성"""
-    data = []
-    for group_id, message_data in generated_messages.items():
-        group_info = message_data['group_info']
-        
-        data.append({
-            '그룹ID': group_id,
-            '팀명': group_info['team_name'],
-            '발송그룹': group_info['sender_group'],
-            '발송인': group_info['sender'],
-            '연락처': group_info.get('contact', ''),
-            '그룹멤버': ', '.join(group_info['members']),
-            '인원수': group_info['group_size'],
-            '총잔금': group_info.get('total_balance', '')
-        })
-    
-    df = pd.DataFrame(data)
-    return df.to_csv(index=False, encoding='utf-8-sig')
+    """CSV 다운로드 컨텐츠 생성 (generated_messages에 들어 있는 순서 그대로)"""
+    writer = CsvExportWriter(io.StringIO(), columns=GROUP_LIST_COLUMNS)
+    return run_export(iter_export_records(generated_messages, ordered_ids=list(generated_messages)), [writer])['csv'].getvalue()
+
+def build_sms_gateway_frame(generated_messages, edited_messages=None, phone_column=None):
+    """문자 발송 시스템 업로드용 DataFrame 생성
+
+    반환 DataFrame은 recipient, message, message_type, group_id 컬럼을 갖습니다.
+    """
+    return sms_gateway_frame_from_messages(generated_messages, edited_messages, phone_column=phone_column)[0]
+
+def create_zip_bundle_content(records, output, progress_callback=None, cancel_check=None):
+    """그룹별 텍스트 파일과 manifest.csv를 담은 ZIP 파일을 output에 순차적으로 기록
+
+    records는 (group_id, group_info, message) 튜플의 리스트입니다.
+    """
+    return run_export(records, [ZipExportWriter(output)], progress_callback, cancel_check)['zip']
 
 def show_error_details(error, context=""):
     """상세 오류 정보 표시"""
@@ -464,12 +397,35 @@ def generate_variable_name(header):
         var_name = 'var_' + var_name
     return var_name[:50] if var_name else "unnamed_variable"
 
-def show_smart_template_preview(template, preview_data, excel_columns):
+def show_smart_template_preview(template, preview_data, excel_columns, samples=None, render_sample=None):
     """
-    스마트 템플릿 미리보기 (최종 생성 로직과 동기화된 버전)
+    스마트 템플릿 미리보기 (최종 생성과 같은 템플릿 엔진 사용)
+
+    samples([(그룹ID, 라벨)])와 render_sample(그룹ID -> 메시지)을 넘기면 샘플 그룹을 넘겨 보며 확인하고,
+    없으면 엑셀 첫 번째 행 데이터로 미리보기를 만듭니다.
     """
     st.markdown("##### 🔍 실시간 미리보기")
 
+    if samples and render_sample:
+        try:
+            labels = [label for _, label in samples]
+            selected_label = st.selectbox(
+                "미리보기 그룹", labels,
+                help="앞쪽 그룹과 가장 긴 메시지, 빈 값이 가장 많은 그룹을 확인할 수 있습니다."
+            )
+            position = labels.index(selected_label)
+            st.caption(f"샘플 {position + 1} / {len(samples)}")
+            st.text_area(
+                "Preview Area",
+                value=render_sample(samples[position][0]),
+                height=400,
+                disabled=True,
+                label_visibility="collapsed"
+            )
+        except Exception as e:
+            st.error(f"❌ 미리보기 생성 중 오류: {str(e)}")
+        return
+
     if not preview_data:
         st.warning("미리보기를 생성할 데이터가 없습니다.")
         st.text_area("Preview Area", "미리보기 생성 불가", height=450, disabled=True, label_visibility="collapsed")
@@ -491,39 +447,10 @@ def show_smart_template_preview(template, preview_data, excel_columns):
         variables.setdefault('group_size', 2)
         variables.setdefault('additional_fee_per_person', 70000) # 예시 추가금
 
-        # 3. 템플릿 태그를 치환하는 콜백 함수
-        def replacer(match):
-            # key는 그룹 2(컬럼명) 또는 그룹 5(변수명) 중 하나가 됨
-            key = match.group(2) or match.group(5)
-            formatting = match.group(3) or match.group(6)
-            
-            if key is None:
-                return match.group(0) # 매칭되지 않은 경우 원본 반환
-            
-            key = key.strip()
-            
-            # 통합 딕셔너리에서 값 조회
-            value = variables.get(key, f"❌[{key}]")
-            
-            if isinstance(value, str) and value.startswith("❌"):
-                return value
-
-            # 숫자 포맷팅 적용
-            if formatting and ':' in formatting:
-                try:
-                    # 문자열 내 쉼표 등 비숫자 문자 제거 후 숫자 변환
-                    num_value = float(re.sub(r'[^\d.-]', '', str(value)))
-                    return f"{int(num_value):,}"
-                except (ValueError, TypeError):
-                    return str(value) # 변환 실패 시 원본 값 반환
-            
-            return str(value)
-
-        # [컬럼:키] 또는 {키} 형태의 모든 태그를 찾는 정규식
-        pattern = r'\[(컬럼):([^\]:]+)(:[^\]]*)?\]|(\{)([^}]+?)(:[^}]+)?\}'
-        preview_message = re.sub(pattern, replacer, template)
+        # 3. 최종 생성과 같은 엔진으로 태그 치환
+        preview_message = render_compiled(template, variables)
         
-        # 5. 최종 결과 표시
+        # 4. 최종 결과 표시
         st.text_area(
             "Preview Area",
             value=preview_message,